@@ -8,8 +8,11 @@ import pygame
 import time
 
 class PlainFieldEnv(gymnasium.Env):
-    def __init__(self, field_size=6, vision_size=7):
+    metadata = {'render_modes': ['human', 'rgb_array'], 'render_fps': 20}
+
+    def __init__(self, field_size=6, vision_size=7, render_mode=None):
         super(PlainFieldEnv, self).__init__()
+        self.render_mode = render_mode
 
         # assert, min field size is vision size * 2 + 1
         # assert field_size >= vision_size * 2 + 1, "field size must be at least vision size * 2 + 1"
@@ -18,6 +21,7 @@ class PlainFieldEnv(gymnasium.Env):
         self.buffer_size = int(np.ceil(vision_size / 2.0))
         self.num_rows = 30 + 2 * self.buffer_size
         self.num_cols = 50 + 2 * self.buffer_size
+        self.field_size = field_size
         self.vision_size = vision_size
 
         # Set facing directions
@@ -246,7 +250,11 @@ class PlainFieldEnv(gymnasium.Env):
     def _setup_display(self):
         pygame.init()
         self.cell_size = 20
-        self.screen = pygame.display.set_mode((self.num_cols * self.cell_size+5, self.num_rows * self.cell_size))
+        size = (self.num_cols * self.cell_size+5, self.num_rows * self.cell_size)
+        if self.render_mode == 'rgb_array':
+            self.screen = pygame.Surface(size)  # Off-screen, works without a display
+        else:
+            self.screen = pygame.display.set_mode(size)
         self.display_initialized = True
 
     def render(self):
@@ -326,8 +334,37 @@ class PlainFieldEnv(gymnasium.Env):
                 cell_top = (x) * self.cell_size
                 self.screen.blit(vision_surface, (cell_left, cell_top))
 
+        if self.render_mode == 'rgb_array':
+            return np.transpose(pygame.surfarray.array3d(self.screen), (1, 0, 2))
         pygame.display.update()
 
+    def init_kwargs(self):
+        """Constructor arguments except render_mode, to recreate the environment when replaying a recording"""
+        return {'field_size': self.field_size, 'vision_size': self.vision_size}
+
+    def snapshot(self):
+        """Agent position and facing direction index, recorded every step by Pong/recorder.py"""
+        return np.array([*self.current_pos, self.facing_directions.index(self.facing_direction)], dtype=np.int16)
+
+    def episode_snapshot(self):
+        return {'start': np.array(self.start_pos), 'goal': np.array(self.goal_pos)}
+
+    def load_snapshot(self, episode, snapshot):
+        """Set the object and objective layers render() draws from a recorded episode_snapshot and snapshot"""
+        objects, objectives = self.map[0], self.map[2]
+        objects[objects == self.cell_states['object_layer']['agent']] = self.cell_states['object_layer']['empty']
+        objectives[:] = self.cell_states['objective_layer']['none']
+
+        self.start_pos = tuple(int(value) for value in episode['start'])
+        self.goal_pos = tuple(int(value) for value in episode['goal'])
+        objectives[self.start_pos] = self.cell_states['objective_layer']['start']
+        objectives[self.goal_pos] = self.cell_states['objective_layer']['goal']
+
+        self.current_pos = (int(snapshot[0]), int(snapshot[1]))
+        objects[self.current_pos] = self.cell_states['object_layer']['agent']
+        self.facing_direction = self.facing_directions[int(snapshot[2])]
+        self.initialized = True
+
     class MapValidator:
         def __init__(self, env):
             self.env = env
@@ -9,8 +9,11 @@ import time
 from pyamaze import maze
 
 class MazeGameEnv(gymnasium.Env):
-    def __init__(self, generation_frequency=np.inf, min_maze_size=8, max_maze_size=8):
+    metadata = {'render_modes': ['human', 'rgb_array'], 'render_fps': 25}
+
+    def __init__(self, generation_frequency=np.inf, min_maze_size=8, max_maze_size=8, render_mode=None):
         super(MazeGameEnv, self).__init__()
+        self.render_mode = render_mode
 
         # Set maze generation parameters
         self.generation_frequency = generation_frequency
@@ -50,6 +53,9 @@ class MazeGameEnv(gymnasium.Env):
         # boolean to check if the pygame display is initialized
         self.display_initialized = False  # Set to True once the pygame window is set up
 
+        # Walls of the last episode_snapshot passed to load_snapshot
+        self._loaded_walls = None
+
         self.steps_since_reset = 0
 
     def reset(self, seed=None, options=None):
@@ -76,10 +82,10 @@ class MazeGameEnv(gymnasium.Env):
             self.num_cols = max([k[1] for k in self.maze_map.keys()])
 
             if self.display_initialized:
-                # Shutdown the pygame display
-                pygame.display.quit()
-                # Update pygame window size
-                self.screen = pygame.display.set_mode((self.num_cols * self.cell_size, self.num_rows * self.cell_size))
+                # Shutdown the pygame display and set it up again with the new size
+                if self.render_mode != 'rgb_array':
+                    pygame.display.quit()
+                self._setup_display()
 
         self.current_pos = self.start_pos
         self.vision_matrix, _ = self._get_vision()
@@ -240,7 +246,11 @@ class MazeGameEnv(gymnasium.Env):
     def _setup_display(self):
         pygame.init()
         self.cell_size = 40
-        self.screen = pygame.display.set_mode((self.num_cols * self.cell_size, self.num_rows * self.cell_size))
+        size = (self.num_cols * self.cell_size, self.num_rows * self.cell_size)
+        if self.render_mode == 'rgb_array':
+            self.screen = pygame.Surface(size)  # Off-screen, works without a display
+        else:
+            self.screen = pygame.display.set_mode(size)
         self.display_initialized = True
 
     def render(self):
@@ -320,7 +330,44 @@ class MazeGameEnv(gymnasium.Env):
                     cell_top = (x - 1) * self.cell_size
                     self.screen.blit(vision_surface, (cell_left, cell_top))
 
-                pygame.display.update()
+                if self.render_mode != 'rgb_array':
+                    pygame.display.update()
+
+        if self.render_mode == 'rgb_array':
+            return np.transpose(pygame.surfarray.array3d(self.screen), (1, 0, 2))
+
+    def init_kwargs(self):
+        """Constructor arguments except render_mode, to recreate the environment when replaying a recording"""
+        return {'generation_frequency': self.generation_frequency, 'min_maze_size': self.min_maze_size,
+                'max_maze_size': self.max_maze_size}
+
+    def snapshot(self):
+        """Agent position and facing direction index, recorded every step by Pong/recorder.py"""
+        return np.array([*self.current_pos, self.facing_directions.index(self.facing_direction)], dtype=np.int16)
+
+    def episode_snapshot(self):
+        """Maze walls as (rows, cols, 4) openings in facing_directions order, start and goal position"""
+        walls = np.zeros((self.num_rows, self.num_cols, len(self.facing_directions)), dtype=np.int8)
+        for (row, col), openings in self.maze_map.items():
+            walls[row - 1, col - 1] = [openings[direction] for direction in self.facing_directions]
+        return {'walls': walls, 'start': np.array(self.start_pos), 'goal': np.array(self.goal_pos)}
+
+    def load_snapshot(self, episode, snapshot):
+        """Set the state render() draws from a recorded episode_snapshot and snapshot"""
+        walls = episode['walls']
+        if walls is not self._loaded_walls:
+            self._loaded_walls = walls
+            self.maze_map = {(row + 1, col + 1): dict(zip(self.facing_directions, map(int, walls[row, col])))
+                             for row in range(walls.shape[0]) for col in range(walls.shape[1])}
+            if (self.num_rows, self.num_cols) != walls.shape[:2]:
+                self.num_rows, self.num_cols = walls.shape[:2]
+                if self.display_initialized:
+                    self._setup_display()
+        self.start_pos = tuple(int(value) for value in episode['start'])
+        self.goal_pos = tuple(int(value) for value in episode['goal'])
+        self.current_pos = (int(snapshot[0]), int(snapshot[1]))
+        self.facing_direction = self.facing_directions[int(snapshot[2])]
+        self.vision_matrix, _ = self._get_vision()
 
     def describe_state(self):
         """
@@ -0,0 +1,258 @@
+"""
+Actor-learner training: several actor processes play episodes, one learner process updates the DQNs.
+
+Actors run GameEnv episodes in which agent 1 plays its policy epsilon-greedily and agent 2 plays a strategy sampled
+from StrategyFactory (the "model" strategy plays agent 2's policy, as in train_with_strategy.py). Each finished
+episode is sent to the learner through a queue as a handful of NumPy arrays. The learner stores the episodes in the
+replay memories, runs replay_ratio fused MultiAgentDQNLearner updates per stored round and every publish_interval
+updates copies the policy weights into a SharedPolicy in shared memory, from which the actors refresh their local
+copy before each episode.
+
+With replay_ratio = 1, as in train.py, every transition is used for one update on average, but the rounds per second
+are capped at the learner's update rate whatever the number of actors. Actors wait before starting an episode while
+the rounds played run more than max_lag rounds ahead of replay_ratio, so more actors only speed up training while
+the learner keeps up. The default replay_ratio of 0.25 lets the actors play up to four rounds per update, trading
+updates per transition for rounds per second.
+"""
+import math
+import queue
+import random
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from tqdm import tqdm
+
+from buffer import ReplayMemory
+from game_env import GameEnv
+from learner import MultiAgentDQNLearner
+from model import EnsembleDQN
+from strategies import StrategyFactory
+
+
+class SharedPolicy:
+    """Policy weights of both agents in shared memory, written by the learner and read by the actors
+
+    Args:
+        input_dim (int): Number of input features
+        hidden_sizes (list): Hidden layer sizes of each agent's DQN
+        output_dim (int): Number of actions
+        ctx: Multiprocessing context the actors are started with
+    """
+    def __init__(self, input_dim, hidden_sizes, output_dim, ctx):
+        self.net = EnsembleDQN(2, input_dim, hidden_sizes, output_dim).share_memory()
+        self.version = ctx.Value("l", 0)  # Incremented on every publish, its lock guards the weights
+
+    def publish(self, policy_net):
+        with self.version.get_lock():
+            with torch.no_grad():
+                for shared, param in zip(self.net.parameters(), policy_net.parameters()):
+                    shared.copy_(param)
+            self.version.value += 1
+
+    def pull(self, local_net, local_version):
+        """Copy the weights into local_net if they changed since local_version, returns the version of local_net"""
+        if self.version.value == local_version:
+            return local_version
+        with self.version.get_lock():
+            with torch.no_grad():
+                for local, shared in zip(local_net.parameters(), self.net.parameters()):
+                    local.copy_(shared)
+            return self.version.value
+
+
+def _epsilon(config, steps_done):
+    eps_start, eps_end = config["eps_start"], config["eps_end"]
+    return eps_end + (eps_start - eps_end) * math.exp(-1. * steps_done / config["eps_decay"])
+
+
+def _actor(actor_idx, config, shared_policy, transitions, steps_done, updates_done, stop_event):
+    # Actors are many, one thread each keeps them from competing for cores
+    torch.set_num_threads(1)
+    seed = config["seed"] + actor_idx
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    env = GameEnv(config["game_type"], render_mode=None, max_rounds=config["max_rounds"], obs_mode="array",
+                  encoding=config["encoding"], window=config["window"])
+    input_dim = len(env.reset()[0][0])
+    output_dim = env.action_space.n
+    policy_net = EnsembleDQN(2, input_dim, config["hidden_sizes"], output_dim)
+    policy_net1 = policy_net.agent_model(0)
+    policy_net2 = policy_net.agent_model(1)
+    version = -1
+
+    max_rounds = config["max_rounds"]
+    states = np.zeros((max_rounds, 2, input_dim), dtype=np.float32)
+    next_states = np.zeros((max_rounds, 2, input_dim), dtype=np.float32)
+    actions = np.zeros((max_rounds, 2), dtype=np.int64)
+    rewards = np.zeros((max_rounds, 2), dtype=np.float32)
+    dones = np.zeros(max_rounds, dtype=np.float32)
+
+    while not stop_event.is_set():
+        # Wait while the rounds played run more than max_lag rounds ahead of the learner's replay_ratio
+        while (not stop_event.is_set()
+               and steps_done.value > updates_done.value / config["replay_ratio"] + config["max_lag"]):
+            time.sleep(0.001)
+
+        version = shared_policy.pull(policy_net, version)
+        strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=config["opponent"])
+        epsilon = _epsilon(config, steps_done.value)
+
+        observations, _ = env.reset()
+        observation_agent1, observation_agent2 = observations
+        num_rounds = 0
+        with torch.inference_mode():
+            for round_idx in range(max_rounds):
+                if random.random() > epsilon:
+                    state_agent1 = torch.from_numpy(observation_agent1).unsqueeze(0)
+                    action_agent1 = policy_net1(state_agent1).argmax(dim=1).item()
+                else:
+                    action_agent1 = random.randrange(output_dim)
+                action_agent2 = int(strategy_agent2.select_action(observation_agent2, model=policy_net2))
+
+                # Observations are overwritten two steps later, so they are copied right away
+                states[round_idx, 0] = observation_agent1
+                states[round_idx, 1] = observation_agent2
+                observations, (reward_agent1, reward_agent2), terminated, _, _ = env.step(action_agent1, action_agent2)
+                observation_agent1, observation_agent2 = observations
+                next_states[round_idx, 0] = observation_agent1
+                next_states[round_idx, 1] = observation_agent2
+                actions[round_idx] = action_agent1, action_agent2
+                rewards[round_idx] = reward_agent1, reward_agent2
+                dones[round_idx] = terminated
+                num_rounds += 1
+                if terminated:
+                    break
+
+        episode = (states[:num_rounds].copy(), actions[:num_rounds].copy(), next_states[:num_rounds].copy(),
+                   rewards[:num_rounds].copy(), dones[:num_rounds].copy())
+        with steps_done.get_lock():
+            steps_done.value += num_rounds
+
+        # The queue is bounded, so actors wait for a learner that falls behind instead of piling up episodes
+        while not stop_event.is_set():
+            try:
+                transitions.put(episode, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+def train_actor_learner(game_type, max_rounds, num_episodes, num_actors, hidden_sizes, learning_rate, gamma,
+                        batch_size, replay_size, eps_start, eps_end, eps_decay, target_update, self_play_update,
+                        publish_interval=10, replay_ratio=0.25, max_lag=None, opponent="sample_from_dict",
+                        encoding="history", window=4, seed=0, device=torch.device("cpu")):
+    """Train both agents' DQNs with num_actors actor processes and a learner in the calling process.
+
+    Args:
+        game_type (str): Name of the game, see GameModes
+        max_rounds (int): Number of rounds per episode
+        num_episodes (int): Number of episodes to collect from the actors
+        num_actors (int): Number of actor processes
+        hidden_sizes (list): Hidden layer sizes of each agent's DQN
+        learning_rate (float): Adam learning rate
+        gamma (float): Discount factor for future rewards
+        batch_size (int): Number of transitions sampled per agent and update
+        replay_size (int): Capacity of each agent's replay memory
+        eps_start (float): Initial probability of a random action of agent 1
+        eps_end (float): Final probability of a random action of agent 1
+        eps_decay (float): Number of rounds, summed over all actors, over which epsilon decays exponentially
+        target_update (int): Update the target networks every target_update episodes
+        self_play_update (int): Copy agent 1's policy to agent 2 every self_play_update episodes
+        publish_interval (int): Publish the policy weights to the actors every publish_interval updates
+        replay_ratio (float): Number of updates per round stored once the memories hold a batch, train.py makes 1
+        max_lag (int): Number of rounds the actors may play ahead of replay_ratio, defaults to batch_size plus one
+            episode per actor
+        opponent (str): Strategy of agent 2, see StrategyFactory
+        encoding (str): Observation encoding, see GameEnv
+        window (int): Window of 'summary' observations
+        seed (int): Actor i seeds its random number generators with seed + i
+        device (torch.device): Device of the learner
+
+    Returns:
+        The MultiAgentDQNLearner and a dict with the number of "rounds" played, "updates" made and the
+        "rounds_per_second" and "updates_per_second" over the run
+    """
+    config = {
+        "game_type": game_type, "max_rounds": max_rounds, "hidden_sizes": hidden_sizes, "opponent": opponent,
+        "encoding": encoding, "window": window, "seed": seed,
+        "eps_start": eps_start, "eps_end": eps_end, "eps_decay": eps_decay, "replay_ratio": replay_ratio,
+        "max_lag": batch_size + num_actors * max_rounds if max_lag is None else max_lag,
+    }
+    env = GameEnv(game_type, render_mode=None, max_rounds=max_rounds, obs_mode="array", encoding=encoding,
+                  window=window)
+    input_dim = len(env.reset()[0][0])
+    output_dim = env.action_space.n
+
+    memories = [ReplayMemory(replay_size, input_dim, device) for _ in range(2)]
+    learner = MultiAgentDQNLearner(memories, input_dim, hidden_sizes, output_dim, learning_rate, gamma, batch_size,
+                                   device)
+
+    # Spawned actors do not inherit the learner's state, and CUDA cannot be used in forked processes
+    ctx = mp.get_context("spawn")
+    shared_policy = SharedPolicy(input_dim, hidden_sizes, output_dim, ctx)
+    shared_policy.publish(learner.policy_net)
+    transitions = ctx.Queue(maxsize=64 * num_actors)
+    steps_done = ctx.Value("l", 0)
+    updates_done = ctx.Value("l", 0, lock=False)  # Only written by the learner
+    stop_event = ctx.Event()
+    actors = [ctx.Process(target=_actor, args=(i, config, shared_policy, transitions, steps_done, updates_done,
+                                               stop_event), daemon=True)
+              for i in range(num_actors)]
+    for actor in actors:
+        actor.start()
+
+    episodes, rounds, updates = 0, 0, 0
+    # Updates owed to the rounds stored since the memories first held a batch, as train.py does none before that
+    update_budget = 0.
+    start_time = time.time()
+    with tqdm(total=num_episodes) as progress:
+        while episodes < num_episodes or update_budget >= 1:
+            if update_budget >= 1:
+                # Perform one fused optimization step for both agents and share the new weights every so often
+                learner.optimize_model()
+                updates += 1
+                update_budget -= 1
+                updates_done.value = updates
+                if updates % publish_interval == 0:
+                    shared_policy.publish(learner.policy_net)
+                continue
+
+            try:
+                states, actions, next_states, rewards, dones = transitions.get(timeout=1.)
+            except queue.Empty:
+                continue
+            for agent_idx, memory in enumerate(memories):
+                memory.push_batch(states[:, agent_idx], actions[:, agent_idx], next_states[:, agent_idx],
+                                  rewards[:, agent_idx], dones)
+            episodes += 1
+            rounds += len(actions)
+            progress.update(1)
+            if all(len(memory) >= batch_size for memory in memories):
+                update_budget += replay_ratio * len(actions)
+
+            # Every TARGET_UPDATE episodes, update the weights of the target networks
+            if episodes % target_update == 0:
+                learner.update_target()
+
+            # Every SELF_PLAY_UPDATE episodes, synchronize the policy of agent 2 with that of agent 1
+            if episodes % self_play_update == 0:
+                learner.sync_agents(0, 1)
+
+    stop_event.set()
+    # Actors blocked on a full queue only notice the stop event once there is room, so keep draining until they exit
+    while any(actor.is_alive() for actor in actors):
+        try:
+            transitions.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    for actor in actors:
+        actor.join()
+
+    elapsed = time.time() - start_time
+    stats = {"rounds": rounds, "updates": updates, "rounds_per_second": rounds / elapsed,
+             "updates_per_second": updates / elapsed}
+    return learner, stats
@@ -1,23 +1,75 @@
-import random
-from collections import namedtuple
-
+import torch
 
 
 class ReplayMemory:
-    def __init__(self, capacity):
+    """Ring buffer of transitions stored in preallocated, contiguous tensors.
+
+    Args:
+        capacity (int): Maximum number of transitions, the oldest ones are overwritten first
+        obs_dim (int): Number of features per observation
+        device (torch.device): Device the transitions are stored on
+    """
+    def __init__(self, capacity, obs_dim, device=torch.device("cpu")):
         self.capacity = capacity
-        self.memory = []
+        self.device = device
         self.position = 0
-        self.Transition = namedtuple('Transition', ('state', 'action', 'next_state', 'reward'))
+        self.size = 0
+
+        self.states = torch.zeros((capacity, obs_dim), dtype=torch.float32, device=device)
+        self.next_states = torch.zeros((capacity, obs_dim), dtype=torch.float32, device=device)
+        self.actions = torch.zeros(capacity, dtype=torch.long, device=device)
+        self.rewards = torch.zeros(capacity, dtype=torch.float32, device=device)
+        self.dones = torch.zeros(capacity, dtype=torch.float32, device=device)
+
+    def push(self, state, action, next_state, reward, done):
+        self.states[self.position] = torch.as_tensor(state, dtype=torch.float32).reshape(-1)
+        self.next_states[self.position] = torch.as_tensor(next_state, dtype=torch.float32).reshape(-1)
+        self.actions[self.position] = int(action)
+        self.rewards[self.position] = float(reward)
+        self.dones[self.position] = float(done)
 
-    def push(self, *args):
-        if len(self.memory) < self.capacity:
-            self.memory.append(None)
-        self.memory[self.position] = self.Transition(*args)
         self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_batch(self, states, actions, next_states, rewards, dones):
+        """Store n transitions at once, arguments have a leading dimension of size n"""
+        n = len(actions)
+        idx = (self.position + torch.arange(n, device=self.device)) % self.capacity
+        self.states[idx] = torch.as_tensor(states, dtype=torch.float32).reshape(n, -1).to(self.device)
+        self.next_states[idx] = torch.as_tensor(next_states, dtype=torch.float32).reshape(n, -1).to(self.device)
+        self.actions[idx] = torch.as_tensor(actions, dtype=torch.long).to(self.device)
+        self.rewards[idx] = torch.as_tensor(rewards, dtype=torch.float32).to(self.device)
+        self.dones[idx] = torch.as_tensor(dones, dtype=torch.float32).to(self.device)
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
 
     def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
+        """Sample a batch of transitions uniformly (with replacement).
+
+        Returns:
+            states (batch_size, obs_dim), actions (batch_size, 1), next_states (batch_size, obs_dim),
+            rewards (batch_size,) and dones (batch_size,), dones being 1. for terminal transitions.
+        """
+        idx = torch.randint(self.size, (batch_size,), device=self.device)
+        return (self.states[idx], self.actions[idx].unsqueeze(1), self.next_states[idx],
+                self.rewards[idx], self.dones[idx])
+
+    def state_dict(self):
+        """Stored transitions and write position, only the filled part of the buffers is included"""
+        return {
+            "position": self.position, "size": self.size,
+            "states": self.states[:self.size], "actions": self.actions[:self.size],
+            "next_states": self.next_states[:self.size], "rewards": self.rewards[:self.size],
+            "dones": self.dones[:self.size],
+        }
+
+    def load_state_dict(self, state_dict):
+        size = state_dict["size"]
+        assert size <= self.capacity, "Replay memory is smaller than the saved one"
+        for name in ("states", "actions", "next_states", "rewards", "dones"):
+            getattr(self, name)[:size] = state_dict[name].to(self.device)
+        self.position = state_dict["position"]
+        self.size = size
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
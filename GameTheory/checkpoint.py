@@ -0,0 +1,235 @@
+"""
+Periodic checkpoints of the full training state, written on a background thread.
+
+A checkpoint holds everything needed to continue a run exactly where it stopped: the learner (policy and target
+networks, optimizer), the replay memories, the loop counters and the states of the random number generators of
+random, NumPy, torch and the environment's action space, which RandomPick and exploring strategies sample. Training
+loops call Checkpointer.save at an episode boundary. The state is copied right away, which for the GameTheory DQNs
+and replay memories is a few small memcpys, and serialized and written to disk by a writer thread while training
+continues. Files are written to a temporary name and renamed, so a crash during a write never leaves a truncated
+checkpoint behind, and only the last keep_last checkpoints are kept.
+
+Resuming is opt-in. Training loops call resume_training, which restores the latest checkpoint only if asked to and
+only if it was saved with the same config (game, observation encoding, network sizes, ...). A run that does not
+resume refuses to start over the checkpoints of an earlier run unless it is allowed to overwrite them, so they are
+never removed by accident nor mistaken for those of the new run.
+"""
+import glob
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+
+
+def rng_state(env=None):
+    state = {"random": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    if env is not None:
+        state["action_space"] = env.action_space.np_random.bit_generator.state
+    return state
+
+
+def set_rng_state(state, env=None):
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+    if env is not None and "action_space" in state:
+        env.action_space.np_random.bit_generator.state = state["action_space"]
+
+
+def training_state(learner, memories, config=None, env=None, **counters):
+    """Checkpoint state of a MultiAgentDQNLearner run.
+
+    Args:
+        learner (MultiAgentDQNLearner): Learner of the run
+        memories (list): Replay memories of the run
+        config (dict): Settings a resumed run must share, checked by resume_training
+        env (gymnasium.Env): Environment of the run, its action space generator is saved
+        counters: Loop counters, e.g. the episode and steps_done
+    """
+    return {"learner": learner.state_dict(), "memories": [memory.state_dict() for memory in memories],
+            "rng": rng_state(env), "config": config, "counters": counters}
+
+
+def restore_training_state(state, learner, memories, env=None):
+    """Load a training_state into learner and memories and restore the random number generators.
+
+    Args:
+        env (gymnasium.Env): Environment of the run, its action space generator is restored
+
+    Returns:
+        The counters saved with the state
+    """
+    learner.load_state_dict(state["learner"])
+    for memory, memory_state in zip(memories, state["memories"]):
+        memory.load_state_dict(memory_state)
+    set_rng_state(state["rng"], env)
+    return state["counters"]
+
+
+def resume_training(checkpointer, resume, config, learner, memories, num_episodes, env=None, overwrite=False):
+    """Restore the latest checkpoint of checkpointer, if resume is set, or start over.
+
+    Args:
+        checkpointer (Checkpointer): Checkpointer of the run
+        resume (bool): Continue from the latest checkpoint
+        config (dict): Settings of the run, must equal those the checkpoint was saved with
+        learner (MultiAgentDQNLearner): Learner to load the checkpoint into
+        memories (list): Replay memories to load the checkpoint into
+        num_episodes (int): Number of episodes of the run
+        env (gymnasium.Env): Environment of the run, its action space generator is restored
+        overwrite (bool): Remove the checkpoints of an earlier run when starting over, otherwise starting over a
+            directory with checkpoints raises a ValueError
+
+    Returns:
+        The counters saved with the checkpoint, None when starting over
+    """
+    if not resume:
+        num_checkpoints = len(checkpointer.checkpoints())
+        if num_checkpoints and not overwrite:
+            raise ValueError(f"{checkpointer.directory} holds {num_checkpoints} checkpoints of an earlier run, enable "
+                             "resuming to continue it or overwriting to remove them")
+        if num_checkpoints:
+            checkpointer.clear()
+            print(f"Starting over, removed {num_checkpoints} checkpoints in {checkpointer.directory}")
+        return None
+    checkpoint = checkpointer.load()
+    if checkpoint is None:
+        return None
+    if checkpoint.get("config") != config:
+        raise ValueError(f"The latest checkpoint in {checkpointer.directory} was saved with config "
+                         f"{checkpoint.get('config')}, not {config}, disable resuming to start over")
+    counters = restore_training_state(checkpoint, learner, memories, env)
+    if counters["episode"] >= num_episodes:
+        print(f"The latest checkpoint in {checkpointer.directory} already finished {counters['episode']} of "
+              f"{num_episodes} episodes, nothing left to train")
+    else:
+        print(f"Resuming from episode {counters['episode']}")
+    return counters
+
+
+def _snapshot(obj):
+    # Copy tensors and arrays so the training loop can keep modifying the originals while the writer serializes
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return {key: _snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(value) for value in obj)
+    return obj
+
+
+class Checkpointer:
+    """Writes checkpoints asynchronously and finds the latest one to resume from
+
+    Args:
+        directory (str): Directory of the checkpoint files, created if missing
+        keep_last (int): Number of most recent checkpoints kept on disk
+        prefix (str): File name prefix, files are named <prefix>_<step>.pt
+    """
+    def __init__(self, directory, keep_last=3, prefix="checkpoint"):
+        assert keep_last >= 1, "keep_last must be at least 1"
+        self.directory = directory
+        self.keep_last = keep_last
+        self.prefix = prefix
+        self.num_skipped = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # At most one checkpoint waits for the writer, see save
+        self._pending = queue.Queue(maxsize=1)
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def save(self, step, state):
+        """Snapshot state and hand it to the writer thread.
+
+        A checkpoint requested while the previous one is still waiting to be written is skipped instead of
+        blocking the training loop.
+
+        Args:
+            step (int): Position in training, e.g. the number of finished episodes, used in the file name
+            state (dict): Training state, may contain tensors, NumPy arrays and picklable objects
+
+        Returns:
+            True if the checkpoint was queued, False if it was skipped
+        """
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self._error
+        if self._pending.full():
+            self.num_skipped += 1
+            return False
+        self._pending.put((step, _snapshot(state)))
+        return True
+
+    def path(self, step):
+        return os.path.join(self.directory, f"{self.prefix}_{step}.pt")
+
+    def checkpoints(self):
+        """Paths of all checkpoints on disk, oldest first"""
+        paths = glob.glob(os.path.join(self.directory, f"{self.prefix}_*.pt"))
+        steps = [os.path.basename(path)[len(self.prefix) + 1:-3] for path in paths]
+        return [path for step, path in sorted((int(step), path) for step, path in zip(steps, paths)
+                                              if step.isdigit())]
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def load(self, path=None):
+        """State of the checkpoint at path, defaults to the latest one, None if there is none"""
+        path = path or self.latest()
+        if path is None:
+            return None
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+    def clear(self):
+        """Remove all checkpoints on disk, returns how many there were"""
+        checkpoints = self.checkpoints()
+        for path in checkpoints:
+            os.remove(path)
+        return len(checkpoints)
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk"""
+        self._pending.join()
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self._error
+
+    def close(self):
+        self.wait()
+        self._pending.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                self._pending.task_done()
+                return
+            step, state = item
+            try:
+                self._write(step, state)
+            except Exception as error:
+                self._error = error
+            self._pending.task_done()
+
+    def _write(self, step, state):
+        path = self.path(step)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        for old_path in self.checkpoints()[:-self.keep_last]:
+            os.remove(old_path)
@@ -1,10 +1,10 @@
 import torch
-from tqdm import trange
 
 from model import DQN
 from game_env import GameEnv
 from strategies import StrategyFactory
 from hyperparameters import Hyperparameter
+from monte_carlo_evaluation import evaluate_adaptive, evaluate_model
 
 ##############################################################################################################
 # Evaluate the model
@@ -14,8 +14,15 @@ device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 hyperparameter = Hyperparameter()
 NUM_EPISODES = hyperparameter.NUM_EVAL_EPISODES
 MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+ENCODING = hyperparameter.OBSERVATION_ENCODING  # Must match the encoding the model was trained with
+WINDOW = hyperparameter.OBSERVATION_WINDOW
 
-env = GameEnv("prisoners_dilemma", render_mode=None, max_rounds=MAX_ROUNDS_PER_EPISODE)
+# Adaptive evaluation plays batches of episodes until the average reward is known to within EVAL_TOLERANCE (at most
+# NUM_EPISODES episodes), otherwise exactly NUM_EPISODES episodes are played
+ADAPTIVE_EVALUATION = True
+
+env = GameEnv("prisoners_dilemma", render_mode=None, max_rounds=MAX_ROUNDS_PER_EPISODE, encoding=ENCODING,
+              window=WINDOW)
 input_dim = len(env.reset()[0][0])
 output_dim = env.action_space.n
 
@@ -28,43 +35,37 @@ model_agent1.load_state_dict(torch.load(f"{env.game_modes.game_type}_agent1.pth"
 model_agent1.eval()  # Set to evaluation mode
 
 # select opponent strategy
+opponent_strategy = StrategyFactory.sample_strategy()
 strategy_agent1 = StrategyFactory.create_strategy(env, strategy_type="model")
-strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type="sample_from_dict")
 
 ##############################################################################################################
 # Evaluate the model
 ##############################################################################################################
-for _ in trange(NUM_EPISODES):
-    observations, _ = env.reset()
-    observation_agent1, observation_agent2 = observations
-    for _ in range(MAX_ROUNDS_PER_EPISODE + 1):
-        action_agent1 = strategy_agent1.select_action(observation_agent1, model_agent1)
-        action_agent2 = strategy_agent2.select_action(observation_agent2, model_agent1)
-
-        observations, _, terminated, _, _ = env.step(action_agent1, action_agent2)
-
-        observation_agent1, observation_agent2 = observations
-
-        # # # print for a sanity check
-        # print(f"-------------------")
-        # print(f"current_round: {env.current_round}")
-        # print(f"sampled strategy: {strategy_agent2.__class__.__name__}")
-        # print(f"observation_agent2: {observation_agent2}")
-        # print(f"action_agent1 previous round (opponent): {env.actions_history[env.current_round - 1][1]}")
-        # print(f"action_agent2: {action_agent2}")
-
-        if terminated:
-            env.episode_counter += 1  # Increment episode counter after termination
-            break
-
-print(f"Agent 1 Total Cumulative Reward: {env.agent1_total_cumulative_reward}")
-print(f"Agent 2 Total Cumulative Reward: {env.agent2_total_cumulative_reward}")
+if ADAPTIVE_EVALUATION:
+    stats = evaluate_adaptive("model", opponent_strategy, env.game_modes.game_type, MAX_ROUNDS_PER_EPISODE,
+                              model_agent1, tolerance=hyperparameter.EVAL_TOLERANCE,
+                              confidence=hyperparameter.EVAL_CONFIDENCE,
+                              batch_episodes=hyperparameter.EVAL_BATCH_EPISODES, max_episodes=NUM_EPISODES,
+                              encoding=ENCODING, window=WINDOW)
+    agent1_ci, agent2_ci = stats.half_width(hyperparameter.EVAL_CONFIDENCE)
+    print(f"Opponent strategy: {opponent_strategy}, episodes played: {stats.count}")
+    print(f"Agent 1 Average Cumulative Reward: {stats.mean[0]} ± {agent1_ci}")
+    print(f"Agent 2 Average Cumulative Reward: {stats.mean[1]} ± {agent2_ci}")
+else:
+    # All NUM_EPISODES episodes are played in lockstep, one batched forward pass of the model per round
+    results = evaluate_model(model_agent1, [opponent_strategy], env.game_modes.game_type, MAX_ROUNDS_PER_EPISODE,
+                             NUM_EPISODES, encoding=ENCODING, window=WINDOW)
+    for opponent, stats in results.items():
+        print(f"Opponent strategy: {opponent}, episodes played: {stats.count}")
+        print(f"Agent 1 Total Cumulative Reward: {stats.mean[0] * stats.count}")
+        print(f"Agent 2 Total Cumulative Reward: {stats.mean[1] * stats.count}")
 
 ##############################################################################################################
 # Visualize the game
 ##############################################################################################################
 
-env = GameEnv("prisoners_dilemma", render_mode="human", max_rounds=MAX_ROUNDS_PER_EPISODE)
+env = GameEnv("prisoners_dilemma", render_mode="human", max_rounds=MAX_ROUNDS_PER_EPISODE, encoding=ENCODING,
+              window=WINDOW)
 strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type="sample_from_dict")
 
 NUM_EPISODES = 100
@@ -0,0 +1,134 @@
+"""
+Evolutionary dynamics of strategy populations, driven by the pairwise payoffs of a tournament.
+
+payoffs[i, j] is the average cumulative reward of strategy i against strategy j, e.g. from payoff_matrix applied to
+the results of tournament_runner.run_round_robin. Both simulators evolve many independent populations at once,
+with one row per population in a NumPy array:
+    - replicator_dynamics: infinite populations, the share of strategy i grows with the difference between its
+      fitness and the population average
+    - moran_process: finite populations of population_size individuals, one birth and one death per step, stored
+      as counts per strategy so the cost of a step does not depend on the population size
+
+Mutation replaces a share mutation_rate of the offspring by uniformly random strategies, noise adds Gaussian noise
+of that standard deviation to the payoff of every strategy in every population at every step. The noise is drawn
+per (population, strategy), not per payoff matrix entry, so a step costs O(num_populations * num_strategies) random
+numbers and the payoffs are multiplied with one matrix product for all populations.
+"""
+import numpy as np
+
+
+def payoff_matrix(results, strategies_list):
+    """(num_strategies, num_strategies) matrix of average cumulative rewards from run_round_robin results"""
+    payoffs = np.zeros((len(strategies_list), len(strategies_list)))
+    for i, strat1 in enumerate(strategies_list):
+        for j, strat2 in enumerate(strategies_list):
+            payoffs[i, j] = results[(strat1, strat2)]["agent1_reward"]
+    return payoffs
+
+
+def _add_noise(payoffs, noise, rng):
+    # (num_populations, num_strategies) payoffs, perturbed in place
+    if noise != 0:
+        payoffs += noise * rng.standard_normal(payoffs.shape)
+    return payoffs
+
+
+def _sample_categorical(weights, rng):
+    # One draw per row of (num_populations, num_strategies) non-negative weights
+    cumulative = np.cumsum(weights, axis=1)
+    thresholds = rng.random(len(weights)) * cumulative[:, -1]
+    return (cumulative <= thresholds[:, None]).sum(axis=1)
+
+
+def replicator_dynamics(payoffs, shares, num_steps, step_size=0.01, mutation_rate=0., noise=0., record_every=1,
+                        rng=None):
+    """Euler integration of the replicator-mutator equation for many populations.
+
+    Args:
+        payoffs (np.ndarray): (num_strategies, num_strategies) payoff matrix
+        shares (np.ndarray): (num_populations, num_strategies) initial shares, rows sum to 1
+        num_steps (int): Number of integration steps
+        step_size (float): Length of an integration step
+        mutation_rate (float): Share of offspring with a uniformly random strategy
+        noise (float): Standard deviation of the Gaussian noise on each strategy's fitness, redrawn every step
+        record_every (int): Store the shares every record_every steps
+        rng (np.random.Generator): Random number generator, defaults to np.random.default_rng()
+
+    Returns:
+        (num_records, num_populations, num_strategies) shares, starting with the initial shares
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    shares = np.array(shares, dtype=float, ndmin=2)
+    num_populations, num_strategies = shares.shape
+    history = [shares.copy()]
+
+    for step in range(1, num_steps + 1):
+        fitness = _add_noise(shares @ payoffs.T, noise, rng)
+        average_fitness = (shares * fitness).sum(axis=1, keepdims=True)
+        shares = shares + step_size * shares * (fitness - average_fitness)
+        shares = (1 - mutation_rate) * shares + mutation_rate / num_strategies
+
+        # Large steps can overshoot below zero, project back onto the simplex
+        np.clip(shares, 0, None, out=shares)
+        shares /= shares.sum(axis=1, keepdims=True)
+        if step % record_every == 0:
+            history.append(shares.copy())
+    return np.stack(history)
+
+
+def moran_process(payoffs, counts, num_steps, selection_intensity=1., mutation_rate=0., noise=0., record_every=1,
+                  rng=None):
+    """Frequency-dependent Moran process for many finite populations.
+
+    Every step, in every population, one individual reproduces with probability proportional to its fitness
+    exp(selection_intensity * average payoff against the rest of the population), and its offspring, mutated with
+    probability mutation_rate, replaces an individual chosen uniformly at random.
+
+    Args:
+        payoffs (np.ndarray): (num_strategies, num_strategies) payoff matrix
+        counts (np.ndarray): (num_populations, num_strategies) initial number of individuals per strategy, all rows
+            have the same population size
+        num_steps (int): Number of birth-death steps
+        selection_intensity (float): 0 is neutral drift, larger values favor higher payoffs more strongly
+        mutation_rate (float): Probability that an offspring has a uniformly random strategy
+        noise (float): Standard deviation of the Gaussian noise on each strategy's average payoff, redrawn every step
+        record_every (int): Store the counts every record_every steps
+        rng (np.random.Generator): Random number generator, defaults to np.random.default_rng()
+
+    Returns:
+        (num_records, num_populations, num_strategies) counts, starting with the initial counts
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    counts = np.array(counts, dtype=np.int64, ndmin=2)
+    num_populations, num_strategies = counts.shape
+    population_size = counts.sum(axis=1)
+    assert (population_size == population_size[0]).all(), "All populations must have the same size"
+    population_size = population_size[0]
+    rows = np.arange(num_populations)
+    self_payoffs = np.diagonal(payoffs)
+    history = [counts.copy()]
+
+    for step in range(1, num_steps + 1):
+        # Average payoff of an individual of each strategy against the other population_size - 1 individuals
+        total_payoffs = counts @ payoffs.T - self_payoffs
+        average_payoffs = _add_noise(total_payoffs / max(population_size - 1, 1), noise, rng)
+
+        # Subtract the per-population maximum before exponentiating to keep the weights finite
+        fitness = np.exp(selection_intensity * (average_payoffs - average_payoffs.max(axis=1, keepdims=True)))
+        parents = _sample_categorical(counts * fitness, rng)
+        mutants = rng.random(num_populations) < mutation_rate
+        offspring = np.where(mutants, rng.integers(num_strategies, size=num_populations), parents)
+        deaths = _sample_categorical(counts, rng)
+
+        counts[rows, deaths] -= 1
+        counts[rows, offspring] += 1
+        if step % record_every == 0:
+            history.append(counts.copy())
+    return np.stack(history)
+
+
+def fixation(counts):
+    """Index of the strategy that has taken over each population, -1 where none has"""
+    counts = np.asarray(counts)
+    fixed = counts.max(axis=-1) == counts.sum(axis=-1)
+    return np.where(fixed, counts.argmax(axis=-1), -1)
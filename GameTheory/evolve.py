@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from strategies import StrategyFactory
+from hyperparameters import Hyperparameter
+from tournament_runner import MODEL_STRATEGY, run_round_robin
+from evolution import payoff_matrix, replicator_dynamics, moran_process, fixation
+
+hyperparameter = Hyperparameter()
+MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+GAME_TYPE = "prisoners_dilemma"
+MODEL_PATH = f"{GAME_TYPE}_agent1.pth"  # The model strategy only takes part if this file exists
+
+# Populations are simulated side by side, each starts with equal shares of all strategies
+NUM_POPULATIONS = 1000
+POPULATION_SIZE = 1000
+NUM_STEPS = 20000
+SELECTION_INTENSITY = 0.1
+MUTATION_RATE = 0.001
+NOISE = 0.5
+
+if __name__ == "__main__":
+    # Pairwise payoffs, exact expected rewards of every pairing (cached, see tournament.py)
+    strategies_list = list(StrategyFactory.strategy_probabilities.keys())
+    model_path = MODEL_PATH if os.path.exists(MODEL_PATH) else None
+    if model_path is None:
+        strategies_list.remove(MODEL_STRATEGY)
+    results = run_round_robin(strategies_list, GAME_TYPE, MAX_ROUNDS_PER_EPISODE, hyperparameter.NUM_EVAL_EPISODES,
+                              model_path=model_path, hidden_sizes=hyperparameter.HIDDEN_SIZES, mode="exact",
+                              encoding=hyperparameter.OBSERVATION_ENCODING, window=hyperparameter.OBSERVATION_WINDOW)
+    payoffs = payoff_matrix(results, strategies_list)
+    num_strategies = len(strategies_list)
+
+    # Infinite populations
+    shares = replicator_dynamics(payoffs, np.full((NUM_POPULATIONS, num_strategies), 1. / num_strategies),
+                                 NUM_STEPS, step_size=0.001, mutation_rate=MUTATION_RATE, noise=NOISE,
+                                 record_every=NUM_STEPS)[-1]
+
+    # Finite populations
+    counts = np.full((NUM_POPULATIONS, num_strategies), POPULATION_SIZE // num_strategies)
+    counts[:, 0] += POPULATION_SIZE - counts.sum(axis=1)
+    counts = moran_process(payoffs, counts, NUM_STEPS, selection_intensity=SELECTION_INTENSITY,
+                           mutation_rate=MUTATION_RATE, noise=NOISE, record_every=NUM_STEPS)[-1]
+    fixed = fixation(counts)
+
+    print(f"{'Strategy':<16}{'Replicator share':>18}{'Moran share':>14}{'Fixated in':>12}")
+    for i, strategy in enumerate(strategies_list):
+        print(f"{strategy:<16}{shares[:, i].mean():>18.3f}{counts[:, i].mean() / POPULATION_SIZE:>14.3f}"
+              f"{(fixed == i).mean():>12.1%}")
@@ -0,0 +1,46 @@
+import numpy as np
+
+from game_env import GameEnv
+from strategies import StrategyFactory
+from hyperparameters import Hyperparameter
+from exact_evaluation import expected_payoffs
+from fsm import FSM_LIBRARY, evolve_fsms, fsm_arrays, fsm_strategy
+
+hyperparameter = Hyperparameter()
+MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+GAME_TYPE = "prisoners_dilemma"
+
+# Genetic algorithm parameters, see fsm.evolve_fsms
+NUM_STATES = 4
+POPULATION_SIZE = 2000
+GENERATIONS = 200
+MUTATION_RATE = 0.02
+NOISE = 0.  # Probability of a random action per round, > 0 favors automata that recover from mistakes
+
+if __name__ == "__main__":
+    env = GameEnv(GAME_TYPE, render_mode=None, max_rounds=MAX_ROUNDS_PER_EPISODE)
+    payoffs = env.game_modes.get_payoff_matrix()
+
+    # Evolve automata against the scripted strategies that are automata themselves
+    opponents = [fsm_arrays(name) for name in FSM_LIBRARY]
+    transitions, outputs, history = evolve_fsms(opponents, payoffs, MAX_ROUNDS_PER_EPISODE, num_states=NUM_STATES,
+                                                population_size=POPULATION_SIZE, generations=GENERATIONS,
+                                                mutation_rate=MUTATION_RATE, noise=NOISE,
+                                                rng=np.random.default_rng(0))
+    for generation in range(0, GENERATIONS, max(GENERATIONS // 10, 1)):
+        print(f"Generation {generation}: best fitness {history[generation, 0]:.2f}, "
+              f"mean fitness {history[generation, 1]:.2f}")
+
+    print("\nBest automaton (state: action, next state after opponent's cooperate / defect):")
+    for state in range(NUM_STATES):
+        print(f"{state}: {outputs[0, state]}, {transitions[0, state, 0]} / {transitions[0, state, 1]}")
+
+    # Exact expected rewards of the best automaton against every scripted strategy
+    fsm_strategy(transitions[0], outputs[0], "evolved_fsm")
+    for opponent in StrategyFactory.strategy_probabilities:
+        if opponent in ("model", "evolved_fsm"):
+            continue
+        strategy_agent1 = StrategyFactory.create_strategy(env, strategy_type="evolved_fsm")
+        strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=opponent)
+        agent1_reward, agent2_reward = expected_payoffs(strategy_agent1, strategy_agent2, env)
+        print(f"Evolved FSM vs {opponent}: {agent1_reward:.2f} vs {agent2_reward:.2f}")
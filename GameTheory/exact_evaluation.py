@@ -0,0 +1,113 @@
+"""
+Exact expected payoffs of iterated games between two strategies.
+
+Instead of sampling episodes, the joint histories are expanded round by round and every history carries the
+probability of being reached. Deterministic strategies put all probability on one action, so a pairing of two
+deterministic strategies follows a single path. Stochastic strategies (RandomPick, AverageCopier, models with
+epsilon > 0) branch into every action with non-zero probability.
+
+Histories after which both strategies behave identically are merged: each strategy reports a compact memo_key of
+the episode so far (e.g. the opponent's defection count for GoByMajority), and histories with the same pair of keys
+are collapsed into one node whose probabilities are added up. This keeps e.g. AverageCopier vs RandomPick at
+O(rounds) nodes per round instead of 4^rounds histories. Strategies that cannot be summarized, e.g. a model with
+epsilon > 0 on 'history' observations, keep every history apart, so the number of nodes is capped by max_nodes.
+"""
+import numpy as np
+
+from game_env import GameEnv
+from strategies import StrategyFactory
+
+
+def _load(strategy, history, observation):
+    # Rebuild the strategy's running state for this history, nodes are not visited in episode order. The rounds are
+    # replayed from the history since a summary observation only holds the last few of them
+    strategy.reset()
+    for own_action, opponent_action in history:
+        strategy.update(own_action, opponent_action)
+    return strategy.memo_key(observation)
+
+
+def _swapped(history):
+    return [(action_agent2, action_agent1) for action_agent1, action_agent2 in history]
+
+
+def expected_payoffs(strategy_agent1, strategy_agent2, env, model=None, max_nodes=100000):
+    """Expected cumulative payoffs of both agents over one episode.
+
+    Args:
+        strategy_agent1 (Strategy): Strategy of agent 1, created on env
+        strategy_agent2 (Strategy): Strategy of agent 2, created on env
+        env (GameEnv): Environment the strategies were created on, only its current_round is changed
+        model (torch.nn.Module): Model passed on to model strategies
+        max_nodes (int): Maximum number of merged histories per round, a ValueError is raised beyond it
+
+    Returns:
+        np.ndarray of shape (2,) with the expected cumulative rewards of agent 1 and agent 2
+    """
+    payoffs = np.asarray(env.game_modes.get_payoff_matrix(), dtype=float)
+    max_rounds = env.max_rounds
+    expected = np.zeros(2)
+
+    # memo key pair -> [probability, representative history, observations of both agents]
+    frontier = {((), ()): [1., (), env.observations_from_history(())]}
+    for round_idx in range(max_rounds):
+        next_frontier = {}
+        for probability, history, (observation_agent1, observation_agent2) in frontier.values():
+            env.current_round = round_idx
+            _load(strategy_agent1, history, observation_agent1)
+            _load(strategy_agent2, _swapped(history), observation_agent2)
+            probabilities_agent1 = strategy_agent1.action_probabilities(observation_agent1, model)
+            probabilities_agent2 = strategy_agent2.action_probabilities(observation_agent2, model)
+            for strategy, probabilities in ((strategy_agent1, probabilities_agent1),
+                                            (strategy_agent2, probabilities_agent2)):
+                if (len(probabilities) != env.action_space.n or (probabilities < 0).any()
+                        or not np.isclose(probabilities.sum(), 1.)):
+                    raise ValueError(f"{type(strategy).__name__} returned invalid action probabilities "
+                                     f"{probabilities} for {env.action_space.n} actions")
+
+            for action_agent1 in np.flatnonzero(probabilities_agent1):
+                for action_agent2 in np.flatnonzero(probabilities_agent2):
+                    branch_probability = (probability * probabilities_agent1[action_agent1]
+                                          * probabilities_agent2[action_agent2])
+                    expected += branch_probability * payoffs[action_agent1, action_agent2]
+
+                    if round_idx + 1 == max_rounds:
+                        continue
+                    child_history = history + ((int(action_agent1), int(action_agent2)),)
+                    env.current_round = round_idx + 1
+                    child_observations = env.observations_from_history(child_history)
+                    key = (_load(strategy_agent1, child_history, child_observations[0]),
+                           _load(strategy_agent2, _swapped(child_history), child_observations[1]))
+                    if key in next_frontier:
+                        next_frontier[key][0] += branch_probability
+                    else:
+                        next_frontier[key] = [branch_probability, child_history, child_observations]
+        if len(next_frontier) > max_nodes:
+            raise ValueError(f"{type(strategy_agent1).__name__} vs {type(strategy_agent2).__name__} reaches "
+                             f"{len(next_frontier)} distinct histories in round {round_idx + 2}, more than max_nodes, "
+                             "evaluate it with monte_carlo_evaluation instead")
+        frontier = next_frontier
+
+    env.current_round = 0
+    return expected
+
+
+def exact_round_robin(strategies_list, game_type, max_rounds, model=None, encoding="history", window=4):
+    """Expected cumulative payoffs for every ordered pair of strategies.
+
+    Args:
+        encoding (str): Observation encoding the model was trained with, see GameEnv
+        window (int): Window of 'summary' observations
+
+    Returns:
+        dict mapping (strat1, strat2) to {"agent1_reward": float, "agent2_reward": float}
+    """
+    env = GameEnv(game_type, render_mode=None, max_rounds=max_rounds, encoding=encoding, window=window)
+    results = {}
+    for strat1 in strategies_list:
+        for strat2 in strategies_list:
+            strategy_agent1 = StrategyFactory.create_strategy(env, strategy_type=strat1)
+            strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=strat2)
+            agent1_reward, agent2_reward = expected_payoffs(strategy_agent1, strategy_agent2, env, model)
+            results[(strat1, strat2)] = {"agent1_reward": agent1_reward, "agent2_reward": agent2_reward}
+    return results
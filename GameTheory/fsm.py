@@ -0,0 +1,238 @@
+"""
+Strategies as finite-state automata, executed in batches and searched with a genetic algorithm.
+
+An automaton with num_states states for a game with num_actions actions is two small integer arrays:
+    outputs (num_states,): action played in each state
+    transitions (num_states, num_actions): next state, given the current state and the opponent's last action
+It starts in state 0. Many of the scripted strategies are automata, see FSM_LIBRARY.
+
+play_fsms plays many pairs of automata against each other at once. The automata are stacked along a leading axis
+and every round is a handful of array lookups, so the cost per round does not depend on the strategies involved.
+evolve_fsms evolves a population of automata against a pool of opponents with this executor.
+"""
+import numpy as np
+
+from strategies import Strategy, BatchStrategy, StrategyFactory
+
+# Scripted strategies as (transitions, outputs), states 0 and 1 play cooperate (0) and defect (1)
+FSM_LIBRARY = {
+    "cooperator": ([[0, 0]], [0]),
+    "defector": ([[0, 0]], [1]),
+    "tit_for_tat": ([[0, 1], [0, 1]], [0, 1]),  # Go to the state that plays the opponent's last action
+    "grudger": ([[0, 1], [1, 1]], [0, 1]),  # Defect forever after the first defection
+    "alternator": ([[1, 1], [0, 0]], [0, 1]),  # Switch state every round
+    "appeaser": ([[0, 1], [1, 0]], [0, 1]),  # Switch state whenever the opponent defects
+}
+
+
+def fsm_arrays(name):
+    """transitions and outputs of a FSM_LIBRARY strategy as integer arrays"""
+    transitions, outputs = FSM_LIBRARY[name]
+    return np.array(transitions, dtype=np.int8), np.array(outputs, dtype=np.int8)
+
+
+class FSMStrategy(Strategy):
+    """Plays an automaton, see fsm_strategy to register one with StrategyFactory
+
+    Args:
+        env (GameEnv): Environment the strategy plays in
+        transitions (np.ndarray): (num_states, num_actions) next states, defaults to the class attribute
+        outputs (np.ndarray): (num_states,) actions, defaults to the class attribute
+    """
+    transitions = None
+    outputs = None
+
+    def __init__(self, env, transitions=None, outputs=None):
+        if transitions is not None:
+            self.transitions = np.asarray(transitions)
+            self.outputs = np.asarray(outputs)
+        super().__init__(env)
+
+    def reset(self):
+        super().reset()
+        self.state = 0
+
+    def update(self, own_action, opponent_action):
+        super().update(own_action, opponent_action)
+        self.state = int(self.transitions[self.state, self.last_opponent_action])
+
+    def select_action(self, observation, model=None):
+        self._sync(observation)
+        return int(self.outputs[self.state])
+
+    def memo_key(self, observation):
+        self._sync(observation)
+        return self.state
+
+
+class BatchFSMStrategy(BatchStrategy):
+    transitions = None
+    outputs = None
+
+    def __init__(self, env, transitions=None, outputs=None):
+        if transitions is not None:
+            self.transitions = np.asarray(transitions)
+            self.outputs = np.asarray(outputs)
+        super().__init__(env)
+
+    def reset(self):
+        super().reset()
+        self.states = np.zeros(self.env.num_envs, dtype=np.int64)
+
+    def update(self, own_actions, opponent_actions):
+        super().update(own_actions, opponent_actions)
+        self.states = self.transitions[self.states, self.last_opponent_action].astype(np.int64)
+
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return self.outputs[self.states].astype(int)
+
+
+def fsm_strategy(transitions, outputs, name):
+    """Register an automaton in StrategyFactory with sampling probability 0, returns its Strategy subclass"""
+    attributes = {"transitions": np.asarray(transitions), "outputs": np.asarray(outputs)}
+    strategy = type("FSMStrategy", (FSMStrategy,), attributes)
+    StrategyFactory.strategy_probabilities[name] = (0., strategy)
+    StrategyFactory.batch_strategies[name] = type("BatchFSMStrategy", (BatchFSMStrategy,), attributes)
+    return strategy
+
+
+def stack_fsms(fsms, num_states=None):
+    """Stack (transitions, outputs) pairs with up to num_states states into (n, num_states, num_actions) and
+    (n, num_states) arrays, smaller automata are padded with unreachable states"""
+    fsms = [(np.asarray(transitions), np.asarray(outputs)) for transitions, outputs in fsms]
+    num_states = num_states or max(len(outputs) for _, outputs in fsms)
+    num_actions = fsms[0][0].shape[1]
+    transitions = np.zeros((len(fsms), num_states, num_actions), dtype=np.int8)
+    outputs = np.zeros((len(fsms), num_states), dtype=np.int8)
+    for i, (fsm_transitions, fsm_outputs) in enumerate(fsms):
+        transitions[i, :len(fsm_outputs)] = fsm_transitions
+        outputs[i, :len(fsm_outputs)] = fsm_outputs
+    return transitions, outputs
+
+
+def play_fsms(transitions1, outputs1, transitions2, outputs2, payoffs, max_rounds, noise=0., rng=None):
+    """Play n pairs of automata against each other, one episode per pair.
+
+    Args:
+        transitions1 (np.ndarray): (n, num_states, num_actions) transitions of the automata playing agent 1
+        outputs1 (np.ndarray): (n, num_states) outputs of the automata playing agent 1
+        transitions2 (np.ndarray): Same for agent 2, the number of states may differ
+        outputs2 (np.ndarray): Same for agent 2
+        payoffs (np.ndarray): (num_actions, num_actions, 2) payoffs, see GameModes.get_payoff_matrix
+        max_rounds (int): Number of rounds per episode
+        noise (float): Probability that an action is replaced by a uniformly random one
+        rng (np.random.Generator): Random number generator for the noise
+
+    Returns:
+        (n, 2) cumulative rewards of agent 1 and agent 2
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    num_pairs = len(outputs1)
+    num_actions = payoffs.shape[0]
+    rows = np.arange(num_pairs)
+    states1 = np.zeros(num_pairs, dtype=np.int64)
+    states2 = np.zeros(num_pairs, dtype=np.int64)
+    rewards = np.zeros((num_pairs, 2), dtype=payoffs.dtype)
+
+    for _ in range(max_rounds):
+        actions1 = outputs1[rows, states1]
+        actions2 = outputs2[rows, states2]
+        if noise > 0:
+            actions1 = np.where(rng.random(num_pairs) < noise, rng.integers(num_actions, size=num_pairs), actions1)
+            actions2 = np.where(rng.random(num_pairs) < noise, rng.integers(num_actions, size=num_pairs), actions2)
+        rewards += payoffs[actions1, actions2]
+        states1 = transitions1[rows, states1, actions2]
+        states2 = transitions2[rows, states2, actions1]
+    return rewards
+
+
+def fitness(transitions, outputs, opponent_transitions, opponent_outputs, payoffs, max_rounds, noise=0., rng=None):
+    """Average reward of each of n automata against every opponent, playing both seats.
+
+    Returns:
+        (n,) average cumulative reward per episode
+    """
+    num_fsms, num_opponents = len(outputs), len(opponent_outputs)
+    fsm_idx = np.repeat(np.arange(num_fsms), num_opponents)
+    opponent_idx = np.tile(np.arange(num_opponents), num_fsms)
+    rewards1 = play_fsms(transitions[fsm_idx], outputs[fsm_idx], opponent_transitions[opponent_idx],
+                         opponent_outputs[opponent_idx], payoffs, max_rounds, noise, rng)[:, 0]
+    rewards2 = play_fsms(opponent_transitions[opponent_idx], opponent_outputs[opponent_idx], transitions[fsm_idx],
+                         outputs[fsm_idx], payoffs, max_rounds, noise, rng)[:, 1]
+    return (rewards1 + rewards2).reshape(num_fsms, num_opponents).mean(axis=1) / 2
+
+
+def random_fsms(num_fsms, num_states, num_actions, rng):
+    transitions = rng.integers(num_states, size=(num_fsms, num_states, num_actions)).astype(np.int8)
+    outputs = rng.integers(num_actions, size=(num_fsms, num_states)).astype(np.int8)
+    return transitions, outputs
+
+
+def evolve_fsms(opponents, payoffs, max_rounds, num_states=4, population_size=1000, generations=100,
+                mutation_rate=0.02, elite=10, noise=0., self_play=True, rng=None):
+    """Genetic algorithm over automata with num_states states.
+
+    Every generation, each automaton plays both seats against every opponent (and, with self_play, against a
+    random member of its own generation), the best elite survive unchanged and the rest of the next generation is
+    bred from tournament-selected parents by uniform crossover of whole states, followed by point mutations.
+
+    Args:
+        opponents (list): (transitions, outputs) of the opponent pool, e.g. fsm_arrays of FSM_LIBRARY strategies
+        payoffs (np.ndarray): (num_actions, num_actions, 2) payoffs, see GameModes.get_payoff_matrix
+        max_rounds (int): Number of rounds per episode
+        num_states (int): Number of states of the evolved automata
+        population_size (int): Number of automata per generation
+        generations (int): Number of generations
+        mutation_rate (float): Probability that a transition or output is redrawn uniformly at random
+        elite (int): Number of best automata copied unchanged into the next generation
+        noise (float): Probability that an action is replaced by a uniformly random one, see play_fsms
+        self_play (bool): Also play against the current generation, so the pool is not the only selection pressure
+        rng (np.random.Generator): Random number generator, defaults to np.random.default_rng()
+
+    Returns:
+        transitions and outputs of the final generation, sorted by fitness, and the (generations, 2) best and mean
+        fitness per generation
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    payoffs = np.asarray(payoffs)
+    num_actions = payoffs.shape[0]
+    opponent_transitions, opponent_outputs = stack_fsms(opponents)
+    transitions, outputs = random_fsms(population_size, num_states, num_actions, rng)
+    history = np.zeros((generations, 2))
+
+    for generation in range(generations):
+        scores = fitness(transitions, outputs, opponent_transitions, opponent_outputs, payoffs, max_rounds, noise,
+                         rng)
+        if self_play:
+            partners = rng.permutation(population_size)
+            scores = scores * len(opponents) + play_fsms(transitions, outputs, transitions[partners],
+                                                         outputs[partners], payoffs, max_rounds, noise, rng)[:, 0]
+            scores /= len(opponents) + 1
+        order = np.argsort(-scores, kind="stable")
+        transitions, outputs, scores = transitions[order], outputs[order], scores[order]
+        history[generation] = scores[0], scores.mean()
+        if generation + 1 == generations:
+            break
+
+        # Binary tournament selection of two parents per child
+        num_children = population_size - elite
+        candidates = rng.integers(population_size, size=(2, num_children, 2))
+        parents = np.where(scores[candidates[..., 0]] >= scores[candidates[..., 1]], candidates[..., 0],
+                           candidates[..., 1])
+
+        # Uniform crossover of whole states, a state keeps its transitions and output together
+        from_first = rng.random((num_children, num_states)) < 0.5
+        child_transitions = np.where(from_first[..., None], transitions[parents[0]], transitions[parents[1]])
+        child_outputs = np.where(from_first, outputs[parents[0]], outputs[parents[1]])
+
+        # Point mutations
+        mutate = rng.random(child_transitions.shape) < mutation_rate
+        child_transitions[mutate] = rng.integers(num_states, size=mutate.sum())
+        mutate = rng.random(child_outputs.shape) < mutation_rate
+        child_outputs[mutate] = rng.integers(num_actions, size=mutate.sum())
+
+        transitions = np.concatenate((transitions[:elite], child_transitions))
+        outputs = np.concatenate((outputs[:elite], child_outputs))
+
+    return transitions, outputs, history
@@ -1,13 +1,34 @@
+from functools import partial
+
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 
 from game_modes import GameModes
+from n_player_games import N_PLAYER_GAMES
 from game_renderer import GameRenderer
+from observation_encoder import OBSERVATION_ENCODINGS, SummaryEncoder
 
 class GameEnv(gym.Env):
-    def __init__(self, game_type, render_mode, max_rounds=10):
+    """Two-agent iterated matrix game.
+
+    Args:
+        game_type (str): Name of the game, see GameModes
+        render_mode (str): 'human' to render with pygame, None otherwise
+        max_rounds (int): Number of rounds per episode
+        obs_mode (str): 'list' returns observations as flat Python lists. 'array' writes them into preallocated
+            float32 buffers per agent and returns those buffers, which torch.from_numpy can wrap without copying.
+            The buffers are double-buffered, so an observation stays valid until the step after the next one.
+        encoding (str): 'history' observes the whole padded episode, 2 * max_rounds actions followed by the
+            max_rounds mask. 'summary' observes a fixed-size SummaryEncoder summary of the episode instead.
+        window (int): Number of most recent joint actions in 'summary' observations
+    """
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 3}
+
+    def __init__(self, game_type, render_mode, max_rounds=10, obs_mode="list", encoding="history", window=4):
         super(GameEnv, self).__init__()
+        assert obs_mode in ("list", "array"), "obs_mode must be 'list' or 'array'"
+        assert encoding in OBSERVATION_ENCODINGS, f"encoding must be one of {OBSERVATION_ENCODINGS}"
 
         self.game_modes = GameModes(game_type)
         num_actions = len(self.game_modes.get_action_names())
@@ -31,18 +52,32 @@ class GameEnv(gym.Env):
         self.actions_mask = np.zeros(self.max_rounds, dtype=int)
         self.payoffs_mask = np.zeros((self.max_rounds, 2), dtype=int)
 
+        # Observation buffers for obs_mode 'array': (slot, agent, features), agent 2's buffer has swapped columns
+        self.obs_mode = obs_mode
+        self._obs_buffers = np.zeros((2, 2, 3 * self.max_rounds), dtype=np.float32)
+        self._obs_slot = 0
+
         # observation space
-        self.observation_space = spaces.Tuple([
-            spaces.MultiBinary([num_actions, num_actions] * max_rounds),  # Actions history
-            spaces.MultiBinary(max_rounds),  # Actions mask
-            # spaces.Discrete(max_rounds),  # Current round
-            # spaces.Discrete(max_rounds),  # Total rounds
-            # spaces.Box(low=min_payoff, high=max_payoff, shape=(num_actions ** 2,), dtype=np.float32)  # Game params
-        ])
+        self.encoding = encoding
+        self.window = window
+        self.encoder = None
+        if encoding == "summary":
+            self.encoder = SummaryEncoder(1, max_rounds, window, (min_payoff, max_payoff))
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(self.encoder.size,),
+                                                dtype=np.float32)
+        else:
+            self.observation_space = spaces.Tuple([
+                spaces.MultiBinary([num_actions, num_actions] * max_rounds),  # Actions history
+                spaces.MultiBinary(max_rounds),  # Actions mask
+                # spaces.Discrete(max_rounds),  # Current round
+                # spaces.Discrete(max_rounds),  # Total rounds
+                # spaces.Box(low=min_payoff, high=max_payoff, shape=(num_actions ** 2,), dtype=np.float32)
+            ])
 
         self.renderer = None
-        if render_mode == 'human':
-            self.renderer = GameRenderer(self.game_modes)  # Pass instantiated GameModes object to GameRenderer
+        if render_mode in ('human', 'rgb_array'):
+            # Pass instantiated GameModes object to GameRenderer, 'rgb_array' draws off-screen
+            self.renderer = GameRenderer(self.game_modes, headless=render_mode == 'rgb_array')
 
         # reset after each step
         self.agent1_action = None
@@ -69,6 +104,10 @@ class GameEnv(gym.Env):
         self.actions_history = np.zeros((self.max_rounds, 2), dtype=int)
         self.actions_mask = np.zeros(self.max_rounds, dtype=int)
         self.rewards_history.fill(0)
+        self._obs_buffers.fill(0)
+        self._obs_slot = 0
+        if self.encoder is not None:
+            self.encoder.reset()
 
         self.agent1_avg_reward = 0
         self.agent2_avg_reward = 0
@@ -98,6 +137,10 @@ class GameEnv(gym.Env):
 
         self.terminated = self.current_round >= self.max_rounds
 
+        if self.encoder is not None:
+            self.encoder.step(action_agent1, action_agent2, payoff[0], payoff[1], self.current_round)
+        elif self.obs_mode == "array":
+            self._write_observation_buffers()
         obs_agent1 = self._get_observation(1)
         obs_agent2 = self._get_observation(2)
 
@@ -119,7 +162,26 @@ class GameEnv(gym.Env):
 
         return (obs_agent1, obs_agent2), (payoff[0], payoff[1]), self.terminated, self.truncated, {}
 
+    def _write_observation_buffers(self):
+        # Switch to the other slot, it is two steps behind, so both the previous and the current round are written
+        self._obs_slot = 1 - self._obs_slot
+        buffers = self._obs_buffers[self._obs_slot]
+        for round_idx in range(max(self.current_round - 2, 0), self.current_round):
+            action_agent1, action_agent2 = self.actions_history[round_idx]
+            buffers[0, 2 * round_idx] = action_agent1
+            buffers[0, 2 * round_idx + 1] = action_agent2
+            buffers[1, 2 * round_idx] = action_agent2
+            buffers[1, 2 * round_idx + 1] = action_agent1
+            buffers[:, 2 * self.max_rounds + round_idx] = 1
+
     def _get_observation(self, agent_number):
+        if self.encoder is not None:
+            observation = self.encoder.observation(agent_number)[0]
+            return observation if self.obs_mode == "array" else observation.tolist()
+
+        if self.obs_mode == "array":
+            return self._obs_buffers[self._obs_slot, agent_number - 1]
+
         if agent_number == 1:
             actions_hist = self.actions_history
         else:
@@ -133,9 +195,36 @@ class GameEnv(gym.Env):
         flat_list = list(actions_hist.flatten()) + list(actions_mask)
         return flat_list
 
+    def round_actions(self, observation, round_idx):
+        """Own and opponent action of round round_idx as seen in an observation of the current round"""
+        if self.encoder is not None:
+            action_idx = self.encoder.action_index(round_idx, self.current_round)
+            return observation[action_idx], observation[action_idx + 1]
+        return observation[2 * round_idx], observation[2 * round_idx + 1]
+
+    def observations_from_history(self, history):
+        """List observations of both agents after the joint actions in history, without stepping the env
+
+        Args:
+            history (sequence): (action_agent1, action_agent2) pairs of the rounds played so far
+        """
+        if self.encoder is not None:
+            encoder = SummaryEncoder(1, self.max_rounds, self.encoder.window, self.game_modes.get_payoff_bounds())
+            for round_idx, (action_agent1, action_agent2) in enumerate(history):
+                payoff = self.game_modes.get_payoff(action_agent1, action_agent2)
+                encoder.step(action_agent1, action_agent2, payoff[0], payoff[1], round_idx + 1)
+            return encoder.observation(1)[0].tolist(), encoder.observation(2)[0].tolist()
+
+        padding = [0] * (2 * (self.max_rounds - len(history)))
+        actions_mask = [1] * len(history) + [0] * (self.max_rounds - len(history))
+        observation_agent1 = [action for joint_action in history for action in joint_action] + padding + actions_mask
+        observation_agent2 = ([action for joint_action in history for action in joint_action[::-1]] + padding
+                              + actions_mask)
+        return observation_agent1, observation_agent2
+
     def render(self):
-        if self.render_mode == 'human':
-            self.renderer.render(self.agent1_action, self.agent2_action, self.agent1_reward, self.agent2_reward,
+        if self.renderer is not None and self.agent1_action is not None:
+            return self.renderer.render(self.agent1_action, self.agent2_action, self.agent1_reward, self.agent2_reward,
                                  self.agent1_cumulative_reward, self.agent2_cumulative_reward,
                                  self.agent1_avg_reward, self.agent2_avg_reward,
                                  self.agent1_total_cumulative_reward, self.agent2_total_cumulative_reward,
@@ -144,4 +233,408 @@ class GameEnv(gym.Env):
                                  self.current_round)
 
     def close(self):
-        self.renderer.close()
\ No newline at end of file
+        if self.renderer is not None:
+            self.renderer.close()
+
+    def init_kwargs(self):
+        """Constructor arguments except render_mode, to recreate the environment when replaying a recording"""
+        return {"game_type": self.game_modes.game_type, "max_rounds": self.max_rounds, "obs_mode": self.obs_mode,
+                "encoding": self.encoding, "window": self.window}
+
+    def snapshot(self):
+        """Actions, rewards and counters shown by render(), recorded every step by Pong/recorder.py"""
+        return np.array([-1 if self.agent1_action is None else self.agent1_action,
+                         -1 if self.agent2_action is None else self.agent2_action,
+                         self.agent1_reward, self.agent2_reward,
+                         self.agent1_cumulative_reward, self.agent2_cumulative_reward,
+                         self.agent1_total_cumulative_reward, self.agent2_total_cumulative_reward,
+                         self.total_rounds, self.episode_counter, self.current_round], dtype=np.float64)
+
+    def episode_snapshot(self):
+        return {}
+
+    def load_snapshot(self, episode, snapshot):
+        """Set the values render() shows from a recorded snapshot"""
+        (action_agent1, action_agent2, self.agent1_reward, self.agent2_reward,
+         self.agent1_cumulative_reward, self.agent2_cumulative_reward,
+         self.agent1_total_cumulative_reward, self.agent2_total_cumulative_reward) = snapshot[:8].tolist()
+        self.total_rounds, self.episode_counter, self.current_round = (int(value) for value in snapshot[8:])
+        self.agent1_action = None if action_agent1 < 0 else int(action_agent1)
+        self.agent2_action = None if action_agent2 < 0 else int(action_agent2)
+        self.agent1_avg_reward = self.agent1_cumulative_reward / max(self.current_round, 1)
+        self.agent2_avg_reward = self.agent2_cumulative_reward / max(self.current_round, 1)
+        self.agent1_total_avg_reward = self.agent1_total_cumulative_reward / max(self.total_rounds, 1)
+        self.agent2_total_avg_reward = self.agent2_total_cumulative_reward / max(self.total_rounds, 1)
+
+class VecGameEnv:
+    """Runs num_envs episodes of the same game in lockstep.
+
+    All state is kept in NumPy arrays with a leading episode dimension, so one call to step() advances every
+    episode by one round. Observations for each episode are identical to those of an independent GameEnv.
+
+    Args:
+        game_type (str): Name of the game, see GameModes
+        num_envs (int): Number of episodes that are played side by side
+        max_rounds (int): Number of rounds per episode
+        encoding (str): 'history' or 'summary', see GameEnv. Summary observations are views into double-buffered
+            arrays, they stay valid until the step after the next one.
+        window (int): Number of most recent joint actions in 'summary' observations
+    """
+    def __init__(self, game_type, num_envs, max_rounds=10, encoding="history", window=4):
+        assert encoding in OBSERVATION_ENCODINGS, f"encoding must be one of {OBSERVATION_ENCODINGS}"
+        self.game_modes = GameModes(game_type)
+        self.payoffs = np.asarray(self.game_modes.get_payoff_matrix())
+        num_actions = len(self.game_modes.get_action_names())
+
+        self.num_envs = num_envs
+        self.max_rounds = max_rounds
+        self.action_space = spaces.Discrete(num_actions)
+        self.encoding = encoding
+        self.encoder = None
+        if encoding == "summary":
+            self.encoder = SummaryEncoder(num_envs, max_rounds, window, self.game_modes.get_payoff_bounds())
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(self.encoder.size,),
+                                                dtype=np.float32)
+        else:
+            self.observation_space = spaces.Tuple([
+                spaces.MultiBinary([num_actions, num_actions] * max_rounds),  # Actions history
+                spaces.MultiBinary(max_rounds),  # Actions mask
+            ])
+
+        self.current_round = 0
+        self.total_rounds = 0
+        self.episode_counter = 1
+
+        # (num_envs, max_rounds, 2) history of both agents' actions and payoffs
+        self.actions_history = np.zeros((num_envs, max_rounds, 2), dtype=int)
+        self.rewards_history = np.zeros((num_envs, max_rounds, 2), dtype=self.payoffs.dtype)
+        self.actions_mask = np.zeros((num_envs, max_rounds), dtype=int)
+
+        # reset after each episode
+        self.cumulative_rewards = np.zeros((num_envs, 2), dtype=self.payoffs.dtype)
+
+        # never reset
+        self.total_cumulative_rewards = np.zeros((num_envs, 2), dtype=self.payoffs.dtype)
+
+    def reset(self):
+        self.current_round = 0
+
+        self.actions_history.fill(0)
+        self.rewards_history.fill(0)
+        self.actions_mask.fill(0)
+        self.cumulative_rewards.fill(0)
+        if self.encoder is not None:
+            self.encoder.reset()
+
+        return (self._get_observation(1), self._get_observation(2)), {}
+
+    def step(self, actions_agent1, actions_agent2):
+        """Advance every episode by one round.
+
+        Args:
+            actions_agent1 (array-like): (num_envs,) actions of agent 1
+            actions_agent2 (array-like): (num_envs,) actions of agent 2
+
+        Returns:
+            Observations of both agents as (num_envs, obs_dim) arrays, the (num_envs,) rewards of both agents,
+            terminated and truncated flags of shape (num_envs,) and an empty info dict.
+        """
+        actions_agent1 = np.asarray(actions_agent1, dtype=int)
+        actions_agent2 = np.asarray(actions_agent2, dtype=int)
+
+        round_idx = self.current_round
+        self.current_round += 1
+        self.total_rounds += 1
+
+        payoffs = self.game_modes.get_payoffs(actions_agent1, actions_agent2)
+
+        self.actions_history[:, round_idx, 0] = actions_agent1
+        self.actions_history[:, round_idx, 1] = actions_agent2
+        self.actions_mask[:, round_idx] = 1
+        self.rewards_history[:, round_idx] = payoffs
+
+        self.cumulative_rewards += payoffs
+        self.total_cumulative_rewards += payoffs
+        if self.encoder is not None:
+            self.encoder.step(actions_agent1, actions_agent2, payoffs[:, 0], payoffs[:, 1], self.current_round)
+
+        terminated = np.full(self.num_envs, self.current_round >= self.max_rounds)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+
+        observations = (self._get_observation(1), self._get_observation(2))
+        return observations, (payoffs[:, 0], payoffs[:, 1]), terminated, truncated, {}
+
+    @property
+    def avg_rewards(self):
+        return self.cumulative_rewards / max(self.current_round, 1)
+
+    @property
+    def total_avg_rewards(self):
+        return self.total_cumulative_rewards / max(self.total_rounds, 1)
+
+    def round_actions(self, batch_state, round_idx):
+        """(num_envs,) own and opponent actions of round round_idx as seen in observations of the current round"""
+        if self.encoder is not None:
+            action_idx = self.encoder.action_index(round_idx, self.current_round)
+            return batch_state[:, action_idx], batch_state[:, action_idx + 1]
+        return batch_state[:, 2 * round_idx], batch_state[:, 2 * round_idx + 1]
+
+    def _get_observation(self, agent_number):
+        if self.encoder is not None:
+            return self.encoder.observation(agent_number)
+
+        if agent_number == 1:
+            actions_hist = self.actions_history
+        else:
+            actions_hist = self.actions_history[:, :, ::-1]
+
+        return np.concatenate((actions_hist.reshape(self.num_envs, -1), self.actions_mask), axis=1)
+
+
+class NPlayerGameEnv:
+    """Runs num_envs episodes of an N-player game in lockstep.
+
+    The history is stored as (num_envs, num_players, max_rounds) arrays and every step is a few array operations,
+    whatever the number of players and episodes.
+
+    Each player observes the action history from its own point of view: with obs_mode 'full' the joint actions of
+    every round, starting with its own action and followed by the others in seat order after it, gathered with one
+    index array, then the actions mask. With two players this is the 'history' observation of GameEnv. With obs_mode
+    'aggregate' only its own history and, per round, the share of the other players that cooperated (action 0), then
+    the mask, which keeps observations small for 10-100 players.
+
+    Args:
+        game_type (str): Name of the game, see n_player_games
+        num_players (int): Number of players
+        num_envs (int): Number of episodes that are played side by side
+        max_rounds (int): Number of rounds per episode
+        obs_mode (str): 'full' or 'aggregate'
+        game_params (dict): Keyword arguments of the game's payoff function, e.g. {"multiplier": 2.}
+    """
+    def __init__(self, game_type, num_players, num_envs=1, max_rounds=10, obs_mode="full", game_params=None):
+        assert game_type in N_PLAYER_GAMES, f"Game type must be one of {list(N_PLAYER_GAMES.keys())}"
+        assert obs_mode in ("full", "aggregate"), "obs_mode must be 'full' or 'aggregate'"
+        game = N_PLAYER_GAMES[game_type]
+        assert num_players >= game["min_players"] and (game["max_players"] is None
+                                                        or num_players <= game["max_players"]), \
+            f"{game_type} is not defined for {num_players} players"
+
+        self.game_type = game_type
+        self.payoff_fn = partial(game["payoff_fn"], **(game_params or {}))
+        self.num_players = num_players
+        self.num_envs = num_envs
+        self.max_rounds = max_rounds
+        self.obs_mode = obs_mode
+        self.action_space = spaces.Discrete(len(game["action_names"]))
+
+        self.current_round = 0
+        self.total_rounds = 0
+        self.episode_counter = 1
+
+        # (num_envs, num_players, max_rounds) history of all players' actions and payoffs
+        self.actions_history = np.zeros((num_envs, num_players, max_rounds), dtype=np.int8)
+        self.rewards_history = np.zeros((num_envs, num_players, max_rounds), dtype=np.float32)
+        self.actions_mask = np.zeros(max_rounds, dtype=np.float32)
+
+        # reset after each episode
+        self.cumulative_rewards = np.zeros((num_envs, num_players))
+
+        # never reset
+        self.total_cumulative_rewards = np.zeros((num_envs, num_players))
+
+        # view_index[i] lists the seats in the order player i sees them, itself first
+        self.view_index = (np.arange(num_players)[:, None] + np.arange(num_players)[None, :]) % num_players
+        history_size = num_players * max_rounds if obs_mode == "full" else 2 * max_rounds
+        self.observation_space = spaces.Box(low=0, high=self.action_space.n - 1, shape=(history_size + max_rounds,),
+                                            dtype=np.float32)
+
+    def reset(self):
+        self.current_round = 0
+
+        self.actions_history.fill(0)
+        self.rewards_history.fill(0)
+        self.actions_mask.fill(0)
+        self.cumulative_rewards.fill(0)
+
+        return self._get_observations(), {}
+
+    def step(self, actions):
+        """Advance every episode by one round.
+
+        Args:
+            actions (array-like): (num_envs, num_players) actions
+
+        Returns:
+            (num_envs, num_players, obs_dim) observations, (num_envs, num_players) rewards, terminated and truncated
+            flags of shape (num_envs,) and an empty info dict.
+        """
+        actions = np.asarray(actions).reshape(self.num_envs, self.num_players)
+
+        round_idx = self.current_round
+        self.current_round += 1
+        self.total_rounds += 1
+
+        rewards = self.payoff_fn(actions)
+        self.actions_history[:, :, round_idx] = actions
+        self.rewards_history[:, :, round_idx] = rewards
+        self.actions_mask[round_idx] = 1
+
+        self.cumulative_rewards += rewards
+        self.total_cumulative_rewards += rewards
+
+        terminated = np.full(self.num_envs, self.current_round >= self.max_rounds)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        return self._get_observations(), rewards, terminated, truncated, {}
+
+    @property
+    def avg_rewards(self):
+        return self.cumulative_rewards / max(self.current_round, 1)
+
+    @property
+    def total_avg_rewards(self):
+        return self.total_cumulative_rewards / max(self.total_rounds, 1)
+
+    def _get_observations(self):
+        mask = np.broadcast_to(self.actions_mask, (self.num_envs, self.num_players, self.max_rounds))
+        if self.obs_mode == "full":
+            # (num_envs, num_players, num_players, max_rounds), one gather for all players' views, flattened round by
+            # round like the two-player observations
+            history = self.actions_history[:, self.view_index].transpose(0, 1, 3, 2)
+            history = history.reshape(self.num_envs, self.num_players, -1)
+        else:
+            cooperating = (self.actions_history == 0) * self.actions_mask
+            others_cooperating = ((cooperating.sum(axis=1, keepdims=True) - cooperating)
+                                  / max(self.num_players - 1, 1))
+            history = np.concatenate((self.actions_history, others_cooperating), axis=2)
+        return np.concatenate((history, mask), axis=2, dtype=np.float32)
+
+
+class MultiGameVecEnv:
+    """Runs num_envs episodes of several games side by side, for training one policy on all of them.
+
+    Episode i plays game_types[i % len(game_types)], so every step yields a balanced mix of games. Observations are
+    the 'history' observation of GameEnv followed by features of the episode's game: its payoff matrix from the
+    agent's own point of view, payoffs[own action, opponent action] = (own payoff, opponent payoff), padded to the
+    largest number of actions and scaled by the largest absolute payoff of all games, and a mask of the game's valid
+    actions.
+
+    The action space is that of the game with the most actions. Games with fewer actions only accept their own, the
+    observation features action_mask are 1 for the valid actions of the episode's game and 0 for the others, so
+    policies can mask the rest, see train_multitask.py.
+
+    Args:
+        game_types (list): Names of the games, see GameModes
+        num_envs (int): Number of episodes that are played side by side
+        max_rounds (int): Number of rounds per episode
+    """
+    def __init__(self, game_types, num_envs, max_rounds=10):
+        self.game_types = list(game_types)
+        games = [GameModes(game_type) for game_type in self.game_types]
+        self.num_game_actions = np.array([len(game.get_action_names()) for game in games])
+        num_actions = self.num_game_actions.max()
+
+        # (num_games, num_actions, num_actions, 2) payoffs, padded with zeros
+        self.payoffs = np.zeros((len(games), num_actions, num_actions, 2))
+        for game_idx, game in enumerate(games):
+            n = self.num_game_actions[game_idx]
+            self.payoffs[game_idx, :n, :n] = game.get_payoff_matrix()
+
+        # (num_games, 2, num_features) game features as seen by agent 1 and agent 2
+        scale = max(np.abs(self.payoffs).max(), 1e-8)
+        payoffs_agent2 = self.payoffs.transpose(0, 2, 1, 3)[..., ::-1]
+        valid_actions = (np.arange(num_actions) < self.num_game_actions[:, None]).astype(float)
+        self._game_features = np.stack([
+            np.concatenate((self.payoffs.reshape(len(games), -1) / scale, valid_actions), axis=1),
+            np.concatenate((payoffs_agent2.reshape(len(games), -1) / scale, valid_actions), axis=1),
+        ], axis=1).astype(np.float32)
+
+        self.num_envs = num_envs
+        self.max_rounds = max_rounds
+        self.action_space = spaces.Discrete(num_actions)
+        self.observation_space = spaces.Box(low=-1, high=max(num_actions - 1, 1),
+                                            shape=(3 * max_rounds + self._game_features.shape[2],), dtype=np.float32)
+        self.action_mask = slice(-num_actions, None)  # The valid actions end the game features
+
+        self.game_ids = np.arange(num_envs) % len(games)
+        self.env_num_actions = self.num_game_actions[self.game_ids]
+        self.game_features = self._game_features[self.game_ids]  # (num_envs, 2, num_features)
+
+        self.current_round = 0
+        self.total_rounds = 0
+        self.episode_counter = 1
+
+        # (num_envs, max_rounds, 2) history of both agents' actions and payoffs
+        self.actions_history = np.zeros((num_envs, max_rounds, 2), dtype=int)
+        self.rewards_history = np.zeros((num_envs, max_rounds, 2))
+        self.actions_mask = np.zeros((num_envs, max_rounds), dtype=int)
+
+        # reset after each episode
+        self.cumulative_rewards = np.zeros((num_envs, 2))
+
+        # never reset
+        self.total_cumulative_rewards = np.zeros((num_envs, 2))
+
+    def reset(self):
+        self.current_round = 0
+
+        self.actions_history.fill(0)
+        self.rewards_history.fill(0)
+        self.actions_mask.fill(0)
+        self.cumulative_rewards.fill(0)
+
+        return (self._get_observation(1), self._get_observation(2)), {}
+
+    def step(self, actions_agent1, actions_agent2):
+        """Advance every episode by one round, see VecGameEnv.step"""
+        actions_agent1 = np.asarray(actions_agent1, dtype=int)
+        actions_agent2 = np.asarray(actions_agent2, dtype=int)
+        assert (np.maximum(actions_agent1, actions_agent2) < self.env_num_actions).all(), \
+            "Actions must be valid in the episode's game, see action_mask"
+
+        round_idx = self.current_round
+        self.current_round += 1
+        self.total_rounds += 1
+
+        payoffs = self.payoffs[self.game_ids, actions_agent1, actions_agent2]
+
+        self.actions_history[:, round_idx, 0] = actions_agent1
+        self.actions_history[:, round_idx, 1] = actions_agent2
+        self.actions_mask[:, round_idx] = 1
+        self.rewards_history[:, round_idx] = payoffs
+
+        self.cumulative_rewards += payoffs
+        self.total_cumulative_rewards += payoffs
+
+        terminated = np.full(self.num_envs, self.current_round >= self.max_rounds)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+
+        observations = (self._get_observation(1), self._get_observation(2))
+        return observations, (payoffs[:, 0], payoffs[:, 1]), terminated, truncated, {}
+
+    @property
+    def avg_rewards(self):
+        return self.cumulative_rewards / max(self.current_round, 1)
+
+    @property
+    def total_avg_rewards(self):
+        return self.total_cumulative_rewards / max(self.total_rounds, 1)
+
+    def game_avg_rewards(self):
+        """(num_games, 2) average reward per round of both agents in each game since the env was created"""
+        totals = np.zeros((len(self.game_types), 2))
+        np.add.at(totals, self.game_ids, self.total_cumulative_rewards)
+        episodes_per_game = np.bincount(self.game_ids, minlength=len(self.game_types))
+        return totals / np.maximum(episodes_per_game[:, None] * self.total_rounds, 1)
+
+    def round_actions(self, batch_state, round_idx):
+        """(num_envs,) own and opponent actions of round round_idx as seen in observations of the current round"""
+        return batch_state[:, 2 * round_idx], batch_state[:, 2 * round_idx + 1]
+
+    def _get_observation(self, agent_number):
+        if agent_number == 1:
+            actions_hist = self.actions_history
+        else:
+            actions_hist = self.actions_history[:, :, ::-1]
+
+        return np.concatenate((actions_hist.reshape(self.num_envs, -1), self.actions_mask,
+                               self.game_features[:, agent_number - 1]), axis=1, dtype=np.float32)
@@ -1,49 +1,103 @@
 import numpy as np
 
+# Registry of all games, name -> {"payoffs", "action_names", "bounds"}
+# Payoffs are stored once as contiguous (num_actions, num_actions, 2) arrays: payoffs[a1, a2] = (payoff1, payoff2)
+GAMES = {}
+
+
+def register_game(name, payoffs, action_names):
+    """Add a game to the registry.
+
+    Args:
+        name (str): Name the game is looked up by, e.g. in GameModes and GameEnv
+        payoffs (array-like): Either (A, A, 2) with payoffs[a1][a2] = (payoff1, payoff2), or a flat (A * A, 2) list
+            enumerating the joint actions row by row: (0, 0), (0, 1), ..., (A - 1, A - 1)
+        action_names (list): Names of the A actions
+
+    Returns:
+        The registered game
+    """
+    num_actions = len(action_names)
+    payoffs = np.asarray(payoffs)
+    if payoffs.shape == (num_actions * num_actions, 2):
+        payoffs = payoffs.reshape(num_actions, num_actions, 2)
+    assert payoffs.shape == (num_actions, num_actions, 2), \
+        f"Payoffs of '{name}' must have shape ({num_actions}, {num_actions}, 2) or ({num_actions ** 2}, 2)"
+
+    payoffs = np.ascontiguousarray(payoffs)
+    payoffs.flags.writeable = False  # Shared by every environment playing this game
+    GAMES[name] = {
+        "payoffs": payoffs,
+        "action_names": list(action_names),
+        "bounds": (payoffs.min(), payoffs.max()),
+    }
+    return GAMES[name]
+
+
+def random_game(num_actions, low=-10, high=10, name=None, rng=None):
+    """Register a game with integer payoffs drawn uniformly from [low, high].
+
+    Args:
+        num_actions (int): Number of actions per agent
+        name (str): Registry name, defaults to 'random_<num_actions>_<n>' with the next free n
+        rng (np.random.Generator): Random number generator, defaults to np.random.default_rng()
+
+    Returns:
+        The name of the registered game
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    if name is None:
+        n = 0
+        while f"random_{num_actions}_{n}" in GAMES:
+            n += 1
+        name = f"random_{num_actions}_{n}"
+    payoffs = rng.integers(low, high + 1, size=(num_actions, num_actions, 2))
+    register_game(name, payoffs, [f"action_{i}" for i in range(num_actions)])
+    return name
+
+
+register_game("rock_paper_scissors",
+              [[(0, 0), (-1, 1), (1, -1)],
+               [(1, -1), (0, 0), (-1, 1)],
+               [(-1, 1), (1, -1), (0, 0)]],
+              ["rock", "paper", "scissors"])
+register_game("chicken",
+              [[(0, 0), (-1, 1)],
+               [(1, -1), (-10, -10)]],
+              ["go_straight", "swerve"])
+register_game("battle_of_sexes",
+              [(3, 2), (1, 1), (0, 0), (2, 3)],
+              ["opera", "football"])
+register_game("matching_pennies",
+              [(1, -1), (-1, 1), (-1, 1), (1, -1)],
+              ["heads", "tails"])
+register_game("prisoners_dilemma",
+              [[(3, 3), (0, 5)], [(5, 0), (1, 1)]],
+              ["cooperate", "defect"])
+
+
 class GameModes:
     def __init__(self, game_type):
+        assert game_type in GAMES, f"Game type must be one of {list(GAMES.keys())}"
         self.game_type = game_type  # Store game_type as an attribute
-        self.games = {
-            "rock_paper_scissors": {
-                "payoffs": np.array([[(0, 0), (-1, 1), (1, -1)],
-                                     [(1, -1), (0, 0), (-1, 1)],
-                                     [(-1, 1), (1, -1), (0, 0)]]),
-                "action_names": ["rock", "paper", "scissors"]
-            },
-            "chicken": {
-                "payoffs": np.array([[(0, 0), (-1, 1)],
-                                     [(1, -1), (-10, -10)]]),
-                "action_names": ["go_straight", "swerve"]
-            },
-            "battle_of_sexes": {
-                "payoffs": np.array([(3, 2), (1, 1), (0, 0), (2, 3)]),
-                "action_names": ["opera", "football"]
-            },
-            "matching_pennies": {
-                "payoffs": np.array([(1, -1), (-1, 1), (-1, 1), (1, -1)]),
-                "action_names": ["heads", "tails"]
-            },
-            "prisoners_dilemma": {
-                "payoffs": np.array([[(3, 3), (0, 5)], [(5, 0), (1, 1)]]),
-                "action_names": ["cooperate", "defect"]
-            }
-        }
+        self.game = GAMES[game_type]
+        self.payoffs = self.game["payoffs"]
 
     def get_payoff(self, action1, action2):
-        return self.games[self.game_type]["payoffs"][action1][action2]
+        return self.payoffs[action1, action2]
+
+    def get_payoffs(self, actions1, actions2):
+        """Vectorized payoff lookup, arrays of actions of any shape -> payoffs of shape (*actions1.shape, 2)"""
+        return self.payoffs[actions1, actions2]
 
     def get_payoff_matrix(self):
-        return self.games[self.game_type]["payoffs"]
+        return self.payoffs
 
     def get_payoff_bounds(self):
-        # Fetching the payoffs matrix for the current game type
-        payoff_matrix = self.games[self.game_type]["payoffs"]
-        min_payoff = np.min(payoff_matrix)
-        max_payoff = np.max(payoff_matrix)
-        return min_payoff, max_payoff
+        return self.game["bounds"]
 
     def get_action_names(self):
-        return self.games[self.game_type]["action_names"]
+        return self.game["action_names"]
 
     def get_game(self):
-        return self.games.get(self.game_type, None)
\ No newline at end of file
+        return self.game
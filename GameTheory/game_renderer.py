@@ -1,3 +1,4 @@
+import numpy as np
 import pygame
 
 
@@ -53,10 +54,15 @@ class Styling:
 
 
 class GameRenderer:
-    def __init__(self, game_modes_instance):
+    def __init__(self, game_modes_instance, headless=False):
         pygame.init()
-        self.screen = pygame.display.set_mode((800, 600))
-        pygame.display.set_caption(Styling.GAME_TITLE if hasattr(Styling, 'GAME_TITLE') else "Game Theory")
+        # A headless renderer draws off-screen and returns the frames as arrays
+        self.headless = headless
+        if headless:
+            self.screen = pygame.Surface((800, 600))
+        else:
+            self.screen = pygame.display.set_mode((800, 600))
+            pygame.display.set_caption(Styling.GAME_TITLE if hasattr(Styling, 'GAME_TITLE') else "Game Theory")
 
         self.game_modes = game_modes_instance
         self.game = self.game_modes.get_game()
@@ -98,6 +104,8 @@ class GameRenderer:
                                 agent1_total_avg_reward, agent2_total_avg_reward,  # Pass new values
                                 scoreboard_start_y)
 
+        if self.headless:
+            return np.transpose(pygame.surfarray.array3d(self.screen), (1, 0, 2))
         pygame.display.flip()
         pygame.time.wait(300)
 
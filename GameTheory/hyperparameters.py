@@ -11,6 +11,17 @@ class Hyperparameter:
         self.MAX_ROUNDS_PER_EPISODE = 10
         self.NUM_EVAL_EPISODES = 1000
 
+        # Observation encoding: "history" observes the whole padded episode, so the DQN input grows with
+        # MAX_ROUNDS_PER_EPISODE, "summary" observes the last OBSERVATION_WINDOW joint actions plus running
+        # cooperation counts, round and payoffs, a fixed 3 * OBSERVATION_WINDOW + 5 inputs for any horizon
+        self.OBSERVATION_ENCODING = "history"
+        self.OBSERVATION_WINDOW = 4
+
+        # Adaptive evaluation, stops once the confidence interval on the average reward is narrower than EVAL_TOLERANCE
+        self.EVAL_TOLERANCE = 0.1
+        self.EVAL_CONFIDENCE = 0.95
+        self.EVAL_BATCH_EPISODES = 100
+
         # Model parameters
         self.REPLAY_BUFFER_SIZE = int(self.NUM_EPISODES * self.MAX_ROUNDS_PER_EPISODE * 0.05)
         self.HIDDEN_SIZES = [128, 128, 128, 128, 128]
@@ -23,6 +34,50 @@ class Hyperparameter:
         self.EPS_END = 0.05
         self.EPS_DECAY = self.NUM_EPISODES * 0.8  # Decaying length for epsilon-greedy action selection
 
+        # Tabular Q-learning baseline, see tabular.py
+        self.TABULAR_ALGORITHM = "q_learning"  # "q_learning" or "sarsa"
+        self.TABULAR_LEARNING_RATE = 0.1
+        self.TABULAR_EPS_DECAY = self.NUM_EPISODES * 0.2  # Decaying length in episodes, not rounds
+
+        # Checkpoints of the full training state every CHECKPOINT_INTERVAL episodes, see checkpoint.py. With RESUME,
+        # training continues from the latest checkpoint in CHECKPOINT_DIR saved with the same game, encoding and
+        # network sizes. Otherwise training starts over, and refuses to if CHECKPOINT_DIR holds checkpoints of an
+        # earlier run unless CHECKPOINT_OVERWRITE allows removing them
+        self.RESUME = False
+        self.CHECKPOINT_OVERWRITE = False
+        self.CHECKPOINT_DIR = "checkpoints"
+        self.CHECKPOINT_INTERVAL = 500
+        self.CHECKPOINT_KEEP = 3
+
+        # Opt-in timing of the training phases, see profiler.py. Reports are written every PROFILE_REPORT_INTERVAL
+        # episodes, PROFILE_TORCH_EPISODES = (first, last) also records those episodes with torch.profiler
+        self.PROFILE = False
+        self.PROFILE_REPORT_INTERVAL = 1000
+        self.PROFILE_TORCH_EPISODES = None
+
+        # Multitask training, see train_multitask.py: MULTITASK_NUM_ENVS episodes of all MULTITASK_GAMES per batch
+        self.MULTITASK_GAMES = ["prisoners_dilemma", "rock_paper_scissors", "chicken", "battle_of_sexes",
+                                "matching_pennies"]
+        self.MULTITASK_NUM_ENVS = 64
+        # Fused updates per round of the MULTITASK_NUM_ENVS episodes, MULTITASK_NUM_ENVS makes one update per stored
+        # transition as train.py does, fewer trade updates per transition for speed
+        self.MULTITASK_UPDATES_PER_STEP = self.MULTITASK_NUM_ENVS
+
         # Self play parameters
         self.TARGET_UPDATE = 10
         self.SELF_PLAY_UPDATE = 50
+
+        # League training, see league.py: every SNAPSHOT_INTERVAL episodes agent 1 is frozen into a pool of at most
+        # LEAGUE_SIZE snapshots and rated in LEAGUE_MATCHES matches of LEAGUE_MATCH_EPISODES episodes per seat
+        self.LEAGUE_SIZE = 200
+        self.SNAPSHOT_INTERVAL = 100
+        self.LEAGUE_MATCHES = 8
+        self.LEAGUE_MATCH_EPISODES = 20
+
+        # Actor-learner training, see actor_learner.py
+        self.NUM_ACTORS = 4
+        self.PUBLISH_INTERVAL = 10  # Learner updates between two weight refreshes of the actors
+        # Learner updates per stored round, actors wait for a learner that falls behind. With 1, as in train.py, the
+        # rounds per second are capped at the learner's update rate whatever the number of actors, below 1 the actors
+        # play up to 1 / REPLAY_RATIO times as many rounds per update
+        self.REPLAY_RATIO = 0.25
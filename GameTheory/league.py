@@ -0,0 +1,254 @@
+"""
+Population-based self-play: a league of frozen policy snapshots and scripted strategies with Elo ratings.
+
+Instead of copying agent 1 into agent 2 every SELF_PLAY_UPDATE episodes, the learner periodically freezes a
+snapshot of its policy into a SnapshotPool and plays against opponents sampled from the whole league. All snapshots
+live in one EnsembleDQN in shared memory, one slot per snapshot, so adding a snapshot is a single in-place copy and
+playing a snapshot is a forward pass over its slot of the stacked weights, no load_state_dict per match. Worker
+processes map the same shared tensors and see new snapshots without any transfer.
+
+Matches between league members are played in parallel worker processes, each as a batch of episodes in a
+VecGameEnv, and the Elo ratings are updated incrementally with the results in scheduling order. Opponents are
+sampled with probabilities proportional to their expected score against the learner, so stronger opponents are met
+more often while weak ones are still visited.
+"""
+import hashlib
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from game_env import VecGameEnv
+from model import EnsembleDQN
+from strategies import BatchModelStrategy, StrategyFactory
+
+SNAPSHOT_PREFIX = "snapshot_"
+
+# Shared snapshot weights of a worker process, set by _init_worker
+_worker_net = None
+
+
+class SnapshotPool:
+    """Frozen policy snapshots, stacked into one EnsembleDQN in shared memory
+
+    Args:
+        capacity (int): Maximum number of snapshots, the oldest one is replaced once the pool is full
+        input_dim (int): Number of input features
+        hidden_sizes (list): Hidden layer sizes of the DQN
+        output_dim (int): Number of actions
+    """
+    def __init__(self, capacity, input_dim, hidden_sizes, output_dim):
+        self.capacity = capacity
+        self.net = EnsembleDQN(capacity, input_dim, hidden_sizes, output_dim).share_memory()
+        self.net.requires_grad_(False)
+        self.slots = {}  # snapshot name -> slot
+        self.num_added = 0
+
+    def add(self, policy_net, agent_idx=0):
+        """Copy one agent of an EnsembleDQN into the next slot.
+
+        Returns:
+            The name of the new snapshot and the name of the snapshot it replaced (None while the pool is not full)
+        """
+        slot = self.num_added % self.capacity
+        replaced = next((name for name, used_slot in self.slots.items() if used_slot == slot), None)
+        if replaced is not None:
+            del self.slots[replaced]
+
+        with torch.no_grad():
+            for (pool_weight, pool_bias), (weight, bias) in zip(zip(self.net.weights, self.net.biases),
+                                                                zip(policy_net.weights, policy_net.biases)):
+                pool_weight[slot].copy_(weight[agent_idx])
+                pool_bias[slot].copy_(bias[agent_idx])
+
+        name = f"{SNAPSHOT_PREFIX}{self.num_added}"
+        self.slots[name] = slot
+        self.num_added += 1
+        return name, replaced
+
+    def model(self, name):
+        """Callable that behaves like the snapshot's DQN, evaluated directly on the shared weights"""
+        return self.net.agent_model(self.slots[name])
+
+    def state_dict(self, name):
+        """State dict of a snapshot, loadable into a DQN with the same sizes"""
+        return self.net.agent_state_dict(self.slots[name])
+
+
+class EloRatings:
+    """Elo ratings, updated incrementally after every match
+
+    Args:
+        k_factor (float): Maximum rating change per match
+        initial_rating (float): Rating of new players
+    """
+    def __init__(self, k_factor=32., initial_rating=1000.):
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+        self.ratings = {}
+        self.games = {}
+
+    def add(self, name, rating=None):
+        self.ratings[name] = self.initial_rating if rating is None else rating
+        self.games[name] = 0
+
+    def remove(self, name):
+        del self.ratings[name]
+        del self.games[name]
+
+    def expected_score(self, name1, name2):
+        return 1. / (1. + 10 ** ((self.ratings[name2] - self.ratings[name1]) / 400.))
+
+    def update(self, name1, name2, score1):
+        """score1: Score of name1 in [0, 1], 1 for a win, 0.5 for a draw"""
+        delta = self.k_factor * (score1 - self.expected_score(name1, name2))
+        self.ratings[name1] += delta
+        self.ratings[name2] -= delta
+        self.games[name1] += 1
+        self.games[name2] += 1
+
+
+def _match_seed(seed, name1, name2, match_idx):
+    digest = hashlib.sha256(f"{seed}:{name1}:{name2}:{match_idx}".encode()).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def _batch_strategy(env, player, net):
+    if isinstance(player, int):
+        return BatchModelStrategy(env), net.agent_model(player)
+    return StrategyFactory.create_batch_strategy(env, strategy_type=player), None
+
+
+def play_match(net, player1, player2, game_type, max_rounds, num_episodes, encoding="history", window=4, seed=0):
+    """Play num_episodes episodes between two league members in lockstep.
+
+    Args:
+        net (EnsembleDQN): Snapshot weights, see SnapshotPool
+        player1 (int or str): Slot of a snapshot in net or name of a scripted strategy, playing as agent 1
+        player2 (int or str): Same for agent 2
+
+    Returns:
+        Score of player1 (fraction of episodes won, draws counting half) and the average cumulative rewards of both
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    env = VecGameEnv(game_type, num_envs=num_episodes, max_rounds=max_rounds, encoding=encoding, window=window)
+    strategy_agent1, model_agent1 = _batch_strategy(env, player1, net)
+    strategy_agent2, model_agent2 = _batch_strategy(env, player2, net)
+
+    observations, _ = env.reset()
+    observation_agent1, observation_agent2 = observations
+    for _ in range(max_rounds):
+        actions_agent1 = strategy_agent1.select_actions(observation_agent1, model_agent1)
+        actions_agent2 = strategy_agent2.select_actions(observation_agent2, model_agent2)
+        observations, _, terminated, _, _ = env.step(actions_agent1, actions_agent2)
+        observation_agent1, observation_agent2 = observations
+        if terminated.all():
+            break
+
+    rewards = env.cumulative_rewards
+    score = ((rewards[:, 0] > rewards[:, 1]) + 0.5 * (rewards[:, 0] == rewards[:, 1])).mean()
+    return float(score), rewards.mean(axis=0)
+
+
+def _init_worker(net):
+    global _worker_net
+    torch.set_num_threads(1)
+    _worker_net = net
+
+
+def _play_match_task(task):
+    return play_match(_worker_net, *task)
+
+
+class League:
+    """Scripted strategies and policy snapshots with Elo ratings, matches are played in worker processes
+
+    Args:
+        pool (SnapshotPool): Snapshots taking part in the league
+        game_type (str): Name of the game, see GameModes
+        max_rounds (int): Number of rounds per episode
+        scripted (list): Scripted strategies taking part, see StrategyFactory
+        match_episodes (int): Episodes per match
+        num_workers (int): Number of worker processes, defaults to the number of CPUs
+        encoding (str): Observation encoding of the snapshots, see GameEnv
+        window (int): Window of 'summary' observations
+        k_factor (float): Elo k-factor
+        seed (int): Base seed the per-match seeds are derived from
+    """
+    def __init__(self, pool, game_type, max_rounds, scripted, match_episodes=20, num_workers=None,
+                 encoding="history", window=4, k_factor=32., seed=0):
+        self.pool = pool
+        self.game_type = game_type
+        self.max_rounds = max_rounds
+        self.match_episodes = match_episodes
+        self.encoding = encoding
+        self.window = window
+        self.seed = seed
+        self.num_matches = 0
+
+        self.ratings = EloRatings(k_factor)
+        for name in scripted:
+            self.ratings.add(name)
+
+        # Workers are spawned once and map the pool's shared weights, so later snapshots are visible to them
+        self.executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=mp.get_context("spawn"),
+                                            initializer=_init_worker, initargs=(pool.net,))
+
+    @property
+    def members(self):
+        return list(self.ratings.ratings)
+
+    def add_snapshot(self, policy_net, agent_idx=0, rating=None):
+        """Freeze one agent of an EnsembleDQN into the pool, it enters the league with the given rating"""
+        name, replaced = self.pool.add(policy_net, agent_idx)
+        if replaced is not None:
+            self.ratings.remove(replaced)
+        self.ratings.add(name, rating)
+        return name
+
+    def sample_opponent(self, rating):
+        """Sample a member with probability proportional to its expected score against a player of this rating"""
+        members = self.members
+        weights = [1. / (1. + 10 ** ((rating - self.ratings.ratings[name]) / 400.)) for name in members]
+        return random.choices(members, weights=weights)[0]
+
+    def play_matches(self, pairs):
+        """Play a match for every (name1, name2) pair in parallel and update the ratings in pair order.
+
+        Returns:
+            list of (score of name1, average cumulative rewards of both) per pair
+        """
+        tasks = []
+        for name1, name2 in pairs:
+            seed = _match_seed(self.seed, name1, name2, self.num_matches)
+            tasks.append((self._player(name1), self._player(name2), self.game_type, self.max_rounds,
+                          self.match_episodes, self.encoding, self.window, seed))
+            self.num_matches += 1
+
+        results = list(self.executor.map(_play_match_task, tasks))
+        for (name1, name2), (score, _) in zip(pairs, results):
+            self.ratings.update(name1, name2, score)
+        return results
+
+    def _player(self, name):
+        # Workers only know the shared weights, so snapshots are passed by slot
+        return self.pool.slots[name] if name in self.pool.slots else name
+
+    def rate(self, name, num_matches):
+        """Play name against num_matches opponents sampled by rating, in both seats"""
+        opponents = [self.sample_opponent(self.ratings.ratings[name]) for _ in range(num_matches)]
+        pairs = []
+        for opponent in opponents:
+            if opponent != name:
+                pairs.extend([(name, opponent), (opponent, name)])
+        return self.play_matches(pairs)
+
+    def best_snapshot(self):
+        snapshots = [name for name in self.members if name.startswith(SNAPSHOT_PREFIX)]
+        return max(snapshots, key=lambda name: self.ratings.ratings[name], default=None)
+
+    def close(self):
+        self.executor.shutdown()
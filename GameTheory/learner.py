@@ -0,0 +1,106 @@
+import math
+
+import torch
+import torch.nn.functional as F
+from torch import optim
+
+from model import EnsembleDQN
+from profiler import NULL_TIMER
+
+
+class MultiAgentDQNLearner:
+    """Deep Q-learning for several agents with one fused update
+
+    The policy and target networks of all agents live in one EnsembleDQN each. Every call to optimize_model samples
+    a batch from each agent's replay memory and updates all agents with a single forward pass, backward pass and
+    optimizer step. The per-agent losses are summed, and Adam and gradient clipping act element-wise, so each agent
+    is updated exactly as if it had its own network and optimizer.
+
+    Args:
+        memories (list): One ReplayMemory per agent
+        input_dim (int): Number of input features
+        hidden_sizes (list): Hidden layer sizes of each agent's DQN
+        output_dim (int): Number of actions
+        learning_rate (float): Adam learning rate
+        gamma (float): Discount factor for future rewards
+        batch_size (int): Number of transitions sampled per agent and update
+        device (torch.device): Device of the networks and memories
+        timer (PhaseTimer): Times replay sampling, forward/backward pass and optimizer step, see profiler.py
+        action_mask (slice): Features of the observations that are 1 for the actions valid in the state and 0 for the
+            others, which are left out of the target max, see MultiGameVecEnv. None if all actions are valid
+    """
+    def __init__(self, memories, input_dim, hidden_sizes, output_dim, learning_rate, gamma, batch_size,
+                 device=torch.device("cpu"), timer=NULL_TIMER, action_mask=None):
+        self.memories = memories
+        self.timer = timer
+        self.action_mask = action_mask
+        self.num_agents = len(memories)
+        self.gamma = gamma
+        self.batch_size = batch_size
+
+        self.policy_net = EnsembleDQN(self.num_agents, input_dim, hidden_sizes, output_dim).to(device)
+        self.target_net = EnsembleDQN(self.num_agents, input_dim, hidden_sizes, output_dim).to(device)
+        self.update_target()
+
+        self.optimizer = optim.Adam(self.policy_net.parameters(), lr=learning_rate)
+
+    def optimize_model(self):
+        # Make sure enough experiences have been stored before learning begins
+        if any(len(memory) < self.batch_size for memory in self.memories):
+            return
+
+        # Sample one batch per agent and stack them along the agent dimension
+        with self.timer.section("replay_sample"):
+            batches = [memory.sample(self.batch_size) for memory in self.memories]
+            state_batch, action_batch, next_state_batch, reward_batch, done_batch = (
+                torch.stack(tensors) for tensors in zip(*batches))
+
+        with self.timer.section("forward_backward"):
+            # Compute the current Q-values, (num_agents, batch_size)
+            state_action_values = self.policy_net(state_batch).gather(2, action_batch).squeeze(2)
+
+            # Compute the expected Q-values, terminal states have no future value
+            with torch.no_grad():
+                next_q_values = self.target_net(next_state_batch)
+                if self.action_mask is not None:
+                    next_q_values = next_q_values.masked_fill(next_state_batch[..., self.action_mask] == 0, -math.inf)
+                next_state_values = next_q_values.max(2)[0] * (1 - done_batch)
+            expected_state_action_values = (next_state_values * self.gamma) + reward_batch
+
+            # Huber loss per agent, summed over agents so no agent's gradient is scaled by the number of agents
+            loss = F.smooth_l1_loss(state_action_values, expected_state_action_values, reduction="none")
+            loss = loss.mean(dim=1).sum()
+
+            # Optimize the policy networks
+            self.optimizer.zero_grad()
+            loss.backward()
+
+        with self.timer.section("optimizer_step"):
+            # Gradient clipping to avoid exploding gradients
+            for param in self.policy_net.parameters():
+                param.grad.data.clamp_(-1, 1)
+            self.optimizer.step()
+
+    def state_dict(self):
+        """Policy and target networks and optimizer state, the replay memories are saved separately"""
+        return {"policy_net": self.policy_net.state_dict(), "target_net": self.target_net.state_dict(),
+                "optimizer": self.optimizer.state_dict()}
+
+    def load_state_dict(self, state_dict):
+        self.policy_net.load_state_dict(state_dict["policy_net"])
+        self.target_net.load_state_dict(state_dict["target_net"])
+        self.optimizer.load_state_dict(state_dict["optimizer"])
+
+    def update_target(self):
+        with self.timer.section("target_update"):
+            self.target_net.load_state_dict(self.policy_net.state_dict())
+
+    def sync_agents(self, src_idx, dst_idx):
+        with self.timer.section("self_play_sync"):
+            self.policy_net.copy_agent(src_idx, dst_idx)
+
+    def agent_model(self, agent_idx):
+        return self.policy_net.agent_model(agent_idx)
+
+    def agent_state_dict(self, agent_idx):
+        return self.policy_net.agent_state_dict(agent_idx)
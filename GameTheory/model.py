@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
+from functools import partial
 
 class DQN(nn.Module):
     """Deep Q-network
@@ -21,4 +22,65 @@ class DQN(nn.Module):
     def forward(self, x):
         for layer in self.layers[:-1]:
             x = F.relu(layer(x))
-        return self.layers[-1](x)  # No activation on the last layer
\ No newline at end of file
+        return self.layers[-1](x)  # No activation on the last layer
+
+class EnsembleDQN(nn.Module):
+    """Several independent DQNs whose weights are stacked along a leading agent dimension
+
+    All agents are evaluated with one batched matrix multiplication per layer, so a forward/backward pass for
+    every agent costs about as much as one for a single DQN.
+
+    Args:
+        num_agents (int): Number of independent networks
+        input_size (int): Number of input features
+        hidden_sizes (list): List of hidden layer sizes, e.g. 5 layers: [10, 20, 30, 40, 50]
+        num_actions (int): Number of actions
+        """
+    def __init__(self, num_agents, input_size, hidden_sizes, num_actions):
+        super(EnsembleDQN, self).__init__()
+        self.num_agents = num_agents
+        # Initialize every agent like a stand-alone DQN, weights are stored as (num_agents, in, out) for bmm
+        nets = [DQN(input_size, hidden_sizes, num_actions) for _ in range(num_agents)]
+        self.weights = nn.ParameterList([
+            nn.Parameter(torch.stack([net.layers[i].weight.detach().t() for net in nets]))
+            for i in range(len(nets[0].layers))])
+        self.biases = nn.ParameterList([
+            nn.Parameter(torch.stack([net.layers[i].bias.detach().unsqueeze(0) for net in nets]))
+            for i in range(len(nets[0].layers))])
+
+    def forward(self, x):
+        """x: (num_agents, batch_size, input_size) -> (num_agents, batch_size, num_actions)"""
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = F.relu(torch.baddbmm(bias, x, weight))
+        return torch.baddbmm(self.biases[-1], x, self.weights[-1])  # No activation on the last layer
+
+    def forward_agent(self, agent_idx, x):
+        """Evaluate a single agent, x: (batch_size, input_size) -> (batch_size, num_actions)"""
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = F.relu(torch.addmm(bias[agent_idx], x, weight[agent_idx]))
+        return torch.addmm(self.biases[-1][agent_idx], x, self.weights[-1][agent_idx])
+
+    def agent_model(self, agent_idx):
+        """Callable that behaves like the DQN of one agent"""
+        return partial(self.forward_agent, agent_idx)
+
+    def agent_state_dict(self, agent_idx):
+        """State dict of one agent, loadable into a DQN with the same sizes"""
+        state_dict = {}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            state_dict[f"layers.{i}.weight"] = weight[agent_idx].detach().t().clone()
+            state_dict[f"layers.{i}.bias"] = bias[agent_idx, 0].detach().clone()
+        return state_dict
+
+    def load_agent_state_dict(self, agent_idx, state_dict):
+        with torch.no_grad():
+            for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+                weight[agent_idx].copy_(state_dict[f"layers.{i}.weight"].t())
+                bias[agent_idx, 0].copy_(state_dict[f"layers.{i}.bias"])
+
+    def copy_agent(self, src_idx, dst_idx):
+        """Overwrite the weights of agent dst_idx with those of agent src_idx"""
+        with torch.no_grad():
+            for weight, bias in zip(self.weights, self.biases):
+                weight[dst_idx].copy_(weight[src_idx])
+                bias[dst_idx].copy_(bias[src_idx])
@@ -0,0 +1,190 @@
+"""
+Monte Carlo evaluation of strategy pairings, with a fixed or an adaptive number of episodes.
+
+Adaptive evaluation plays batches of episodes and keeps a running mean and variance of both agents' cumulative
+rewards. It stops as soon as the confidence interval on the average reward of both agents is narrower than the
+requested tolerance, so near-deterministic pairings finish after a single batch while noisy ones get more episodes.
+Batch b of every pairing is played with the same seed (common random numbers), which correlates the noise across
+pairings and makes their differences, and thus the rankings, converge faster.
+
+evaluate_model plays a DQN greedily against a list of opponents with one batched forward pass per round.
+"""
+import hashlib
+import random
+from statistics import NormalDist
+
+import numpy as np
+import torch
+
+from game_env import VecGameEnv
+from strategies import StrategyFactory, device
+
+
+def play_episodes(strat1, strat2, game_type, max_rounds, num_episodes, model=None, encoding="history", window=4):
+    """Play num_episodes episodes of a pairing in lockstep.
+
+    Args:
+        encoding (str): Observation encoding the model was trained with, see GameEnv
+        window (int): Window of 'summary' observations
+
+    Returns:
+        np.ndarray of shape (num_episodes, 2) with the cumulative rewards of agent 1 and agent 2 per episode
+    """
+    env = VecGameEnv(game_type, num_envs=num_episodes, max_rounds=max_rounds, encoding=encoding, window=window)
+    strategy_agent1 = StrategyFactory.create_batch_strategy(env, strategy_type=strat1)
+    strategy_agent2 = StrategyFactory.create_batch_strategy(env, strategy_type=strat2)
+
+    observations, _ = env.reset()
+    observation_agent1, observation_agent2 = observations
+    for _ in range(max_rounds):
+        actions_agent1 = strategy_agent1.select_actions(observation_agent1, model)
+        actions_agent2 = strategy_agent2.select_actions(observation_agent2, model)
+        observations, _, terminated, _, _ = env.step(actions_agent1, actions_agent2)
+        observation_agent1, observation_agent2 = observations
+        if terminated.all():
+            break
+
+    return env.cumulative_rewards.astype(float)
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def batch_seed(seed, batch_idx):
+    """Seed of the batch_idx-th batch, shared by all pairings"""
+    digest = hashlib.sha256(f"{seed}:batch:{batch_idx}".encode()).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+class RunningStats:
+    """Running mean and variance of per-episode rewards, merged one batch at a time
+
+    Args:
+        dim (int): Number of values per episode, e.g. 2 for the rewards of both agents
+    """
+    def __init__(self, dim=2):
+        self.count = 0
+        self.mean = np.zeros(dim)
+        self.m2 = np.zeros(dim)  # Sum of squared deviations from the mean
+
+    def update(self, samples):
+        # Chan et al.'s parallel update of mean and M2 with a whole batch
+        batch_count = len(samples)
+        batch_mean = samples.mean(axis=0)
+        batch_m2 = ((samples - batch_mean) ** 2).sum(axis=0)
+
+        delta = batch_mean - self.mean
+        total = self.count + batch_count
+        self.mean = self.mean + delta * batch_count / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * batch_count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return np.full_like(self.mean, np.inf)
+        return self.m2 / (self.count - 1)
+
+    def half_width(self, confidence=0.95):
+        """Half-width of the normal confidence interval on the mean"""
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        return z * np.sqrt(self.variance / max(self.count, 1))
+
+
+def evaluate_fixed(strat1, strat2, game_type, max_rounds, num_episodes, model=None, seed=0, encoding="history",
+                   window=4):
+    """Evaluate a pairing with a fixed number of episodes, returns RunningStats"""
+    seed_everything(seed)
+    stats = RunningStats()
+    stats.update(play_episodes(strat1, strat2, game_type, max_rounds, num_episodes, model, encoding, window))
+    return stats
+
+
+def evaluate_adaptive(strat1, strat2, game_type, max_rounds, model=None, tolerance=0.1, confidence=0.95,
+                      batch_episodes=100, max_episodes=100000, seed=0, encoding="history", window=4):
+    """Evaluate a pairing until the confidence interval on both agents' average reward is within tolerance.
+
+    Args:
+        tolerance (float): Target half-width of the confidence interval on the average cumulative reward
+        confidence (float): Confidence level of the interval
+        batch_episodes (int): Episodes per batch, the stopping rule is checked after every batch
+        max_episodes (int): Upper bound on the number of episodes
+        seed (int): Base seed, batch b uses the same seed for every pairing
+        encoding (str): Observation encoding the model was trained with, see GameEnv
+        window (int): Window of 'summary' observations
+
+    Returns:
+        RunningStats of the cumulative rewards of agent 1 and agent 2
+    """
+    stats = RunningStats()
+    batch_idx = 0
+    while stats.count < max_episodes:
+        seed_everything(batch_seed(seed, batch_idx))
+        num_episodes = min(batch_episodes, max_episodes - stats.count)
+        stats.update(play_episodes(strat1, strat2, game_type, max_rounds, num_episodes, model, encoding, window))
+        batch_idx += 1
+        if (stats.half_width(confidence) <= tolerance).all():
+            break
+    return stats
+
+
+class _OpponentGroup:
+    """The episodes of a VecGameEnv that one opponent plays in, exposes what batch strategies read from their env"""
+    def __init__(self, env, num_envs):
+        self.env = env
+        self.num_envs = num_envs
+        self.max_rounds = env.max_rounds
+        self.action_space = env.action_space
+
+    @property
+    def current_round(self):
+        return self.env.current_round
+
+    def round_actions(self, batch_state, round_idx):
+        return self.env.round_actions(batch_state, round_idx)
+
+
+def evaluate_model(model, opponents, game_type, max_rounds, num_episodes, encoding="history", window=4):
+    """Evaluate a DQN, playing greedily as agent 1, against several opponents at once.
+
+    The episodes against all opponents are played in lockstep in one VecGameEnv, so each round costs one batched
+    forward pass of the model for every episode, plus one per opponent that is itself a model.
+
+    Args:
+        model (torch.nn.Module): DQN of agent 1
+        opponents (list): Strategy names of agent 2, see StrategyFactory
+        num_episodes (int): Episodes per opponent
+        encoding (str): Observation encoding the model was trained with, see GameEnv
+        window (int): Window of 'summary' observations
+
+    Returns:
+        dict mapping each opponent to the RunningStats of both agents' cumulative rewards
+    """
+    env = VecGameEnv(game_type, num_envs=num_episodes * len(opponents), max_rounds=max_rounds, encoding=encoding,
+                     window=window)
+    groups = [slice(i * num_episodes, (i + 1) * num_episodes) for i in range(len(opponents))]
+    opponent_strategies = [StrategyFactory.create_batch_strategy(_OpponentGroup(env, num_episodes), opponent)
+                           for opponent in opponents]
+
+    with torch.inference_mode():
+        observations, _ = env.reset()
+        observation_agent1, observation_agent2 = observations
+        for _ in range(max_rounds):
+            states = torch.as_tensor(observation_agent1, device=device, dtype=torch.float32)
+            actions_agent1 = model(states).argmax(dim=1).cpu().numpy()
+            actions_agent2 = np.concatenate([strategy.select_actions(observation_agent2[group], model)
+                                             for strategy, group in zip(opponent_strategies, groups)])
+
+            observations, _, terminated, _, _ = env.step(actions_agent1, actions_agent2)
+            observation_agent1, observation_agent2 = observations
+            if terminated.all():
+                break
+
+    results = {}
+    for opponent, group in zip(opponents, groups):
+        results[opponent] = RunningStats()
+        results[opponent].update(env.cumulative_rewards[group].astype(float))
+    return results
@@ -0,0 +1,64 @@
+"""
+Payoffs of N-player social dilemmas, defined over joint action vectors.
+
+Every game maps the (num_envs, num_players) actions of one round to (num_envs, num_players) payoffs with array
+operations only. Action 0 is cooperating (contributing, volunteering) and action 1 is defecting, like in the
+two-player games of game_modes.
+"""
+from functools import partial
+
+from game_modes import GameModes
+
+# Registry of all N-player games, name -> {"payoff_fn", "action_names", "min_players", "max_players"}
+N_PLAYER_GAMES = {}
+
+
+def register_n_player_game(name, payoff_fn, action_names, min_players=2, max_players=None):
+    """Add a game to the registry.
+
+    Args:
+        name (str): Name the game is looked up by, e.g. in NPlayerGameEnv
+        payoff_fn (callable): Maps (num_envs, num_players) int actions to (num_envs, num_players) payoffs, extra
+            keyword arguments are the game's parameters
+        action_names (list): Names of the actions
+        min_players (int): Smallest number of players the game is defined for
+        max_players (int): Largest number of players the game is defined for, None for no limit
+    """
+    N_PLAYER_GAMES[name] = {"payoff_fn": payoff_fn, "action_names": list(action_names), "min_players": min_players,
+                            "max_players": max_players}
+    return N_PLAYER_GAMES[name]
+
+
+def public_goods(actions, multiplier=3., endowment=1.):
+    """Cooperators put their endowment into a pot that is multiplied and shared equally by all players"""
+    contributions = endowment * (actions == 0)
+    pot = multiplier * contributions.sum(axis=1, keepdims=True)
+    return endowment - contributions + pot / actions.shape[1]
+
+
+def n_person_prisoners_dilemma(actions, benefit=3., cost=1.):
+    """Each cooperator pays cost and every other player receives benefit / (num_players - 1)"""
+    cooperators = (actions == 0)
+    others_cooperating = cooperators.sum(axis=1, keepdims=True) - cooperators
+    return benefit * others_cooperating / (actions.shape[1] - 1) - cost * cooperators
+
+
+def volunteers_dilemma(actions, benefit=1., cost=0.5):
+    """Everybody receives benefit if at least one player volunteers, volunteers pay cost"""
+    volunteers = (actions == 0)
+    return benefit * volunteers.any(axis=1, keepdims=True) - cost * volunteers
+
+
+def matrix_game(actions, payoffs):
+    """Two-player game of game_modes given by its (num_actions, num_actions, 2) payoffs, e.g. for comparing
+    NPlayerGameEnv with GameEnv"""
+    return payoffs[actions[:, 0], actions[:, 1]]
+
+
+register_n_player_game("public_goods", public_goods, ["contribute", "free_ride"])
+register_n_player_game("n_person_prisoners_dilemma", n_person_prisoners_dilemma, ["cooperate", "defect"])
+register_n_player_game("volunteers_dilemma", volunteers_dilemma, ["volunteer", "ignore"], min_players=1)
+for _game_type in ("prisoners_dilemma", "chicken", "battle_of_sexes", "matching_pennies", "rock_paper_scissors"):
+    _game_modes = GameModes(_game_type)
+    register_n_player_game(_game_type, partial(matrix_game, payoffs=_game_modes.get_payoff_matrix().astype(float)),
+                           _game_modes.get_action_names(), max_players=2)
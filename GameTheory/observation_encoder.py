@@ -0,0 +1,94 @@
+"""
+Fixed-size observations for iterated games, independent of the number of rounds per episode.
+
+The "history" encoding of GameEnv holds the whole padded episode, so the DQN input and every per-round copy grow
+with max_rounds. The "summary" encoding keeps only the last few joint actions plus running statistics of the whole
+episode, which are updated in O(1) per round.
+"""
+import numpy as np
+
+OBSERVATION_ENCODINGS = ("history", "summary")
+
+
+class SummaryEncoder:
+    """Summary observations of num_envs episodes played side by side
+
+    Layout of an observation, from the observing agent's point of view:
+        2 * window  last window joint actions as (own, opponent), oldest first, zero before the first round
+        window      mask, 1 for window slots that hold a played round
+        2           own and opponent cooperation (action 0) counts, divided by max_rounds
+        1           current round, divided by max_rounds
+        2           own and opponent cumulative payoffs, divided by max_rounds * max |payoff|
+
+    Observations are double-buffered like GameEnv's 'array' observations: step() writes into the other buffer, so an
+    observation stays valid until the step after the next one.
+
+    Args:
+        num_envs (int): Number of episodes
+        max_rounds (int): Number of rounds per episode
+        window (int): Number of most recent rounds whose joint actions are kept
+        payoff_bounds (tuple): Minimum and maximum payoff of the game, see GameModes.get_payoff_bounds
+    """
+    def __init__(self, num_envs, max_rounds, window, payoff_bounds):
+        assert window >= 1, "window must be at least 1"
+        self.num_envs = num_envs
+        self.max_rounds = max_rounds
+        self.window = window
+        self.payoff_scale = max_rounds * max(abs(payoff_bounds[0]), abs(payoff_bounds[1]), 1)
+
+        self.size = 3 * window + 5
+        self._mask_start = 2 * window
+        self._counts_start = 3 * window
+        self._round_idx = 3 * window + 2
+        self._payoffs_start = 3 * window + 3
+
+        # (slot, env, agent, features)
+        self._buffers = np.zeros((2, num_envs, 2, self.size), dtype=np.float32)
+        self._slot = 0
+
+    def reset(self):
+        self._buffers.fill(0)
+        self._slot = 0
+
+    def step(self, actions_agent1, actions_agent2, rewards_agent1, rewards_agent2, current_round):
+        """Fold one round into the observations, arguments are scalars or (num_envs,) arrays"""
+        old = self._buffers[self._slot]
+        self._slot = 1 - self._slot
+        new = self._buffers[self._slot]
+        window_end, mask_end = self._mask_start, self._counts_start
+
+        # Shift the window by one round and append the new joint action
+        new[:, :, :window_end - 2] = old[:, :, 2:window_end]
+        new[:, 0, window_end - 2] = actions_agent1
+        new[:, 0, window_end - 1] = actions_agent2
+        new[:, 1, window_end - 2] = actions_agent2
+        new[:, 1, window_end - 1] = actions_agent1
+        new[:, :, self._mask_start:mask_end - 1] = old[:, :, self._mask_start + 1:mask_end]
+        new[:, :, mask_end - 1] = 1
+
+        cooperation_agent1 = np.equal(actions_agent1, 0) / self.max_rounds
+        cooperation_agent2 = np.equal(actions_agent2, 0) / self.max_rounds
+        self._accumulate(old, new, self._counts_start, cooperation_agent1, cooperation_agent2)
+
+        new[:, :, self._round_idx] = current_round / self.max_rounds
+
+        self._accumulate(old, new, self._payoffs_start, np.divide(rewards_agent1, self.payoff_scale),
+                         np.divide(rewards_agent2, self.payoff_scale))
+
+    @staticmethod
+    def _accumulate(old, new, start, values_agent1, values_agent2):
+        new[:, 0, start] = old[:, 0, start] + values_agent1
+        new[:, 0, start + 1] = old[:, 0, start + 1] + values_agent2
+        new[:, 1, start] = old[:, 1, start] + values_agent2
+        new[:, 1, start + 1] = old[:, 1, start + 1] + values_agent1
+
+    def observation(self, agent_number):
+        """(num_envs, size) observations of agent 1 or 2"""
+        return self._buffers[self._slot, :, agent_number - 1]
+
+    def action_index(self, round_idx, current_round):
+        """Feature index of the observing agent's action in round round_idx, the opponent's action follows it"""
+        offset = round_idx - current_round + self.window
+        assert 0 <= offset < self.window, \
+            f"Round {round_idx} is not in the observation window of the last {self.window} rounds"
+        return 2 * offset
@@ -0,0 +1,214 @@
+"""
+Opt-in timing of the phases of a training loop.
+
+Phases are wrapped in named sections:
+
+    timer = PhaseTimer(enabled=True, report_path="profile_train.json", report_every=1000)
+    with timer.section("env_step"):
+        env.step(action_agent1, action_agent2)
+    timer.tick(episode, rounds, progress)  # Once per episode
+
+Every section keeps its number of calls, total time and a histogram of durations in log-spaced bins, from which the
+report estimates percentiles. A disabled timer hands out one shared no-op context manager, so instrumented loops
+pay a method call per section and nothing else. Reports are written as JSON or CSV, chosen by the extension of
+report_path, every report_every episodes, and the rounds per second and slowest phase are shown next to the tqdm
+progress bar. Optionally, torch.profiler records a window of episodes, with every section showing up as a labeled
+range in the exported Chrome trace.
+"""
+import contextlib
+import csv
+import json
+import math
+import os
+import time
+
+import torch
+
+# Duration histogram: HISTOGRAM_BINS_PER_DECADE bins per power of ten from 10 ** HISTOGRAM_MIN_EXPONENT seconds up
+HISTOGRAM_MIN_EXPONENT = -7
+HISTOGRAM_BINS_PER_DECADE = 10
+HISTOGRAM_NUM_BINS = 9 * HISTOGRAM_BINS_PER_DECADE
+
+_NULL_SECTION = contextlib.nullcontext()
+
+
+def _bin_index(seconds):
+    if seconds <= 0:
+        return 0
+    index = int((math.log10(seconds) - HISTOGRAM_MIN_EXPONENT) * HISTOGRAM_BINS_PER_DECADE)
+    return min(max(index, 0), HISTOGRAM_NUM_BINS - 1)
+
+
+def _bin_upper_edge(index):
+    return 10 ** (HISTOGRAM_MIN_EXPONENT + (index + 1) / HISTOGRAM_BINS_PER_DECADE)
+
+
+class _Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.histogram = [0] * HISTOGRAM_NUM_BINS
+        self._start = 0.
+        self._record_function = None
+
+    def __enter__(self):
+        if self.timer.torch_profiler is not None:
+            self._record_function = torch.profiler.record_function(self.name)
+            self._record_function.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.add(time.perf_counter() - self._start)
+        if self._record_function is not None:
+            self._record_function.__exit__(*exc_info)
+            self._record_function = None
+        return False
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.histogram[_bin_index(seconds)] += 1
+
+    def percentile(self, q):
+        """Upper edge of the histogram bin holding the q-th percentile, an overestimate by at most one bin"""
+        target = q / 100. * self.count
+        cumulative = 0
+        for index, count in enumerate(self.histogram):
+            cumulative += count
+            if count and cumulative >= target:
+                return min(_bin_upper_edge(index), self.max)
+        return self.max
+
+
+class PhaseTimer:
+    """Named timing sections with periodic reports and an optional torch.profiler window
+
+    Args:
+        enabled (bool): Time the sections, otherwise every call returns immediately
+        report_path (str): .json or .csv file the report is written to, None to only show it next to tqdm
+        report_every (int): Write a report every report_every episodes, None for only at close
+        torch_profile_episodes (tuple): (first, last) episode recorded with torch.profiler, None to not record
+        trace_path (str): Chrome trace file of the torch.profiler window
+    """
+    def __init__(self, enabled=False, report_path=None, report_every=None, torch_profile_episodes=None,
+                 trace_path="trace.json"):
+        self.enabled = enabled
+        self.report_path = report_path
+        self.report_every = report_every
+        self.torch_profile_episodes = torch_profile_episodes
+        self.trace_path = trace_path
+        self.torch_profiler = None
+
+        self.phases = {}
+        self.episodes = 0
+        self.rounds = 0
+        self.start_time = time.perf_counter()
+        if enabled and torch_profile_episodes is not None and torch_profile_episodes[0] == 0:
+            self._start_torch_profiler()
+
+    def section(self, name):
+        """Context manager timing the enclosed code under name"""
+        if not self.enabled:
+            return _NULL_SECTION
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def tick(self, episode, rounds, progress=None):
+        """Call once at the end of every episode.
+
+        Args:
+            episode (int): Index of the episode that just ended
+            rounds (int): Number of rounds it took
+            progress (tqdm): Progress bar to show the rounds per second and slowest phase on
+        """
+        if not self.enabled:
+            return
+        self.episodes += 1
+        self.rounds += rounds
+
+        if self.torch_profile_episodes is not None:
+            first, last = self.torch_profile_episodes
+            if episode + 1 == first:
+                self._start_torch_profiler()
+            elif episode == last:
+                self._stop_torch_profiler()
+
+        if self.report_every and self.episodes % self.report_every == 0:
+            if self.report_path is not None:
+                self.report(self.report_path)
+            if progress is not None:
+                progress.set_postfix(self.postfix())
+
+    def summary(self):
+        """Per-phase statistics, times in milliseconds, slowest phase first"""
+        elapsed = time.perf_counter() - self.start_time
+        rows = []
+        for name, phase in self.phases.items():
+            if phase.count == 0:
+                continue
+            rows.append({
+                "phase": name, "count": phase.count, "total_s": phase.total,
+                "share": phase.total / elapsed, "mean_ms": 1e3 * phase.total / phase.count,
+                "p50_ms": 1e3 * phase.percentile(50), "p90_ms": 1e3 * phase.percentile(90),
+                "p99_ms": 1e3 * phase.percentile(99), "max_ms": 1e3 * phase.max,
+            })
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def postfix(self):
+        elapsed = time.perf_counter() - self.start_time
+        postfix = {"rounds/s": f"{self.rounds / elapsed:.0f}"}
+        rows = self.summary()
+        if rows:
+            postfix["slowest"] = f"{rows[0]['phase']} {100 * rows[0]['share']:.0f}%"
+        return postfix
+
+    def report(self, path):
+        """Write the summary to a .json or .csv file, atomically"""
+        rows = self.summary()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["phase"])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                elapsed = time.perf_counter() - self.start_time
+                json.dump({"episodes": self.episodes, "rounds": self.rounds, "elapsed_s": elapsed,
+                           "rounds_per_second": self.rounds / elapsed, "phases": rows,
+                           "histogram_bin_edges_s": [_bin_upper_edge(i) for i in range(HISTOGRAM_NUM_BINS)],
+                           "histograms": {name: phase.histogram for name, phase in self.phases.items()}},
+                          f, indent=2)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """Stop a running torch.profiler window and write the final report"""
+        if not self.enabled:
+            return
+        self._stop_torch_profiler()
+        if self.report_path is not None:
+            self.report(self.report_path)
+
+    def _start_torch_profiler(self):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.torch_profiler = torch.profiler.profile(activities=activities)
+        self.torch_profiler.__enter__()
+
+    def _stop_torch_profiler(self):
+        if self.torch_profiler is None:
+            return
+        profiler, self.torch_profiler = self.torch_profiler, None
+        profiler.__exit__(None, None, None)
+        profiler.export_chrome_trace(self.trace_path)
+
+
+# Shared disabled timer, the default of instrumented classes
+NULL_TIMER = PhaseTimer(enabled=False)
@@ -1,100 +1,264 @@
 import torch
 import random
+import numpy as np
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
 class Strategy:
+    """Base class for scripted strategies playing a single GameEnv episode.
+
+    Strategies keep a running summary of the current episode (opponent defections, last own and opponent action)
+    that is advanced by one round per call, so every decision costs O(1) instead of rescanning the history.
+    """
     def __init__(self, env):
         self.env = env
+        self.reset()
 
     def select_action(self, observation, model=None):
         raise NotImplementedError
 
-    def get_last_opponent_action(self, observation):
-        if self.env.current_round == 0:
-            raise ValueError("Cannot get last opponent action when no history")
-        last_opponent_action = observation[self.env.current_round * 2 - 1]
-        return last_opponent_action
-
-    def get_effective_opponent_actions(self, observation):
-        mask_start = 2 * self.env.max_rounds
-        # Pair each opponent action with its corresponding mask and filter
-        return [observation[i] for i in range(1, mask_start, 2) if observation[mask_start + i // 2] == 1]
-
-    def opponent_cooperation_ratio(self, observation):
-        effective_actions = self.get_effective_opponent_actions(observation)
-        # print for a sanity check
-        # print(f"-------------------")
-        # print(f"current_round: {self.env.current_round}")
-        # print(f"observation: {observation}")
-        # print(f"effective_actions: {effective_actions}")
-        if not effective_actions:
+    def reset(self):
+        self.rounds_seen = 0
+        self.opponent_defections = 0
+        self.last_own_action = 0
+        self.last_opponent_action = 0
+
+    def update(self, own_action, opponent_action):
+        self.rounds_seen += 1
+        self.opponent_defections += int(opponent_action != 0)  # Every action but cooperating (0) is a defection
+        self.last_own_action = int(own_action)
+        self.last_opponent_action = int(opponent_action)
+
+    def _round_actions(self, observation, round_idx):
+        return self.env.round_actions(observation, round_idx)
+
+    def _sync(self, observation):
+        # Fold the rounds played since the last call into the running state, starting over on a new episode
+        if self.env.current_round < self.rounds_seen:
+            self.reset()
+        for round_idx in range(self.rounds_seen, self.env.current_round):
+            self.update(*self._round_actions(observation, round_idx))
+
+    def action_probabilities(self, observation, model=None):
+        """Probability of each action in the next round, deterministic strategies put all mass on one action"""
+        probabilities = np.zeros(self.env.action_space.n)
+        probabilities[self.select_action(observation, model)] = 1.
+        return probabilities
+
+    def memo_key(self, observation):
+        """Compact summary of the episode so far that fully determines the strategy's future behavior"""
+        self._sync(observation)
+        return self.rounds_seen, self.opponent_defections, self.last_own_action, self.last_opponent_action
+
+    def opponent_cooperation_ratio(self):
+        if self.rounds_seen == 0:
             return 0.5  # Default value when no effective history
-        return 1 - sum(effective_actions) / len(effective_actions)  # cooperation is represented by 0
+        return 1 - self.opponent_defections / self.rounds_seen  # cooperation is represented by 0
+
 
 class RandomPick(Strategy):
     def select_action(self, observation, model=None):
         return self.env.action_space.sample()
 
+    def action_probabilities(self, observation, model=None):
+        return np.full(self.env.action_space.n, 1. / self.env.action_space.n)
+
+    def memo_key(self, observation):
+        return ()
+
 
 class Defector(Strategy):
     def select_action(self, observation, model=None):
         return 1
 
+    def memo_key(self, observation):
+        return ()
+
 
 class Cooperator(Strategy):
     def select_action(self, observation, model=None):
         return 0
 
+    def memo_key(self, observation):
+        return ()
+
 
 class ModelStrategy(Strategy):
+    epsilon = 0.  # Probability of playing a uniformly random action instead of the greedy one
+
     def select_action(self, observation, model=None):
-        with torch.no_grad():
-            state = torch.tensor(observation, device=device, dtype=torch.float32).unsqueeze(0)
+        if self.epsilon > 0 and random.random() < self.epsilon:
+            return self.env.action_space.sample()
+        return self.greedy_action(observation, model)
+
+    def greedy_action(self, observation, model):
+        with torch.inference_mode():
+            state = torch.as_tensor(observation, device=device, dtype=torch.float32).unsqueeze(0)
             selected_action = model(state).argmax(dim=1).view(1, 1).squeeze(0).item()
             return selected_action
 
+    def action_probabilities(self, observation, model=None):
+        probabilities = np.full(self.env.action_space.n, self.epsilon / self.env.action_space.n)
+        probabilities[self.greedy_action(observation, model)] += 1 - self.epsilon
+        return probabilities
+
+    def memo_key(self, observation):
+        # The model only sees the observation, so histories with the same observation can be merged. A 'history'
+        # observation holds the whole episode, so no two histories merge: with epsilon > 0 exact evaluation expands
+        # all num_actions ** (2 * rounds) joint histories, and expected_payoffs stops at max_nodes. Evaluate such
+        # models by sampling episodes, see monte_carlo_evaluation.py, or use the 'summary' encoding
+        return tuple(observation)
+
 
 class TitForTat(Strategy):
     def select_action(self, observation, model=None):
-        return 0 if self.env.current_round == 0 else self.get_last_opponent_action(observation)
+        self._sync(observation)
+        return 0 if self.rounds_seen == 0 else self.last_opponent_action
 
 
 class Alternator(Strategy):
     def select_action(self, observation, model=None):
         return 0 if self.env.current_round % 2 == 0 else 1
 
+    def memo_key(self, observation):
+        return ()
+
 
 class Appeaser(Strategy):
     def select_action(self, observation, model=None):
-        effective_actions = self.get_effective_opponent_actions(observation)
-        last_opponent_action = effective_actions[-1] if effective_actions else None
-        if last_opponent_action == 1:
-            return 1 - observation[-3]  # previous own action
-        return observation[-3]  # previous own action
+        self._sync(observation)
+        if self.last_opponent_action == 1:
+            return 1 - self.last_own_action
+        return self.last_own_action
+
 
 class AverageCopier(Strategy):
     def select_action(self, observation, model=None):
+        self._sync(observation)
         rnd_num = random.random()
-        if rnd_num < self.opponent_cooperation_ratio(observation):
+        if rnd_num < self.opponent_cooperation_ratio():
             return 0
         return 1
 
+    def action_probabilities(self, observation, model=None):
+        self._sync(observation)
+        cooperation_ratio = self.opponent_cooperation_ratio()
+        probabilities = np.zeros(self.env.action_space.n)
+        probabilities[:2] = cooperation_ratio, 1 - cooperation_ratio
+        return probabilities
+
+
 class Grudger(Strategy):
     def select_action(self, observation, model=None):
-        effective_actions = self.get_effective_opponent_actions(observation)
-        if 1 in effective_actions:
+        self._sync(observation)
+        if self.opponent_defections > 0:
             return 1
         return 0
 
+
 class GoByMajority(Strategy):
     def select_action(self, observation, model=None):
-        effective_actions = self.get_effective_opponent_actions(observation)
-        if sum(effective_actions) > len(effective_actions) / 2:
+        self._sync(observation)
+        if self.opponent_defections > self.rounds_seen / 2:
             return 0
         return 1
 
+
+class BatchStrategy(Strategy):
+    """Base class for strategies deciding for every episode of a VecGameEnv at once.
+
+    The running state holds one entry per episode and select_actions(batch_state) maps the (num_envs, obs_dim)
+    observations of one agent to a (num_envs,) action array with NumPy operations.
+    """
+    def select_action(self, observation, model=None):
+        raise NotImplementedError("Batch strategies decide for all episodes at once, use select_actions")
+
+    def select_actions(self, batch_state, model=None):
+        raise NotImplementedError
+
+    def reset(self):
+        self.rounds_seen = 0
+        self.opponent_defections = np.zeros(self.env.num_envs, dtype=int)
+        self.last_own_action = np.zeros(self.env.num_envs, dtype=int)
+        self.last_opponent_action = np.zeros(self.env.num_envs, dtype=int)
+
+    def update(self, own_actions, opponent_actions):
+        self.rounds_seen += 1
+        self.opponent_defections += opponent_actions != 0  # Every action but cooperating (0) is a defection
+        self.last_own_action[:] = own_actions
+        self.last_opponent_action[:] = opponent_actions
+
+    def opponent_cooperation_ratio(self):
+        if self.rounds_seen == 0:
+            return np.full(self.env.num_envs, 0.5)
+        return 1 - self.opponent_defections / self.rounds_seen
+
+
+class BatchRandomPick(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        return np.random.randint(self.env.action_space.n, size=self.env.num_envs)
+
+
+class BatchDefector(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        return np.ones(self.env.num_envs, dtype=int)
+
+
+class BatchCooperator(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        return np.zeros(self.env.num_envs, dtype=int)
+
+
+class BatchModelStrategy(BatchStrategy):
+    epsilon = 0.  # Probability of playing a uniformly random action instead of the greedy one
+
+    def select_actions(self, batch_state, model=None):
+        with torch.inference_mode():
+            states = torch.as_tensor(batch_state, device=device, dtype=torch.float32)
+            actions = model(states).argmax(dim=1).cpu().numpy()
+        if self.epsilon > 0:
+            explore = np.random.random(self.env.num_envs) < self.epsilon
+            random_actions = np.random.randint(self.env.action_space.n, size=self.env.num_envs)
+            actions = np.where(explore, random_actions, actions)
+        return actions
+
+
+class BatchTitForTat(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return self.last_opponent_action.copy()
+
+
+class BatchAlternator(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        return np.full(self.env.num_envs, self.env.current_round % 2)
+
+
+class BatchAppeaser(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return np.where(self.last_opponent_action == 1, 1 - self.last_own_action, self.last_own_action)
+
+
+class BatchAverageCopier(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return (np.random.random(self.env.num_envs) >= self.opponent_cooperation_ratio()).astype(int)
+
+
+class BatchGrudger(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return (self.opponent_defections > 0).astype(int)
+
+
+class BatchGoByMajority(BatchStrategy):
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return (self.opponent_defections <= self.rounds_seen / 2).astype(int)
+
+
 class StrategyFactory:
     strategy_probabilities = {
         "random": (0., RandomPick),
@@ -109,6 +273,19 @@ class StrategyFactory:
         "go_by_majority": (0., GoByMajority),
     }
 
+    batch_strategies = {
+        "random": BatchRandomPick,
+        "defector": BatchDefector,
+        "cooperator": BatchCooperator,
+        "model": BatchModelStrategy,
+        "tit_for_tat": BatchTitForTat,
+        "alternator": BatchAlternator,
+        "appeaser": BatchAppeaser,
+        "average_copier": BatchAverageCopier,
+        "grudger": BatchGrudger,
+        "go_by_majority": BatchGoByMajority,
+    }
+
     @classmethod
     def create_strategy(cls, env, strategy_type="sample_from_dict"):
         if strategy_type == "sample_from_dict":
@@ -119,8 +296,19 @@ class StrategyFactory:
 
         return cls.strategy_probabilities[strategy_type][1](env)
 
+    @classmethod
+    def create_batch_strategy(cls, env, strategy_type="sample_from_dict"):
+        """Create the batched variant of a strategy for a VecGameEnv."""
+        if strategy_type == "sample_from_dict":
+            strategy_type = cls.sample_strategy()
+
+        assert strategy_type in cls.batch_strategies, \
+            f"Strategy type must be one of {list(cls.batch_strategies.keys())} or 'sample_from_dict'"
+
+        return cls.batch_strategies[strategy_type](env)
+
     @staticmethod
     def sample_strategy():
         strategies = list(StrategyFactory.strategy_probabilities.keys())
         weights = [prob[0] for prob in StrategyFactory.strategy_probabilities.values()]
-        return random.choices(strategies, weights=weights)[0]
\ No newline at end of file
+        return random.choices(strategies, weights=weights)[0]
@@ -0,0 +1,261 @@
+"""
+Tabular Q-learning and SARSA on exact joint-action histories.
+
+For short iterated games the whole history of joint actions fits in one integer: HistoryEncoder appends a round
+with a shift and an or, so the state of an episode is updated in O(1) per round and never approximated. The
+Q-values of the visited histories are kept in a QTable, either a dense NumPy array indexed by the key (small games)
+or a hash table (longer games, where only a tiny fraction of all histories is ever reached).
+
+Trained tables are exported as Strategy subclasses and registered in StrategyFactory, so they take part in
+tournaments like any scripted strategy.
+"""
+import math
+import random
+
+import numpy as np
+from tqdm import trange
+
+from game_env import GameEnv
+from strategies import Strategy, BatchStrategy, StrategyFactory
+
+TABULAR_ALGORITHMS = ("q_learning", "sarsa")
+DENSE_MAX_BITS = 20  # Largest key size stored as a dense array with "auto", 2^20 rows
+
+
+class HistoryEncoder:
+    """Packs a history of joint actions into an integer key, one round at a time
+
+    The key starts as a single sentinel bit and every round shifts in (own action, opponent action), so histories
+    of different lengths never share a key.
+
+    Args:
+        num_actions (int): Number of actions per agent
+        max_rounds (int): Number of rounds per episode
+    """
+    INITIAL_KEY = 1
+
+    def __init__(self, num_actions, max_rounds):
+        self.num_actions = num_actions
+        self.max_rounds = max_rounds
+        self.action_bits = max(1, (int(num_actions) - 1).bit_length())
+        self.key_bits = 1 + 2 * self.action_bits * max_rounds
+        assert self.key_bits <= 64, f"A history of {max_rounds} rounds does not fit in 64 bits"
+
+    def push(self, key, own_action, opponent_action):
+        return (key << (2 * self.action_bits)) | (own_action << self.action_bits) | opponent_action
+
+    def push_batch(self, keys, own_actions, opponent_actions):
+        """push for (num_envs,) np.uint64 keys and action arrays"""
+        own_actions = np.asarray(own_actions).astype(np.uint64)
+        opponent_actions = np.asarray(opponent_actions).astype(np.uint64)
+        return ((keys << np.uint64(2 * self.action_bits)) | (own_actions << np.uint64(self.action_bits))
+                | opponent_actions)
+
+    def encode(self, history):
+        key = self.INITIAL_KEY
+        for own_action, opponent_action in history:
+            key = self.push(key, int(own_action), int(opponent_action))
+        return key
+
+
+class QTable:
+    """Q-values of histories, keyed by HistoryEncoder keys
+
+    Args:
+        num_actions (int): Number of actions per agent
+        max_rounds (int): Number of rounds per episode
+        store (str): "dense" for a (2^key_bits, num_actions) array, "hash" for a dict of visited histories, "auto"
+            picks "dense" up to DENSE_MAX_BITS key bits
+    """
+    def __init__(self, num_actions, max_rounds, store="auto"):
+        assert store in ("auto", "dense", "hash"), "store must be 'auto', 'dense' or 'hash'"
+        self.encoder = HistoryEncoder(num_actions, max_rounds)
+        self.num_actions = num_actions
+        self.max_rounds = max_rounds
+        self.dense = store == "dense" or (store == "auto" and self.encoder.key_bits <= DENSE_MAX_BITS)
+        if self.dense:
+            self.values = np.zeros((1 << self.encoder.key_bits, num_actions))
+        else:
+            self.values = {}
+
+    def row(self, key):
+        """Writable Q-values of all actions in a history, unvisited histories start at 0"""
+        if self.dense:
+            return self.values[key]
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = np.zeros(self.num_actions)
+        return row
+
+    def greedy_action(self, key):
+        if self.dense:
+            return int(self.values[key].argmax())
+        row = self.values.get(key)
+        return 0 if row is None else int(row.argmax())
+
+    def greedy_actions(self, keys):
+        """Greedy actions for (num_envs,) np.uint64 keys"""
+        if self.dense:
+            return self.values[keys.astype(np.int64)].argmax(axis=1)
+        return np.array([self.greedy_action(int(key)) for key in keys], dtype=int)
+
+    def save(self, path):
+        # Only visited histories are written, a dense table is mostly zeros
+        if self.dense:
+            keys = np.flatnonzero(self.values.any(axis=1)).astype(np.uint64)
+            values = self.values[keys.astype(np.int64)]
+        else:
+            keys = np.fromiter(self.values.keys(), dtype=np.uint64, count=len(self.values))
+            values = np.array(list(self.values.values())).reshape(-1, self.num_actions)
+        np.savez(path, num_actions=self.num_actions, max_rounds=self.max_rounds, keys=keys, values=values)
+
+    @classmethod
+    def load(cls, path, store="auto"):
+        data = np.load(path)
+        table = cls(int(data["num_actions"]), int(data["max_rounds"]), store)
+        for key, values in zip(data["keys"], data["values"]):
+            table.row(int(key))[:] = values
+        return table
+
+
+class TabularQLearner:
+    """Learns a QTable for agent 1 against StrategyFactory opponents
+
+    Args:
+        game_type (str): Name of the game, see GameModes
+        max_rounds (int): Number of rounds per episode
+        algorithm (str): "q_learning" bootstraps from the greedy next action, "sarsa" from the next action taken
+        learning_rate (float): Step size of the Q-value updates
+        gamma (float): Discount factor for future rewards
+        eps_start (float): Initial probability of a random action
+        eps_end (float): Final probability of a random action
+        eps_decay (float): Number of episodes over which epsilon decays exponentially
+        store (str): Q-value store, see QTable
+    """
+    def __init__(self, game_type, max_rounds, algorithm="q_learning", learning_rate=0.1, gamma=0.995, eps_start=0.9,
+                 eps_end=0.05, eps_decay=1000, store="auto"):
+        assert algorithm in TABULAR_ALGORITHMS, f"algorithm must be one of {TABULAR_ALGORITHMS}"
+        self.env = GameEnv(game_type, render_mode=None, max_rounds=max_rounds)
+        self.num_actions = int(self.env.action_space.n)
+        self.q_table = QTable(self.num_actions, max_rounds, store)
+        self.encoder = self.q_table.encoder
+        self.algorithm = algorithm
+        self.learning_rate = learning_rate
+        self.gamma = gamma
+        self.eps_start = eps_start
+        self.eps_end = eps_end
+        self.eps_decay = eps_decay
+        self.episodes_done = 0
+
+    def epsilon(self):
+        return self.eps_end + (self.eps_start - self.eps_end) * math.exp(-1. * self.episodes_done / self.eps_decay)
+
+    def select_action(self, key, epsilon):
+        if random.random() < epsilon:
+            return random.randrange(self.num_actions)
+        return self.q_table.greedy_action(key)
+
+    def train(self, num_episodes, opponent="sample_from_dict", progress=True):
+        """Play and learn from num_episodes episodes.
+
+        Args:
+            num_episodes (int): Number of episodes
+            opponent (str): Strategy of agent 2, a scripted strategy name or 'sample_from_dict' to sample one per
+                episode, see StrategyFactory
+            progress (bool): Show a progress bar
+
+        Returns:
+            np.ndarray of shape (num_episodes,) with agent 1's cumulative reward per episode
+        """
+        env = self.env
+        episode_rewards = np.zeros(num_episodes)
+        for episode in trange(num_episodes, disable=not progress):
+            strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=opponent)
+            epsilon = self.epsilon()
+
+            observations, _ = env.reset()
+            observation_agent2 = observations[1]
+            key = self.encoder.INITIAL_KEY
+            action = self.select_action(key, epsilon)
+            for _ in range(env.max_rounds):
+                opponent_action = strategy_agent2.select_action(observation_agent2)
+                observations, (reward, _), terminated, _, _ = env.step(action, opponent_action)
+                observation_agent2 = observations[1]
+                episode_rewards[episode] += reward
+
+                next_key = self.encoder.push(key, action, int(opponent_action))
+                next_action = None
+                target = reward
+                if not terminated:
+                    next_values = self.q_table.row(next_key)
+                    next_action = self.select_action(next_key, epsilon)
+                    if self.algorithm == "sarsa":
+                        target += self.gamma * next_values[next_action]
+                    else:
+                        target += self.gamma * next_values.max()
+
+                values = self.q_table.row(key)
+                values[action] += self.learning_rate * (target - values[action])
+                if terminated:
+                    break
+                key, action = next_key, next_action
+
+            self.episodes_done += 1
+        return episode_rewards
+
+    def export(self, name="tabular"):
+        return export_strategy(self.q_table, name)
+
+
+class TabularStrategy(Strategy):
+    """Plays greedily with respect to a QTable, see export_strategy"""
+    q_table = None
+
+    def reset(self):
+        super().reset()
+        self.history_key = HistoryEncoder.INITIAL_KEY
+
+    def update(self, own_action, opponent_action):
+        super().update(own_action, opponent_action)
+        self.history_key = self.q_table.encoder.push(self.history_key, self.last_own_action,
+                                                     self.last_opponent_action)
+
+    def select_action(self, observation, model=None):
+        self._sync(observation)
+        return self.q_table.greedy_action(self.history_key)
+
+    def memo_key(self, observation):
+        self._sync(observation)
+        return self.history_key
+
+
+class BatchTabularStrategy(BatchStrategy):
+    q_table = None
+
+    def reset(self):
+        super().reset()
+        self.history_keys = np.full(self.env.num_envs, HistoryEncoder.INITIAL_KEY, dtype=np.uint64)
+
+    def update(self, own_actions, opponent_actions):
+        super().update(own_actions, opponent_actions)
+        self.history_keys = self.q_table.encoder.push_batch(self.history_keys, self.last_own_action,
+                                                            self.last_opponent_action)
+
+    def select_actions(self, batch_state, model=None):
+        self._sync(batch_state)
+        return self.q_table.greedy_actions(self.history_keys)
+
+
+def export_strategy(q_table, name="tabular"):
+    """Register the greedy policy of a QTable in StrategyFactory, with sampling probability 0.
+
+    Worker processes of a tournament inherit the registration when they are forked after this call.
+
+    Returns:
+        The Strategy subclass playing the policy
+    """
+    strategy = type("TabularStrategy", (TabularStrategy,), {"q_table": q_table})
+    batch_strategy = type("BatchTabularStrategy", (BatchTabularStrategy,), {"q_table": q_table})
+    StrategyFactory.strategy_probabilities[name] = (0., strategy)
+    StrategyFactory.batch_strategies[name] = batch_strategy
+    return strategy
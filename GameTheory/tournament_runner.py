@@ -0,0 +1,224 @@
+"""
+Round-robin tournaments sharded over a process pool, with a persistent result cache.
+
+Every ordered pair of strategies is evaluated in a worker process. In "monte_carlo" mode each pairing has its own
+seed, derived from the pair's names, so a pairing gives the same result no matter which worker runs it or which other
+strategies take part. "adaptive" mode uses common random numbers across pairings instead, see
+monte_carlo_evaluation. Results are merged in pair order and stored in a JSON cache keyed by the strategy names,
+game type, max_rounds, observation encoding, evaluation mode and its settings (episode count, seed, tolerance) and,
+for pairings involving the model strategy or a tabular strategy, a content hash of the model weights or Q-table.
+Re-running a tournament after retraining the model therefore only recomputes the pairings that involve the model.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+from tqdm import tqdm
+
+from game_env import GameEnv
+from model import DQN
+from strategies import StrategyFactory
+from exact_evaluation import expected_payoffs
+from monte_carlo_evaluation import evaluate_fixed, evaluate_adaptive
+from tabular import QTable, export_strategy
+
+MODEL_STRATEGY = "model"
+EVALUATION_MODES = ("monte_carlo", "adaptive", "exact")
+
+# Settings that change the result of a pairing, per evaluation mode
+_MODE_SETTINGS = {
+    "exact": (),
+    "monte_carlo": ("num_episodes", "seed"),
+    "adaptive": ("num_episodes", "seed", "tolerance", "confidence", "batch_episodes"),
+}
+
+# Models loaded by a worker process, keyed by their content hash
+_worker_models = {}
+
+
+def file_hash(path):
+    """sha256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pair_seed(seed, strat1, strat2):
+    """Seed of one pairing, independent of the other strategies in the tournament"""
+    digest = hashlib.sha256(f"{seed}:{strat1}:{strat2}".encode()).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def _load_model(config, env):
+    model_hash = config["model_hash"]
+    if model_hash not in _worker_models:
+        input_dim = len(env.reset()[0][0])
+        model = DQN(input_dim, config["hidden_sizes"], env.action_space.n)
+        model.load_state_dict(torch.load(config["model_path"], map_location="cpu"))
+        model.eval()
+        _worker_models[model_hash] = model
+    return _worker_models[model_hash]
+
+
+def _register_tabular(strategies, config):
+    # Tabular strategies are registered by name, once per worker process
+    for name in strategies:
+        path = config["tabular_paths"].get(name)
+        if path is not None and name not in StrategyFactory.strategy_probabilities:
+            export_strategy(QTable.load(path), name)
+
+
+def _init_worker():
+    # One thread per worker, the pool already uses every core
+    torch.set_num_threads(1)
+
+
+def evaluate_pair(task):
+    """Average cumulative rewards of one pairing, run inside a worker process
+
+    Returns:
+        dict with the average cumulative rewards of both agents, the half-widths of their confidence intervals
+        and the number of episodes played (0 for exact evaluation)
+    """
+    strat1, strat2, config = task
+    _register_tabular((strat1, strat2), config)
+    game_type, max_rounds, num_episodes = config["game_type"], config["max_rounds"], config["num_episodes"]
+    encoding, window = config["encoding"], config["window"]
+    env = GameEnv(game_type, render_mode=None, max_rounds=max_rounds, encoding=encoding, window=window)
+    model = None
+    if MODEL_STRATEGY in (strat1, strat2):
+        model = _load_model(config, env)
+
+    if config["mode"] == "exact":
+        strategy_agent1 = StrategyFactory.create_strategy(env, strategy_type=strat1)
+        strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=strat2)
+        agent1_reward, agent2_reward = expected_payoffs(strategy_agent1, strategy_agent2, env, model)
+        return {"agent1_reward": float(agent1_reward), "agent2_reward": float(agent2_reward),
+                "agent1_ci": 0., "agent2_ci": 0., "num_episodes": 0}
+
+    if config["mode"] == "adaptive":
+        stats = evaluate_adaptive(strat1, strat2, game_type, max_rounds, model, tolerance=config["tolerance"],
+                                  confidence=config["confidence"], batch_episodes=config["batch_episodes"],
+                                  max_episodes=num_episodes, seed=config["seed"], encoding=encoding, window=window)
+    else:
+        stats = evaluate_fixed(strat1, strat2, game_type, max_rounds, num_episodes, model,
+                               seed=pair_seed(config["seed"], strat1, strat2), encoding=encoding, window=window)
+
+    agent1_ci, agent2_ci = stats.half_width(config["confidence"])
+    return {"agent1_reward": float(stats.mean[0]), "agent2_reward": float(stats.mean[1]),
+            "agent1_ci": float(agent1_ci), "agent2_ci": float(agent2_ci), "num_episodes": stats.count}
+
+
+class ResultCache:
+    """Average rewards of pairings, persisted as a JSON file
+
+    Args:
+        path (str): Location of the cache file, created on the first save
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(strat1, strat2, config):
+        names = ("game_type", "max_rounds", "mode", "encoding", "window") + _MODE_SETTINGS[config["mode"]]
+        settings = {name: config[name] for name in names}
+        if MODEL_STRATEGY in (strat1, strat2):
+            settings["model_hash"] = config["model_hash"]
+        tabular_hashes = {name: config["tabular_hashes"][name] for name in (strat1, strat2)
+                          if name in config["tabular_hashes"]}
+        if tabular_hashes:
+            settings["tabular_hashes"] = tabular_hashes
+        return json.dumps([strat1, strat2, settings], sort_keys=True)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, result):
+        self.entries[key] = result
+
+    def save(self):
+        # Write to a temporary file first so an interrupted run never leaves a truncated cache behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def run_round_robin(strategies_list, game_type, max_rounds, num_episodes, model_path=None, hidden_sizes=None,
+                    mode="monte_carlo", num_workers=None, cache_path="tournament_cache.json", seed=0,
+                    tolerance=0.1, confidence=0.95, batch_episodes=100, encoding="history", window=4,
+                    tabular_paths=None):
+    """Evaluate every ordered pair of strategies, reusing cached pairings.
+
+    Args:
+        strategies_list (list): Strategy names, see StrategyFactory
+        game_type (str): Name of the game, see GameModes
+        max_rounds (int): Number of rounds per episode
+        num_episodes (int): Episodes per pairing in "monte_carlo" mode, upper bound in "adaptive" mode
+        model_path (str): Weights of the DQN used by the model strategy
+        hidden_sizes (list): Hidden layer sizes of that DQN
+        mode (str): "monte_carlo", "adaptive" (see monte_carlo_evaluation) or "exact" (see exact_evaluation)
+        num_workers (int): Number of worker processes, defaults to the number of CPUs
+        cache_path (str): JSON file for cached results, None disables the cache
+        seed (int): Base seed the per-pair and per-batch seeds are derived from
+        tolerance (float): Half-width of the confidence interval at which "adaptive" mode stops
+        confidence (float): Confidence level of the reported intervals
+        batch_episodes (int): Episodes per batch in "adaptive" mode
+        encoding (str): Observation encoding the model was trained with, see GameEnv
+        window (int): Window of 'summary' observations
+        tabular_paths (dict): Q-tables saved with QTable.save, keyed by the strategy name they are registered under
+
+    Returns:
+        dict mapping (strat1, strat2) to the result of evaluate_pair: the average cumulative rewards per episode
+        ("agent1_reward", "agent2_reward"), the half-widths of their confidence intervals ("agent1_ci",
+        "agent2_ci") and "num_episodes", in the order of strategies_list
+    """
+    assert mode in EVALUATION_MODES, f"mode must be one of {EVALUATION_MODES}"
+    assert MODEL_STRATEGY not in strategies_list or (model_path is not None and os.path.exists(model_path)), \
+        f"The model strategy needs the weights in model_path, {model_path} does not exist"
+
+    # The model is only loaded, and its file only hashed, when the model strategy plays
+    if MODEL_STRATEGY not in strategies_list:
+        model_path = None
+    tabular_paths = tabular_paths or {}
+    config = {
+        "game_type": game_type, "max_rounds": max_rounds, "num_episodes": num_episodes, "mode": mode,
+        "seed": seed, "tolerance": tolerance, "confidence": confidence, "batch_episodes": batch_episodes,
+        "encoding": encoding, "window": window, "model_path": model_path, "hidden_sizes": hidden_sizes,
+        "model_hash": file_hash(model_path) if model_path is not None else None,
+        "tabular_paths": tabular_paths,
+        "tabular_hashes": {name: file_hash(path) for name, path in tabular_paths.items()},
+    }
+    _register_tabular(tabular_paths, config)
+    cache = ResultCache(cache_path) if cache_path is not None else None
+
+    pairs = [(strat1, strat2) for strat1 in strategies_list for strat2 in strategies_list]
+    results = {}
+    missing = []
+    for pair in pairs:
+        cached = cache.get(ResultCache.key(*pair, config)) if cache is not None else None
+        if cached is not None:
+            results[pair] = cached
+        else:
+            missing.append(pair)
+
+    if missing:
+        tasks = [(strat1, strat2, config) for strat1, strat2 in missing]
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker) as executor:
+            # map yields in task order, so the merged results do not depend on scheduling
+            for pair, result in tqdm(zip(missing, executor.map(evaluate_pair, tasks)), total=len(missing)):
+                results[pair] = result
+                if cache is not None:
+                    cache.put(ResultCache.key(*pair, config), result)
+        if cache is not None:
+            cache.save()
+
+    return {pair: results[pair] for pair in pairs}
@@ -0,0 +1,38 @@
+"""
+Multi-Agent Deep Q-learning with an actor-learner split, see actor_learner.py.
+    1. NUM_ACTORS actor processes play episodes against strategies sampled from StrategyFactory, using the latest
+       policy weights published by the learner.
+    2. The learner, running in this process, stores the episodes in the replay memories and makes REPLAY_RATIO
+       updates of both agents' DQNs per stored round. Actors that run ahead of it wait, so REPLAY_RATIO = 1, as
+       many updates as train.py, caps the rounds per second at the learner's update rate.
+    3. TARGET_UPDATE and SELF_PLAY_UPDATE count episodes received from all actors, as in train.py.
+
+The saved models are the same DQN state dicts as those of train.py and train_with_strategy.py.
+"""
+import torch
+
+from actor_learner import train_actor_learner
+from hyperparameters import Hyperparameter
+
+# Training parameters
+hyperparameter = Hyperparameter()
+NUM_EPISODES = hyperparameter.NUM_EPISODES
+MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+NUM_ACTORS = hyperparameter.NUM_ACTORS
+GAME_TYPE = "prisoners_dilemma"
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+if __name__ == "__main__":
+    learner, stats = train_actor_learner(
+        GAME_TYPE, MAX_ROUNDS_PER_EPISODE, NUM_EPISODES, NUM_ACTORS, hyperparameter.HIDDEN_SIZES,
+        hyperparameter.LEARNING_RATE, hyperparameter.GAMMA, hyperparameter.BATCH_SIZE,
+        hyperparameter.REPLAY_BUFFER_SIZE, hyperparameter.EPS_START, hyperparameter.EPS_END, hyperparameter.EPS_DECAY,
+        hyperparameter.TARGET_UPDATE, hyperparameter.SELF_PLAY_UPDATE,
+        publish_interval=hyperparameter.PUBLISH_INTERVAL, replay_ratio=hyperparameter.REPLAY_RATIO,
+        encoding=hyperparameter.OBSERVATION_ENCODING, window=hyperparameter.OBSERVATION_WINDOW, device=device)
+    print(f"Rounds per second: {stats['rounds_per_second']:.0f}, updates per second: {stats['updates_per_second']:.0f}")
+
+    # Save the trained models
+    torch.save(learner.agent_state_dict(0), f"{GAME_TYPE}_agent1.pth")
+    torch.save(learner.agent_state_dict(1), f"{GAME_TYPE}_agent2.pth")
+    print("Training complete, models saved.")
@@ -0,0 +1,136 @@
+"""
+Deep Q-learning against a league of past policies and scripted strategies, see league.py.
+    1. Agent 1 is trained with the DQN update of train.py against an opponent sampled from the league for every
+       episode, a scripted strategy or a frozen snapshot of agent 1, weighted by its rating.
+    2. Every SNAPSHOT_INTERVAL episodes agent 1 is frozen into the snapshot pool, enters the league with its
+       current rating and plays LEAGUE_MATCHES rated matches in parallel worker processes.
+    3. Unlike SELF_PLAY_UPDATE, which only ever plays against the latest copy of agent 1, the league keeps up to
+       LEAGUE_SIZE earlier policies around, so agent 1 cannot forget how to beat them.
+
+Agent 1 is saved as in train.py, agent 2 is the highest-rated snapshot.
+"""
+import math
+import random
+
+import torch
+from tqdm import trange
+
+from game_env import GameEnv
+from buffer import ReplayMemory
+from learner import MultiAgentDQNLearner
+from league import SNAPSHOT_PREFIX, League, SnapshotPool
+from strategies import StrategyFactory
+from hyperparameters import Hyperparameter
+
+# Training parameters
+hyperparameter = Hyperparameter()
+NUM_EPISODES = hyperparameter.NUM_EPISODES
+MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+REPLAY_MEMORY_SIZE = hyperparameter.REPLAY_BUFFER_SIZE
+GAME_TYPE = "prisoners_dilemma"
+
+# Hyperparameters
+BATCH_SIZE = hyperparameter.BATCH_SIZE
+GAMMA = hyperparameter.GAMMA  # Discount factor for future rewards
+LEARNING_RATE = hyperparameter.LEARNING_RATE
+TARGET_UPDATE = hyperparameter.TARGET_UPDATE
+
+# League parameters
+LEAGUE_SIZE = hyperparameter.LEAGUE_SIZE
+SNAPSHOT_INTERVAL = hyperparameter.SNAPSHOT_INTERVAL
+LEAGUE_MATCHES = hyperparameter.LEAGUE_MATCHES
+LEAGUE_MATCH_EPISODES = hyperparameter.LEAGUE_MATCH_EPISODES
+NUM_WORKERS = None  # League worker processes, None: one per CPU
+
+# Epsilon-greedy strategy parameters
+EPS_START = hyperparameter.EPS_START  # Starting value of epsilon
+EPS_END = hyperparameter.EPS_END  # Ending value of epsilon
+EPS_DECAY = hyperparameter.EPS_DECAY  # Rate at which epsilon decays
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+# Action selection function based on epsilon-greedy strategy
+def select_action(state, policy_net, steps_done, output_dim):
+    sample = random.random()
+    eps_threshold = EPS_END + (EPS_START - EPS_END) * math.exp(-1. * steps_done / EPS_DECAY)
+    if sample > eps_threshold:
+        with torch.no_grad():
+            return policy_net(state).argmax(dim=1).item()
+    else:
+        return random.randrange(output_dim)
+
+
+# The league's workers are spawned processes that import this module, so training only runs in the main process
+if __name__ == "__main__":
+    # Environment setup
+    env = GameEnv(GAME_TYPE, render_mode=None, max_rounds=MAX_ROUNDS_PER_EPISODE, obs_mode="array",
+                  encoding=hyperparameter.OBSERVATION_ENCODING, window=hyperparameter.OBSERVATION_WINDOW)
+    input_dim = len(env.reset()[0][0])
+    output_dim = env.action_space.n
+
+    # Only agent 1 learns, agent 2 is played by the league
+    memory = ReplayMemory(REPLAY_MEMORY_SIZE, input_dim, device)
+    learner = MultiAgentDQNLearner([memory], input_dim, hyperparameter.HIDDEN_SIZES, output_dim,
+                                   LEARNING_RATE, GAMMA, BATCH_SIZE, device)
+    policy_net1 = learner.agent_model(0)
+
+    # League of the scripted strategies and snapshots of agent 1, starting with the untrained policy
+    scripted = [name for name in StrategyFactory.strategy_probabilities if name != "model"]
+    pool = SnapshotPool(LEAGUE_SIZE, input_dim, hyperparameter.HIDDEN_SIZES, output_dim)
+    league = League(pool, GAME_TYPE, MAX_ROUNDS_PER_EPISODE, scripted, match_episodes=LEAGUE_MATCH_EPISODES,
+                    num_workers=NUM_WORKERS, encoding=hyperparameter.OBSERVATION_ENCODING,
+                    window=hyperparameter.OBSERVATION_WINDOW)
+    learner_snapshot = league.add_snapshot(learner.policy_net)
+    league.rate(learner_snapshot, LEAGUE_MATCHES)
+
+    # Main training loop
+    steps_done = 0
+    progress = trange(NUM_EPISODES)
+    for episode in progress:
+        # Sample an opponent by its expected score against the latest snapshot of agent 1
+        opponent = league.sample_opponent(league.ratings.ratings[learner_snapshot])
+        if opponent.startswith(SNAPSHOT_PREFIX):
+            strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type="model")
+            model_agent2 = pool.model(opponent)
+        else:
+            strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=opponent)
+            model_agent2 = None
+
+        observations, _ = env.reset()
+        observation_agent1, observation_agent2 = observations
+        for _ in range(MAX_ROUNDS_PER_EPISODE):
+            state_agent1 = torch.from_numpy(observation_agent1).to(device).unsqueeze(0)
+            action_agent1 = select_action(state_agent1, policy_net1, steps_done, output_dim)
+            action_agent2 = strategy_agent2.select_action(observation_agent2, model=model_agent2)
+            steps_done += 1
+
+            observations, (reward_agent1, _), terminated, _, _ = env.step(action_agent1, action_agent2)
+            observation_agent1, observation_agent2 = observations
+            next_state_agent1 = torch.from_numpy(observation_agent1).to(device).unsqueeze(0)
+            memory.push(state_agent1, action_agent1, next_state_agent1, reward_agent1, terminated)
+
+            learner.optimize_model()
+            if terminated:
+                break
+
+        # Every TARGET_UPDATE episodes, update the weights of the target network
+        if episode % TARGET_UPDATE == 0:
+            learner.update_target()
+
+        # Every SNAPSHOT_INTERVAL episodes, freeze agent 1 into the league and rate it
+        if (episode + 1) % SNAPSHOT_INTERVAL == 0:
+            rating = league.ratings.ratings[learner_snapshot]
+            learner_snapshot = league.add_snapshot(learner.policy_net, rating=rating)
+            league.rate(learner_snapshot, LEAGUE_MATCHES)
+            progress.set_postfix(Elo=f"{league.ratings.ratings[learner_snapshot]:.0f}")
+
+    # Save agent 1 and the highest-rated snapshot as agent 2
+    torch.save(learner.agent_state_dict(0), f"{GAME_TYPE}_agent1.pth")
+    torch.save(pool.state_dict(league.best_snapshot()), f"{GAME_TYPE}_agent2.pth")
+    print("Training complete, models saved.")
+
+    print("\nLeague Ratings:")
+    ranking = sorted(league.ratings.ratings.items(), key=lambda x: x[1], reverse=True)
+    for i, (name, rating) in enumerate(ranking[:20], 1):
+        print(f"{i}. {name}: {rating:.0f} ({league.ratings.games[name]} matches)")
+    league.close()
@@ -0,0 +1,127 @@
+"""
+Multi-Agent Deep Q-learning on several games at once.
+    1. A MultiGameVecEnv plays MULTITASK_NUM_ENVS episodes side by side, spread evenly over MULTITASK_GAMES.
+    2. Observations end with the payoff matrix and the valid actions of the episode's game, so one DQN per agent can
+       tell the games apart and learn a policy for each of them. Actions outside the game are masked when acting and
+       in the DQN targets.
+    3. Every round, the transitions of all episodes are pushed into the replay memories at once and
+       MULTITASK_UPDATES_PER_STEP fused MultiAgentDQNLearner updates are made, on minibatches mixing all games.
+    4. TARGET_UPDATE and SELF_PLAY_UPDATE count batches of MULTITASK_NUM_ENVS episodes instead of single episodes.
+
+With MULTITASK_UPDATES_PER_STEP = MULTITASK_NUM_ENVS every transition is used for one update on average, as in
+train.py, and NUM_EPISODES episodes are split evenly over the games. Environment setup, data collection and the
+network are shared, but each game gets 1 / len(MULTITASK_GAMES) of the episodes and updates a train.py run of that
+game would get, so raise NUM_EPISODES accordingly to match it. The agents are saved as multitask_agent1.pth and
+multitask_agent2.pth.
+"""
+import math
+
+import numpy as np
+import torch
+from tqdm import trange
+
+from game_env import MultiGameVecEnv
+from learner import MultiAgentDQNLearner
+from buffer import ReplayMemory
+from hyperparameters import Hyperparameter
+
+# Training parameters
+hyperparameter = Hyperparameter()
+GAME_TYPES = hyperparameter.MULTITASK_GAMES
+NUM_ENVS = hyperparameter.MULTITASK_NUM_ENVS
+UPDATES_PER_STEP = hyperparameter.MULTITASK_UPDATES_PER_STEP
+NUM_BATCHES = max(hyperparameter.NUM_EPISODES // NUM_ENVS, 1)
+MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+REPLAY_MEMORY_SIZE = hyperparameter.REPLAY_BUFFER_SIZE * len(GAME_TYPES)
+
+# Hyperparameters
+BATCH_SIZE = hyperparameter.BATCH_SIZE
+GAMMA = hyperparameter.GAMMA  # Discount factor for future rewards
+LEARNING_RATE = hyperparameter.LEARNING_RATE
+TARGET_UPDATE = hyperparameter.TARGET_UPDATE
+SELF_PLAY_UPDATE = hyperparameter.SELF_PLAY_UPDATE
+
+# Epsilon-greedy strategy parameters, steps are rounds summed over all episodes as in train.py
+EPS_START = hyperparameter.EPS_START  # Starting value of epsilon
+EPS_END = hyperparameter.EPS_END  # Ending value of epsilon
+EPS_DECAY = hyperparameter.EPS_DECAY  # Rate at which epsilon decays
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Environment setup
+env = MultiGameVecEnv(GAME_TYPES, num_envs=NUM_ENVS, max_rounds=MAX_ROUNDS_PER_EPISODE)
+input_dim = env.observation_space.shape[0]
+output_dim = env.action_space.n
+
+# Replay memories and the fused learner of both agents
+memory1 = ReplayMemory(REPLAY_MEMORY_SIZE, input_dim, device)
+memory2 = ReplayMemory(REPLAY_MEMORY_SIZE, input_dim, device)
+learner = MultiAgentDQNLearner([memory1, memory2], input_dim, hyperparameter.HIDDEN_SIZES, output_dim,
+                               LEARNING_RATE, GAMMA, BATCH_SIZE, device, action_mask=env.action_mask)
+
+
+# Greedy actions of both agents with one forward pass of the ensemble, among the valid actions of each episode's game
+def greedy_actions(states):
+    with torch.no_grad():
+        q_values = learner.policy_net(states).masked_fill(states[..., env.action_mask] == 0, -math.inf)
+    return q_values.argmax(dim=2).cpu().numpy()
+
+
+# Batched epsilon-greedy action selection for both agents, exploring the valid actions of each episode's game
+def select_actions(states, steps_done):
+    eps_threshold = EPS_END + (EPS_START - EPS_END) * math.exp(-1. * steps_done / EPS_DECAY)
+    actions = greedy_actions(states)
+    explore = np.random.random(actions.shape) < eps_threshold
+    return np.where(explore, np.random.randint(env.env_num_actions, size=actions.shape), actions)
+
+
+# Main training loop
+steps_done = 0
+for batch in trange(NUM_BATCHES):
+    observations, _ = env.reset()
+
+    for _ in range(MAX_ROUNDS_PER_EPISODE):
+        # (2, num_envs, input_dim) states of both agents
+        states = torch.from_numpy(np.stack(observations)).to(device)
+        actions = select_actions(states, steps_done)
+        steps_done += NUM_ENVS
+
+        observations, rewards, terminated, _, _ = env.step(actions[0], actions[1])
+        next_states = np.stack(observations)
+
+        for agent_idx, memory in enumerate((memory1, memory2)):
+            memory.push_batch(states[agent_idx], actions[agent_idx], next_states[agent_idx], rewards[agent_idx],
+                              terminated)
+
+        # Perform UPDATES_PER_STEP fused optimization steps for both agents on minibatches mixing all games
+        for _ in range(UPDATES_PER_STEP):
+            learner.optimize_model()
+
+        if terminated.all():
+            env.episode_counter += NUM_ENVS
+            break
+
+    # Every TARGET_UPDATE batches, update the weights of the target networks
+    if batch % TARGET_UPDATE == 0:
+        learner.update_target()
+
+    # Every SELF_PLAY_UPDATE batches, synchronize the policy of agent 2 with that of agent 1
+    if batch % SELF_PLAY_UPDATE == 0:
+        learner.sync_agents(0, 1)
+
+# Save the trained models
+torch.save(learner.agent_state_dict(0), "multitask_agent1.pth")
+torch.save(learner.agent_state_dict(1), "multitask_agent2.pth")
+print("Training complete, models saved.")
+
+# Greedy self-play of the trained agents in every game
+eval_env = MultiGameVecEnv(GAME_TYPES, num_envs=NUM_ENVS, max_rounds=MAX_ROUNDS_PER_EPISODE)
+observations, _ = eval_env.reset()
+for _ in range(MAX_ROUNDS_PER_EPISODE):
+    actions = greedy_actions(torch.from_numpy(np.stack(observations)).to(device))
+    observations, _, terminated, _, _ = eval_env.step(actions[0], actions[1])
+    if terminated.all():
+        break
+
+print("\nAverage reward per round (agent 1, agent 2):")
+for game_type, (reward_agent1, reward_agent2) in zip(GAME_TYPES, eval_env.game_avg_rewards()):
+    print(f"{game_type}: {reward_agent1:.2f}, {reward_agent2:.2f}")
@@ -0,0 +1,46 @@
+"""
+Tabular Q-learning baseline for Game Theory like games.
+    1. Agent 1 keeps one Q-value per action for every exact joint-action history it has seen, keyed by the
+       history packed into an integer (see tabular.HistoryEncoder).
+    2. It plays against the scripted strategies of StrategyFactory and updates the Q-value of each round with the
+       reward plus the discounted value of the next history ("q_learning": greedy next action, "sarsa": next action
+       taken).
+    3. The learned table is saved and its greedy policy is evaluated exactly against every scripted strategy.
+
+A few thousand episodes of a short game train in seconds on a CPU, which makes this a quick baseline for the DQN.
+The saved table is picked up by tournament.py as the "tabular" strategy.
+"""
+from strategies import StrategyFactory
+from hyperparameters import Hyperparameter
+from tabular import TabularQLearner
+from exact_evaluation import expected_payoffs
+
+hyperparameter = Hyperparameter()
+NUM_EPISODES = hyperparameter.NUM_EPISODES
+MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
+GAME_TYPE = "prisoners_dilemma"
+
+# Opponent of agent 1, 'sample_from_dict' samples a strategy per episode with the StrategyFactory probabilities
+OPPONENT_STRATEGY = "sample_from_dict"
+
+learner = TabularQLearner(GAME_TYPE, MAX_ROUNDS_PER_EPISODE, algorithm=hyperparameter.TABULAR_ALGORITHM,
+                          learning_rate=hyperparameter.TABULAR_LEARNING_RATE, gamma=hyperparameter.GAMMA,
+                          eps_start=hyperparameter.EPS_START, eps_end=hyperparameter.EPS_END,
+                          eps_decay=hyperparameter.TABULAR_EPS_DECAY)
+episode_rewards = learner.train(NUM_EPISODES, opponent=OPPONENT_STRATEGY)
+print(f"Average cumulative reward over the last 100 episodes: {episode_rewards[-100:].mean()}")
+
+# Save the Q-table
+learner.q_table.save(f"{GAME_TYPE}_tabular.npz")
+print("Training complete, Q-table saved.")
+
+# Expected rewards of the greedy policy against every scripted strategy
+learner.export("tabular")
+env = learner.env
+for opponent in StrategyFactory.strategy_probabilities:
+    if opponent in ("model", "tabular"):
+        continue
+    strategy_agent1 = StrategyFactory.create_strategy(env, strategy_type="tabular")
+    strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type=opponent)
+    agent1_reward, agent2_reward = expected_payoffs(strategy_agent1, strategy_agent2, env)
+    print(f"Tabular vs {opponent}: {agent1_reward:.2f} vs {agent2_reward:.2f}")
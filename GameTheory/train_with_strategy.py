@@ -39,22 +39,22 @@ SELF_PLAY_UPDATE: -> keeps the two agents in sync
 # Necessary libraries
 from game_env import GameEnv
 import torch
-import torch.nn.functional as F
-from torch import optim
 import random
 import math
 from tqdm import trange
 
-from model import DQN
+from learner import MultiAgentDQNLearner
 from buffer import ReplayMemory
 from strategies import StrategyFactory
+from checkpoint import Checkpointer, resume_training, training_state
+from profiler import PhaseTimer
 from hyperparameters import Hyperparameter
 
 # Training parameters
 hyperparameter = Hyperparameter()
 NUM_EPISODES = hyperparameter.NUM_EPISODES
 MAX_ROUNDS_PER_EPISODE = hyperparameter.MAX_ROUNDS_PER_EPISODE
-REPLAY_MEMORY_SIZE = hyperparameter.REPLAY_MEMORY_SIZE
+REPLAY_MEMORY_SIZE = hyperparameter.REPLAY_BUFFER_SIZE
 
 # Hyperparameters
 BATCH_SIZE = hyperparameter.BATCH_SIZE
@@ -73,33 +73,38 @@ SELF_PLAY_UPDATE = hyperparameter.SELF_PLAY_UPDATE
 EPS_START = hyperparameter.EPS_START  # Starting value of epsilon
 EPS_END = hyperparameter.EPS_END  # Ending value of epsilon
 EPS_DECAY = hyperparameter.EPS_DECAY  # Rate at which epsilon decays
+
+# Checkpoint parameters
+CHECKPOINT_INTERVAL = hyperparameter.CHECKPOINT_INTERVAL
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 # Environment setup
-env = GameEnv("prisoners_dilemma", render_mode=None, max_rounds=MAX_ROUNDS_PER_EPISODE)
+env = GameEnv("prisoners_dilemma", render_mode=None, max_rounds=MAX_ROUNDS_PER_EPISODE, obs_mode="array",
+              encoding=hyperparameter.OBSERVATION_ENCODING, window=hyperparameter.OBSERVATION_WINDOW)
 
 # Observations and action spaces
 input_dim = len(env.reset()[0][0])
 output_dim = env.action_space.n
 
-# Neural network configurations
-hidden_sizes = hyperparameter.HIDDEN_SIZES
-policy_net1 = DQN(input_dim, hidden_sizes, output_dim).to(device)  # Primary DQN for agent 1
-target_net1 = DQN(input_dim, hidden_sizes, output_dim).to(device)  # Target DQN for agent 1
-policy_net2 = DQN(input_dim, hidden_sizes, output_dim).to(device)  # Primary DQN for agent 2
-target_net2 = DQN(input_dim, hidden_sizes, output_dim).to(device)  # Target DQN for agent 2
-
-# Initialize target network weights with policy network's weights
-target_net1.load_state_dict(policy_net1.state_dict())
-target_net2.load_state_dict(policy_net2.state_dict())
-
-# Optimizers to adjust neural network weights
-optimizer1 = optim.Adam(policy_net1.parameters(), lr=LEARNING_RATE)
-optimizer2 = optim.Adam(policy_net2.parameters(), lr=LEARNING_RATE)
+# Opt-in timing of the training phases, see profiler.py
+timer = PhaseTimer(enabled=hyperparameter.PROFILE, report_path="profile_train_with_strategy.json",
+                   report_every=hyperparameter.PROFILE_REPORT_INTERVAL,
+                   torch_profile_episodes=hyperparameter.PROFILE_TORCH_EPISODES,
+                   trace_path="trace_train_with_strategy.json")
 
 # Replay memories to store experiences
-memory1 = ReplayMemory(REPLAY_MEMORY_SIZE)
-memory2 = ReplayMemory(REPLAY_MEMORY_SIZE)
+memory1 = ReplayMemory(REPLAY_MEMORY_SIZE, input_dim, device)
+memory2 = ReplayMemory(REPLAY_MEMORY_SIZE, input_dim, device)
+
+# Neural network configurations
+# The primary and target DQNs of both agents are stacked into one ensemble each, so both agents are updated with a
+# single forward/backward pass and optimizer step. The target networks start with the policy networks' weights.
+hidden_sizes = hyperparameter.HIDDEN_SIZES
+learner = MultiAgentDQNLearner([memory1, memory2], input_dim, hidden_sizes, output_dim,
+                               LEARNING_RATE, GAMMA, BATCH_SIZE, device, timer=timer)
+policy_net1 = learner.agent_model(0)  # Primary DQN for agent 1
+policy_net2 = learner.agent_model(1)  # Primary DQN for agent 2
 
 
 # Action selection function based on epsilon-greedy strategy
@@ -112,22 +117,42 @@ def select_action(state, policy_net, steps_done):
     else:
         return torch.tensor([[random.randrange(output_dim)]], device=device, dtype=torch.long)
 
-# Main training loop
+# Full training state is saved in the background every CHECKPOINT_INTERVAL episodes. With RESUME, training continues
+# from the latest checkpoint if it was saved with the same config
+checkpointer = Checkpointer(f"{hyperparameter.CHECKPOINT_DIR}/train_with_strategy",
+                            keep_last=hyperparameter.CHECKPOINT_KEEP)
 steps_done = 0
-for episode in trange(NUM_EPISODES):
-    observations, _ = env.reset()  # Reset environment at the start of an episode
+start_episode = 0
+config = {"game_type": env.game_modes.game_type, "max_rounds": MAX_ROUNDS_PER_EPISODE,
+          "encoding": hyperparameter.OBSERVATION_ENCODING, "window": hyperparameter.OBSERVATION_WINDOW,
+          "hidden_sizes": list(hidden_sizes), "replay_memory_size": REPLAY_MEMORY_SIZE}
+counters = resume_training(checkpointer, hyperparameter.RESUME, config, learner, [memory1, memory2], NUM_EPISODES,
+                           env=env, overwrite=hyperparameter.CHECKPOINT_OVERWRITE)
+if counters is not None:
+    steps_done, start_episode = counters["steps_done"], counters["episode"]
+    env.episode_counter = counters["episode_counter"]
+
+# Main training loop
+progress = trange(start_episode, NUM_EPISODES, initial=start_episode, total=NUM_EPISODES)
+for episode in progress:
+    with timer.section("env_reset"):
+        observations, _ = env.reset()  # Reset environment at the start of an episode
     observation_agent1, observation_agent2 = observations
 
     # Episode loop
     strategy_agent2 = StrategyFactory.create_strategy(env, strategy_type="sample_from_dict")
     for _ in range(MAX_ROUNDS_PER_EPISODE + 1):
         # Convert observations to tensors
-        state_agent1 = torch.tensor(observation_agent1, device=device, dtype=torch.float32).unsqueeze(0)
-        state_agent2 = torch.tensor(observation_agent2, device=device, dtype=torch.float32).unsqueeze(0)
+        with timer.section("to_tensor"):
+            state_agent1 = torch.from_numpy(observation_agent1).to(device).unsqueeze(0)
+            state_agent2 = torch.from_numpy(observation_agent2).to(device).unsqueeze(0)
 
         # Select actions for both agents
-        action_agent1 = select_action(state_agent1, policy_net1, steps_done)
-        action_agent2 = torch.tensor(strategy_agent2.select_action(observation_agent2, model=policy_net2), device=device, dtype=torch.long).unsqueeze(0).unsqueeze(0)
+        with timer.section("select_action"):
+            action_agent1 = select_action(state_agent1, policy_net1, steps_done)
+        with timer.section("strategy"):
+            action_agent2 = torch.tensor(strategy_agent2.select_action(observation_agent2, model=policy_net2),
+                                         device=device, dtype=torch.long).unsqueeze(0).unsqueeze(0)
         steps_done += 1
 
         # print for a sanity check
@@ -145,63 +170,27 @@ for episode in trange(NUM_EPISODES):
 
 
         # Take a step in the environment using selected actions
-        observations, (reward_agent1, reward_agent2), terminated, _, _ = env.step(action_agent1.item(),
-                                                                                  action_agent2.item())
+        with timer.section("env_step"):
+            observations, (reward_agent1, reward_agent2), terminated, _, _ = env.step(action_agent1.item(),
+                                                                                      action_agent2.item())
         next_observation_agent1, next_observation_agent2 = observations
 
         # Store transitions into the replay memories
-        next_state_agent1 = torch.tensor(next_observation_agent1, device=device, dtype=torch.float32).unsqueeze(0)
-        next_state_agent2 = torch.tensor(next_observation_agent2, device=device, dtype=torch.float32).unsqueeze(0)
+        with timer.section("to_tensor"):
+            next_state_agent1 = torch.from_numpy(next_observation_agent1).to(device).unsqueeze(0)
+            next_state_agent2 = torch.from_numpy(next_observation_agent2).to(device).unsqueeze(0)
 
         # # print, for a sanity check
         # print(f"round: {env.current_round}")
         # print(f"observation_agent1: {observation_agent1}")
         # print(f"observation_agent2: {observation_agent2}")
 
-        memory1.push(state_agent1, action_agent1, next_state_agent1, torch.tensor([reward_agent1], device=device))
-        memory2.push(state_agent2, action_agent2, next_state_agent2, torch.tensor([reward_agent2], device=device))
-
-        # Optimization function for the Deep Q-learning algorithm
-        def optimize_model(policy_net, target_net, memory, optimizer):
-            # Make sure enough experiences have been stored before learning begins
-            if len(memory) < BATCH_SIZE:
-                return
-
-            # Sample experiences from memory
-            transitions = memory.sample(BATCH_SIZE)
-            batch = memory1.Transition(*zip(*transitions))
-
-            # Identify states that are not the final state of an episode
-            non_final_mask = torch.tensor(tuple(map(lambda s: s is not None, batch.next_state)), device=device,
-                                          dtype=torch.bool)
-            non_final_next_states = torch.cat([s for s in batch.next_state if s is not None])
-            state_batch = torch.cat(batch.state)
-            action_batch = torch.cat(batch.action)
-            reward_batch = torch.cat(batch.reward)
-
-            # Compute the current Q-values
-            state_action_values = policy_net(state_batch).gather(1, action_batch)
+        with timer.section("replay_push"):
+            memory1.push(state_agent1, action_agent1.item(), next_state_agent1, reward_agent1, terminated)
+            memory2.push(state_agent2, action_agent2.item(), next_state_agent2, reward_agent2, terminated)
 
-            # Compute the expected Q-values
-            next_state_values = torch.zeros(BATCH_SIZE, device=device)
-            next_state_values[non_final_mask] = target_net(non_final_next_states).max(1)[0].detach()
-            expected_state_action_values = (next_state_values * GAMMA) + reward_batch
-
-            # Compute the Huber Loss between current and expected Q-values
-            loss = F.smooth_l1_loss(state_action_values, expected_state_action_values.unsqueeze(1))
-
-            # Optimize the policy network
-            optimizer.zero_grad()
-            loss.backward()
-
-            # Gradient clipping to avoid exploding gradients
-            for param in policy_net.parameters():
-                param.grad.data.clamp_(-1, 1)
-            optimizer.step()
-
-        # Perform optimization steps for both agents
-        optimize_model(policy_net1, target_net1, memory1, optimizer1)
-        optimize_model(policy_net2, target_net2, memory2, optimizer2)
+        # Perform one fused optimization step for both agents, timed by the learner
+        learner.optimize_model()
 
         # Update current observation for the next loop iteration
         observation_agent1, observation_agent2 = next_observation_agent1, next_observation_agent2
@@ -209,20 +198,28 @@ for episode in trange(NUM_EPISODES):
         # Every TARGET_UPDATE episodes, update the weights of the target networks
         # This is done to stabilize the learning process. The target network provides a stable target for the primary network to learn.
         if episode % TARGET_UPDATE == 0:
-            target_net1.load_state_dict(policy_net1.state_dict())
-            target_net2.load_state_dict(policy_net2.state_dict())
+            learner.update_target()
 
         # Every SELF_PLAY_UPDATE episodes, synchronize the policy of agent 2 with that of agent 1.
         # This allows the two agents to constantly adapt to each other's strategies in a self-play setting.
         if episode % SELF_PLAY_UPDATE == 0:
-            policy_net2.load_state_dict(policy_net1.state_dict())
+            learner.sync_agents(0, 1)
 
         # Check if the episode has terminated
         if terminated:
             env.episode_counter += 1  # Increment the episode counter
             break
 
+    # Every CHECKPOINT_INTERVAL episodes, hand the training state to the checkpoint writer thread
+    if (episode + 1) % CHECKPOINT_INTERVAL == 0:
+        with timer.section("checkpoint"):
+            checkpointer.save(episode + 1, training_state(learner, [memory1, memory2], config, env, episode=episode + 1,
+                                                          steps_done=steps_done, episode_counter=env.episode_counter))
+    timer.tick(episode, env.current_round, progress)
+checkpointer.close()
+timer.close()
+
 # Save the trained models
-torch.save(policy_net1.state_dict(), f"{env.game_modes.game_type}_agent1.pth")
-torch.save(policy_net2.state_dict(), f"{env.game_modes.game_type}_agent2.pth")
+torch.save(learner.agent_state_dict(0), f"{env.game_modes.game_type}_agent1.pth")
+torch.save(learner.agent_state_dict(1), f"{env.game_modes.game_type}_agent2.pth")
 print("Training complete, models saved.")
\ No newline at end of file
@@ -1,4 +1,4 @@
-import copy
+import bisect
 import logging
 
 import gymnasium
@@ -7,7 +7,7 @@ from gymnasium import spaces
 from gymnasium.utils import seeding
 
 from typing import Union
-from PIL import Image, ImageDraw
+from PIL import Image, ImageColor, ImageDraw
 
 # from utils.action_space import MultiAgentActionSpace
 # from utils.draw import draw_grid, fill_cell, draw_border
@@ -130,6 +130,89 @@ def draw_score_board(image, score, board_height=30):
     ImageDraw.Draw(new_im).text((10, board_height // 3), text=_text, fill='black')
     return new_im
 
+class GridRasterizer:
+    """Draws grid frames with array slicing into a preallocated uint8 RGB buffer.
+
+    A frame is given as a (rows, cols) array of palette indices, index 0 being the background. Every cell is a
+    cell_size x cell_size block of pixels inside a border of border_width pixels. Only the cells whose index differs
+    from the previous frame are repainted, so a frame costs one comparison of the small index grid plus a write per
+    changed cell, and no image library is needed.
+
+    Args:
+        grid_shape (tuple): (rows, cols) of the grid
+        cell_size (int): Width and height of a cell in pixels
+        palette (list): Colors of the palette indices, names or RGB tuples, the first is the background
+        border_width (int): Width of the border around the grid in pixels
+        border_color (str): Color of the border
+    """
+    def __init__(self, grid_shape, cell_size, palette, border_width=0, border_color='gray'):
+        rows, cols = grid_shape
+        self.palette = np.array([ImageColor.getrgb(color) if isinstance(color, str) else color for color in palette],
+                                dtype=np.uint8)
+        self.frame = np.empty((rows * cell_size + 2 * border_width, cols * cell_size + 2 * border_width, 3),
+                              dtype=np.uint8)
+        self.frame[:] = ImageColor.getrgb(border_color)
+        grid = self.frame[border_width:border_width + rows * cell_size, border_width:border_width + cols * cell_size]
+        grid[:] = self.palette[0]
+
+        # (row, y, col, x, channel) view of the grid pixels, cell (row, col) is cells_view[row, :, col]
+        self._cells_view = grid.reshape(rows, cell_size, cols, cell_size, 3)
+        assert np.shares_memory(self._cells_view, self.frame)
+        self._cells = np.zeros(grid_shape, dtype=np.int64)
+
+    def draw(self, cells):
+        """Paint the frame of cells, a (rows, cols) array of palette indices.
+
+        Returns:
+            The (height, width, 3) frame buffer, overwritten by the next draw, copy it to keep it
+        """
+        changed_rows, changed_cols = np.nonzero(cells != self._cells)
+        if len(changed_rows):
+            colors = cells[changed_rows, changed_cols]
+            self._cells_view[changed_rows, :, changed_cols] = self.palette[colors][:, None, None]
+            self._cells[changed_rows, changed_cols] = colors
+        return self.frame
+
+
+class PygameViewer:
+    """Window showing rgb_array frames, pygame is only imported when the first frame is shown
+
+    Args:
+        caption (str): Window title
+        scale (int): Every frame pixel is shown as scale x scale screen pixels
+    """
+    def __init__(self, caption='', scale=3):
+        self.caption = caption
+        self.scale = scale
+        self.isopen = True
+        self._pygame = None
+        self._screen = None
+
+    def imshow(self, frame):
+        if not self.isopen:
+            return
+        if self._pygame is None:
+            import pygame
+            self._pygame = pygame
+            pygame.init()
+            pygame.display.set_caption(self.caption)
+            self._screen = pygame.display.set_mode((frame.shape[1] * self.scale, frame.shape[0] * self.scale))
+
+        pygame = self._pygame
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.close()
+                return
+        surface = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
+        pygame.transform.scale(surface, self._screen.get_size(), self._screen)
+        pygame.display.flip()
+
+    def close(self):
+        if self._pygame is not None and self.isopen:
+            self._pygame.display.quit()
+        self.isopen = False
+
+
 class MultiAgentObservationSpace(gymnasium.spaces.Space):
     def __init__(self, agents_observation_space):
         super().__init__()
@@ -172,12 +255,22 @@ class MultiAgentActionSpace(gymnasium.spaces.Space):
 logger = logging.getLogger(__name__)
 
 class PongDuel(gymnasium.Env):
-    """Two Player Pong Game - Competitive"""
+    """Two Player Pong Game - Competitive
+
+    The state is kept in plain integers: the paddle rows, the ball position, an index into BALL_DIRECTIONS and the
+    grid codes of both paddle columns, the only grid cells the rules read, in which paddle cells hold
+    GRID_PADDLE_CODES (agent id and offset from the paddle center). Paddle bounces draw from the precomputed
+    GRID_BOUNCE_CDFS. A step touches Python ints and lists only, NumPy scalar indexing costs more than the rules
+    themselves. Observations are written into preallocated (n_agents, 10) float32 buffers through memoryviews, with
+    the normalized positions looked up in tables, and are double-buffered: an observation stays valid until the step
+    after the next one, copy it to keep it longer. The reward lists are shared between steps as well, do not modify
+    them. VecPongDuel plays many games at once.
+    """
 
     metadata = {'render_modes': ['human', 'rgb_array'],
                 'render_fps': 30}
 
-    def __init__(self, step_cost=0, reward=1, max_rounds=10):
+    def __init__(self, step_cost=0, reward=1, max_rounds=10, render_mode=None):
         self._grid_shape = (40, 30)
         self.n_agents = 2
         self.reward = reward
@@ -188,20 +281,58 @@ class PongDuel(gymnasium.Env):
         self._steps_beyond_done = None
         self._step_cost = step_cost
         self._total_episode_reward = None
-        self.agent_pos = {_: None for _ in range(self.n_agents)}
         self._agent_dones = None
-        self.ball_pos = None
-        self.__rounds = None
+        self._rounds = None
+
+        # Paddle rows (the columns never change), ball row and column and direction index, set by reset
+        self._agent_cols = (1, self._grid_shape[1] - 2)
+        self._agent_rows = [0] * self.n_agents
+        self._ball_row = 0
+        self._ball_col = 0
+        self._ball_dir = 0
+        self._paddle_cells = [[GRID_EMPTY] * self._grid_shape[0] for _ in range(self.n_agents)]
+
+        # Rewards of a step without a point and of a point of agent 0 and agent 1 (indexed by ball_col < 1), returned
+        # by step and never modified
+        self._step_rewards = [step_cost] * self.n_agents
+        self._point_rewards = ([reward, 0], [0, reward])
 
         # agent pos(2), ball pos (2), balldir (6-onehot)
         self._obs_low = np.array([0., 0., 0., 0.] + [0.] * len(BALL_DIRECTIONS), dtype=np.float32)
         self._obs_high = np.array([1., 1., 1., 1.] + [1.] * len(BALL_DIRECTIONS), dtype=np.float32)
         self.observation_space = MultiAgentObservationSpace([spaces.Box(self._obs_low, self._obs_high)for _ in range(self.n_agents)])
 
-        self.curr_ball_dir = None
+        # (slot, agent, feature) observation buffers, and the direction whose one-hot bit is set in each slot
+        self._obs_buffers = np.zeros((2, self.n_agents, len(self._obs_low)), dtype=np.float32)
+        for agent_i, col in enumerate(self._agent_cols):
+            self._obs_buffers[:, agent_i, 1] = col / self._grid_shape[1]
+        self._obs_dirs = [0, 0]
+        self._obs_buffers[:, :, 4] = 1
+        self._obs_slot = 0
+        self._obs_slots = (self._obs_buffers[0], self._obs_buffers[1])
+        # Flat memoryviews of the buffers, a scalar write through them costs a fraction of one through NumPy
+        self._obs_flats = (memoryview(self._obs_buffers[0].reshape(-1)), memoryview(self._obs_buffers[1].reshape(-1)))
+        self._row_values = [row / self._grid_shape[0] for row in range(self._grid_shape[0])]
+        self._col_values = [col / self._grid_shape[1] for col in range(self._grid_shape[1])]
+
+        self.render_mode = render_mode
+        self._rasterizer = None
+        self._frame_cells = None
         self.viewer = None
         self.seed()
 
+    @property
+    def agent_pos(self):
+        return np.array([[row, col] for row, col in zip(self._agent_rows, self._agent_cols)])
+
+    @property
+    def ball_pos(self):
+        return np.array([self._ball_row, self._ball_col])
+
+    @property
+    def curr_ball_dir(self):
+        return BALL_DIRECTIONS[self._ball_dir]
+
     def get_action_meanings(self, agent_i=None):
         if agent_i is not None:
             assert agent_i <= self.n_agents
@@ -209,67 +340,51 @@ class PongDuel(gymnasium.Env):
         else:
             return [[ACTION_MEANING[i] for i in range(ac.n)] for ac in self.action_space]
 
-    def __create_grid(self):
-        _grid = [[PRE_IDS['empty'] for _ in range(self._grid_shape[1])] for row in range(self._grid_shape[0])]
-        return _grid
-
-    def __update_agent_view(self, agent_i):
-        for row in range(self.agent_prev_pos[agent_i][0] - PADDLE_SIZE,
-                         self.agent_prev_pos[agent_i][0] + PADDLE_SIZE + 1):
-            self._full_obs[row][self.agent_prev_pos[agent_i][1]] = PRE_IDS['empty']
-
-        for row in range(self.agent_pos[agent_i][0] - PADDLE_SIZE, self.agent_pos[agent_i][0] + PADDLE_SIZE + 1):
-            self._full_obs[row][self.agent_pos[agent_i][1]] = PRE_IDS['agent'] + str(agent_i + 1) \
-                                                              + '_' + str(row - self.agent_pos[agent_i][0])
-
-    def __update_ball_view(self):
-        self._full_obs[self.ball_pos[0]][self.ball_pos[1]] = PRE_IDS['ball']
-
-    def __draw_base_img(self):
-        self._base_img = draw_grid(self._grid_shape[0], self._grid_shape[1],
-                                   cell_size=CELL_SIZE, fill='white', line_color='white')
+    def __draw_agent(self, agent_i):
+        row = self._agent_rows[agent_i]
+        self._paddle_cells[agent_i][row - PADDLE_SIZE:row + PADDLE_SIZE + 1] = PADDLE_CODE_LISTS[agent_i]
 
     def __init_full_obs(self):
-        self._full_obs = self.__create_grid()
         for agent_i in range(self.n_agents):
-            self.__update_agent_view(agent_i)
-
-        self.__update_ball_view()
-
-        self.__draw_base_img()
+            self._paddle_cells[agent_i][:] = [GRID_EMPTY] * self._grid_shape[0]
+            self.__draw_agent(agent_i)
 
     def get_agent_obs(self):
-        _obs = []
-
+        # Flat (n_agents * 10,) view of the next buffer, agent 1's features start at OBS_SIZE
+        self._obs_slot = slot = 1 - self._obs_slot
+        obs = self._obs_flats[slot]
+        row_values = self._row_values
+        obs[0] = row_values[self._agent_rows[0]]
+        obs[OBS_SIZE] = row_values[self._agent_rows[1]]
+        obs[2] = obs[OBS_SIZE + 2] = row_values[self._ball_row]
+        obs[3] = obs[OBS_SIZE + 3] = self._col_values[self._ball_col]
+
+        # one hot ball dir encoding, only the bits that changed since this slot was last written
+        ball_dir = self._ball_dir
+        prev_dir = self._obs_dirs[slot]
+        if prev_dir != ball_dir:
+            obs[4 + prev_dir] = obs[OBS_SIZE + 4 + prev_dir] = 0
+            obs[4 + ball_dir] = obs[OBS_SIZE + 4 + ball_dir] = 1
+            self._obs_dirs[slot] = ball_dir
+        return self._obs_slots[slot]
+
+    def __init_paddles(self):
         for agent_i in range(self.n_agents):
-            pos = self.agent_pos[agent_i]
-            _agent_i_obs = [pos[0] / self._grid_shape[0], pos[1] / self._grid_shape[1]]
-
-            pos = self.ball_pos
-            _agent_i_obs += [pos[0] / self._grid_shape[0], pos[1] / self._grid_shape[1]]
-
-            _ball_dir = [0 for _ in range(len(BALL_DIRECTIONS))]
-            _ball_dir[BALL_DIRECTIONS.index(self.curr_ball_dir)] = 1
-
-            _agent_i_obs += _ball_dir  # one hot ball dir encoding
-
-            _obs.append(_agent_i_obs)
-
-        return _obs
+            self._agent_rows[agent_i] = int(self.np_random.integers(PADDLE_SIZE,
+                                                                    self._grid_shape[0] - PADDLE_SIZE - 1))
 
     def __init_ball_pos(self):
-        self.ball_pos = [self.np_random.integers(5, self._grid_shape[0] - 5), self.np_random.integers(10, self._grid_shape[1] - 10)]
-        self.curr_ball_dir = self.np_random.choice(['NW', 'SW', 'SE', 'NE'])
+        self._ball_row = int(self.np_random.integers(5, self._grid_shape[0] - 5))
+        self._ball_col = int(self.np_random.integers(10, self._grid_shape[1] - 10))
+        # Same draw as np_random.choice(len(BALL_START_DIRECTIONS)), without its argument handling
+        self._ball_dir = BALL_START_DIRECTIONS[self.np_random.integers(len(BALL_START_DIRECTIONS))]
 
     def reset(self, seed=None, options=None):
         if seed is not None:
             np.random.seed(seed)
 
-        self.__rounds = 0
-        self.agent_pos[0] = (self.np_random.integers(PADDLE_SIZE, self._grid_shape[0] - PADDLE_SIZE - 1), 1)
-        self.agent_pos[1] = (self.np_random.integers(PADDLE_SIZE, self._grid_shape[0] - PADDLE_SIZE - 1),
-                             self._grid_shape[1] - 2)
-        self.agent_prev_pos = {_: self.agent_pos[_] for _ in range(self.n_agents)}
+        self._rounds = 0
+        self.__init_paddles()
         self.__init_ball_pos()
         self._agent_dones = [False, False]
         self.__init_full_obs()
@@ -281,114 +396,103 @@ class PongDuel(gymnasium.Env):
 
     @property
     def __ball_cells(self):
-        if self.curr_ball_dir == 'E':
-            return [self.ball_pos, [self.ball_pos[0], self.ball_pos[1] - 1], [self.ball_pos[0], self.ball_pos[1] - 2]]
-        if self.curr_ball_dir == 'W':
-            return [self.ball_pos, [self.ball_pos[0], self.ball_pos[1] + 1], [self.ball_pos[0], self.ball_pos[1] + 2]]
-        if self.curr_ball_dir == 'NE':
-            return [self.ball_pos, [self.ball_pos[0] + 1, self.ball_pos[1] - 1],
-                    [self.ball_pos[0] + 2, self.ball_pos[1] - 2]]
-        if self.curr_ball_dir == 'NW':
-            return [self.ball_pos, [self.ball_pos[0] + 1, self.ball_pos[1] + 1],
-                    [self.ball_pos[0] + 2, self.ball_pos[1] + 2]]
-        if self.curr_ball_dir == 'SE':
-            return [self.ball_pos, [self.ball_pos[0] - 1, self.ball_pos[1] - 1],
-                    [self.ball_pos[0] - 2, self.ball_pos[1] - 2]]
-        if self.curr_ball_dir == 'SW':
-            return [self.ball_pos, [self.ball_pos[0] - 1, self.ball_pos[1] + 1],
-                    [self.ball_pos[0] - 2, self.ball_pos[1] + 2]]
-
-    def render(self, mode='human'):
+        # The ball and its two-cell tail, pointing away from the direction of travel
+        d_row, d_col = BALL_MOVES[self._ball_dir]
+        return [[self._ball_row - i * d_row, self._ball_col - i * d_col] for i in range(3)]
+
+    def render(self, mode=None):
         assert (self._step_count is not None), \
             "Call reset before using render method."
 
-        img = copy.copy(self._base_img)
-        for agent_i in range(self.n_agents):
-            for row in range(self.agent_pos[agent_i][0] - 2, self.agent_pos[agent_i][0] + 3):
-                fill_cell(img, (row, self.agent_pos[agent_i][1]), cell_size=CELL_SIZE, fill=AGENT_COLORS[agent_i])
-
-        ball_cells = self.__ball_cells
-        fill_cell(img, ball_cells[0], cell_size=CELL_SIZE, fill=BALL_HEAD_COLOR)
-        fill_cell(img, ball_cells[1], cell_size=CELL_SIZE, fill=BALL_TAIL_COLOR)
-        fill_cell(img, ball_cells[2], cell_size=CELL_SIZE, fill=BALL_TAIL_COLOR)
+        mode = mode or self.render_mode or 'human'
+        if self._rasterizer is None:
+            self._rasterizer = GridRasterizer(self._grid_shape, CELL_SIZE, RENDER_PALETTE, border_width=2,
+                                              border_color='gray')
+            self._frame_cells = np.zeros(self._grid_shape, dtype=np.int8)
 
-        img = draw_border(img, border_width=2, fill='gray')
+        # Palette index per cell, drawn in the same order as the colors overlap: paddles, ball head, ball tail
+        cells = self._frame_cells
+        cells.fill(0)
+        for agent_i in range(self.n_agents):
+            row = self._agent_rows[agent_i]
+            cells[row - PADDLE_SIZE:row + PADDLE_SIZE + 1, self._agent_cols[agent_i]] = RENDER_AGENT_INDICES[agent_i]
+        for i, (row, col) in enumerate(self.__ball_cells):
+            if 0 <= row < self._grid_shape[0] and 0 <= col < self._grid_shape[1]:
+                cells[row, col] = RENDER_BALL_HEAD_INDEX if i == 0 else RENDER_BALL_TAIL_INDEX
+        img = self._rasterizer.draw(cells)
 
-        img = np.asarray(img)
         if mode == 'rgb_array':
-            return img
+            return img.copy()
         elif mode == 'human':
-            from gym.envs.classic_control import rendering
             if self.viewer is None:
-                self.viewer = rendering.SimpleImageViewer()
+                self.viewer = PygameViewer(caption='PongDuel')
             self.viewer.imshow(img)
             return self.viewer.isopen
 
-    def __update_agent_pos(self, agent_i, move):
+    def close(self):
+        if self.viewer is not None:
+            self.viewer.close()
+            self.viewer = None
+
+    def init_kwargs(self):
+        """Constructor arguments except render_mode, to recreate the environment when replaying a recording"""
+        return {'step_cost': self._step_cost, 'reward': self.reward, 'max_rounds': self._max_rounds}
 
-        curr_pos = copy.copy(self.agent_pos[agent_i])
-        if move == 0:  # noop
-            next_pos = None
-        elif move == 1:  # up
-            next_pos = [curr_pos[0] - 1, curr_pos[1]]
+    def snapshot(self):
+        """Paddle rows, ball row, column and direction index, the state render() draws, see recorder.py"""
+        return np.array(self._agent_rows + [self._ball_row, self._ball_col, self._ball_dir], dtype=np.int16)
+
+    def episode_snapshot(self):
+        return {}
+
+    def load_snapshot(self, episode, snapshot):
+        """Set the state render() draws from a snapshot, to replay a recording"""
+        self._agent_rows = [int(row) for row in snapshot[:self.n_agents]]
+        self._ball_row, self._ball_col, self._ball_dir = (int(value) for value in snapshot[self.n_agents:])
+        if self._step_count is None:
+            self._step_count = 0
+
+    def __update_agent_pos(self, agent_i, move):
+        # Called for moves other than noop only
+        if move == 1:  # up
+            step = -1
         elif move == 2:  # down
-            next_pos = [curr_pos[0] + 1, curr_pos[1]]
+            step = 1
         else:
             raise Exception('Action Not found!')
 
-        if next_pos is not None and PADDLE_SIZE <= next_pos[0] <= (self._grid_shape[0] - PADDLE_SIZE - 1):
-            self.agent_prev_pos[agent_i] = self.agent_pos[agent_i]
-            self.agent_pos[agent_i] = next_pos
-            self.__update_agent_view(agent_i)
+        row = self._agent_rows[agent_i] + step
+        if PADDLE_SIZE <= row <= (self._grid_shape[0] - PADDLE_SIZE - 1):
+            # Same cells as clearing the old paddle and drawing the new one: only the trailing cell is left empty
+            self._agent_rows[agent_i] = row
+            cells = self._paddle_cells[agent_i]
+            cells[row - PADDLE_SIZE:row + PADDLE_SIZE + 1] = PADDLE_CODE_LISTS[agent_i]
+            cells[row - step * (PADDLE_SIZE + 1)] = GRID_EMPTY
 
     def __update_ball_pos(self):
-
-        if self.ball_pos[0] <= 1:
-            self.curr_ball_dir = 'SE' if self.curr_ball_dir == 'NE' else 'SW'
-        elif self.ball_pos[0] >= (self._grid_shape[0] - 2):
-            self.curr_ball_dir = 'NE' if self.curr_ball_dir == 'SE' else 'NW'
-        elif PRE_IDS['agent'] in self._full_obs[self.ball_pos[0]][self.ball_pos[1] + 1]:
-            edge = int(self._full_obs[self.ball_pos[0]][self.ball_pos[1] + 1].split('_')[1])
-            _dir = ['NW', 'W', 'SW']
-            if edge <= 0:
-                _p = [0.25 + ((1 - 0.25) / PADDLE_SIZE * (abs(edge))),
-                      0.5 - (0.5 / PADDLE_SIZE * (abs(edge))),
-                      0.25 - (0.25 / PADDLE_SIZE * (abs(edge))), ]
-            elif edge >= 0:
-                _p = [0.25 - (0.25 / PADDLE_SIZE * (abs(edge))),
-                      0.5 - (0.5 / PADDLE_SIZE * (abs(edge))),
-                      0.25 + ((1 - 0.25) / PADDLE_SIZE * (abs(edge)))]
-            _p[len(_dir) // 2] += 1 - sum(_p)
-
-            self.curr_ball_dir = self.np_random.choice(_dir, p=_p)
-        elif PRE_IDS['agent'] in self._full_obs[self.ball_pos[0]][self.ball_pos[1] - 1]:
-            _dir = ['NE', 'E', 'SE']
-            edge = int(self._full_obs[self.ball_pos[0]][self.ball_pos[1] - 1].split('_')[1])
-            if edge <= 0:
-                _p = [0.25 + ((1 - 0.25) / PADDLE_SIZE * (abs(edge))),
-                      0.5 - (0.5 / PADDLE_SIZE * (abs(edge))),
-                      0.25 - (0.25 / PADDLE_SIZE * (abs(edge))), ]
-            elif edge >= 0:
-                _p = [0.25 - (0.25 / PADDLE_SIZE * (abs(edge))),
-                      0.5 - (0.5 / PADDLE_SIZE * (abs(edge))),
-                      0.25 + ((1 - 0.25) / PADDLE_SIZE * (abs(edge)))]
-            _p[len(_dir) // 2] += 1 - sum(_p)
-            self.curr_ball_dir = self.np_random.choice(_dir, p=_p)
-
-        if self.curr_ball_dir == 'E':
-            new_ball_pos = self.ball_pos[0], self.ball_pos[1] + 1
-        elif self.curr_ball_dir == 'W':
-            new_ball_pos = self.ball_pos[0], self.ball_pos[1] - 1
-        elif self.curr_ball_dir == 'NE':
-            new_ball_pos = self.ball_pos[0] - 1, self.ball_pos[1] + 1
-        elif self.curr_ball_dir == 'NW':
-            new_ball_pos = self.ball_pos[0] - 1, self.ball_pos[1] - 1
-        elif self.curr_ball_dir == 'SE':
-            new_ball_pos = self.ball_pos[0] + 1, self.ball_pos[1] + 1
-        elif self.curr_ball_dir == 'SW':
-            new_ball_pos = self.ball_pos[0] + 1, self.ball_pos[1] - 1
-
-        self.ball_pos = new_ball_pos
+        row, col, ball_dir = self._ball_row, self._ball_col, self._ball_dir
+        if row <= 1:
+            ball_dir = TOP_WALL_BOUNCE[ball_dir]
+        elif row >= (self._grid_shape[0] - 2):
+            ball_dir = BOTTOM_WALL_BOUNCE[ball_dir]
+        elif col + 1 == self._agent_cols[1]:
+            # Only the paddle columns hold codes > 0, so only a ball next to one can bounce off a paddle
+            code = self._paddle_cells[1][row]
+            if code > 0:
+                ball_dir = PADDLE_BOUNCE_EAST[self.__sample_bounce(code)]
+        elif col - 1 == self._agent_cols[0]:
+            code = self._paddle_cells[0][row]
+            if code > 0:
+                ball_dir = PADDLE_BOUNCE_WEST[self.__sample_bounce(code)]
+
+        d_row, d_col = BALL_MOVES[ball_dir]
+        self._ball_dir = ball_dir
+        self._ball_row = row + d_row
+        self._ball_col = col + d_col
+
+    def __sample_bounce(self, code):
+        # Same draw as np_random.choice(3, p=bounce_probabilities(edge)), one uniform sample per bounce
+        return bisect.bisect_right(GRID_BOUNCE_CDF_LISTS[code], self.np_random.random())
 
     def seed(self, n=None):
         self.np_random, seed = seeding.np_random(n)
@@ -400,36 +504,39 @@ class PongDuel(gymnasium.Env):
 
         assert len(action_n) == self.n_agents
         self._step_count += 1
-        rewards = [self._step_cost for _ in range(self.n_agents)]
 
         # if ball is beyond paddle, initiate a new round
-        if self.ball_pos[1] < 1:
-            rewards = [0, self.reward]
-            self.__rounds += 1
-        elif self.ball_pos[1] >= (self._grid_shape[1] - 1):
-            rewards = [self.reward, 0]
-            self.__rounds += 1
-
-        if self.__rounds == self._max_rounds:
-            self._agent_dones = [True for _ in range(self.n_agents)]
+        ball_col = self._ball_col
+        ball_out = not 1 <= ball_col < self._grid_shape[1] - 1
+        if ball_out:
+            rewards = self._point_rewards[ball_col < 1]
+            self._rounds += 1
         else:
-            for agent_i in range(self.n_agents):
-                self.__update_agent_pos(agent_i, action_n[agent_i])
-
-            if (self.ball_pos[1] < 1) or (self.ball_pos[1] >= self._grid_shape[1] - 1):
-                self.agent_pos[0] = (self.np_random.integers(PADDLE_SIZE, self._grid_shape[0] - PADDLE_SIZE - 1), 1)
-                self.agent_pos[1] = (
-                self.np_random.integers(PADDLE_SIZE, self._grid_shape[0] - PADDLE_SIZE - 1), self._grid_shape[1] - 2)
-                self.agent_prev_pos = {_: self.agent_pos[_] for _ in range(self.n_agents)}
+            rewards = self._step_rewards
+
+        if self._rounds == self._max_rounds:
+            self._agent_dones = [True] * self.n_agents
+        else:
+            move_0, move_1 = action_n
+            if move_0:
+                self.__update_agent_pos(0, move_0)
+            if move_1:
+                self.__update_agent_pos(1, move_1)
+
+            if ball_out:
+                # The paddle cells stay where they were, only the next move draws them at the new rows
+                self.__init_paddles()
                 self.__init_ball_pos()
             else:
                 self.__update_ball_pos()
 
-        for i in range(self.n_agents):
-            self._total_episode_reward[i] += rewards[i]
+        if ball_out or self._step_cost:
+            total_episode_reward = self._total_episode_reward
+            total_episode_reward[0] += rewards[0]
+            total_episode_reward[1] += rewards[1]
 
         # Check for episode overflow
-        if all(self._agent_dones):
+        if self._agent_dones[0]:
             if self._steps_beyond_done is None:
                 self._steps_beyond_done = 0
             else:
@@ -443,7 +550,215 @@ class PongDuel(gymnasium.Env):
                     )
                 self._steps_beyond_done += 1
 
-        return self.get_agent_obs(), rewards, self._agent_dones, False, {'rounds': self.__rounds}
+        return self.get_agent_obs(), rewards, self._agent_dones, False, {'rounds': self._rounds}
+
+
+class VecPongDuel:
+    """Plays num_envs independent PongDuel games in lockstep.
+
+    Every game's state lives in arrays with a leading game dimension: paddle rows (num_envs, n_agents), ball row,
+    column and BALL_DIRECTIONS index (num_envs,), round and step counters. One call to step() moves all paddles and
+    balls, bounces them off the walls, samples the stochastic paddle deflections and scores every game with a fixed
+    number of NumPy operations, so the cost per game shrinks with num_envs. The rules are those of PongDuel, including
+    that a new round leaves the previous paddle cells in place: _paddle_cells holds the grid codes of both paddle
+    columns, (num_envs, n_agents, rows). Finished games are reset within step().
+
+    Observations have the layout of PongDuel.get_agent_obs, (num_envs, n_agents, 10) float32, and are double-buffered
+    like PongDuel's: an observation stays valid until the step after the next one, copy it to keep it longer.
+
+    Args:
+        num_envs (int): Number of games played side by side
+        step_cost (float): Reward of both agents for a step without a point
+        reward (float): Reward for winning a round
+        max_rounds (int): Number of rounds per game
+        seed (int): Seed of the random number generator, None for a random seed
+    """
+    def __init__(self, num_envs, step_cost=0, reward=1, max_rounds=10, seed=None):
+        self._grid_shape = (40, 30)
+        self.n_agents = 2
+        self.num_envs = num_envs
+        self.reward = reward
+        self._step_cost = step_cost
+        self._max_rounds = max_rounds
+        self.action_space = MultiAgentActionSpace([spaces.Discrete(3) for _ in range(self.n_agents)])
+
+        # agent pos(2), ball pos (2), balldir (6-onehot)
+        self._obs_low = np.array([0., 0., 0., 0.] + [0.] * len(BALL_DIRECTIONS), dtype=np.float32)
+        self._obs_high = np.array([1., 1., 1., 1.] + [1.] * len(BALL_DIRECTIONS), dtype=np.float32)
+        self.observation_space = MultiAgentObservationSpace([spaces.Box(self._obs_low, self._obs_high)
+                                                             for _ in range(self.n_agents)])
+
+        self._agent_cols = (1, self._grid_shape[1] - 2)
+        self._agent_rows = np.zeros((num_envs, self.n_agents), dtype=np.int64)
+        self._ball_row = np.zeros(num_envs, dtype=np.int64)
+        self._ball_col = np.zeros(num_envs, dtype=np.int64)
+        self._ball_dir = np.zeros(num_envs, dtype=np.int64)
+        self._paddle_cells = np.zeros((num_envs, self.n_agents, self._grid_shape[0]), dtype=np.int8)
+        # Flat views, (game, agent) pairs are indexed by game * n_agents + agent
+        self._flat_agent_rows = self._agent_rows.reshape(-1)
+        self._flat_paddle_cells = self._paddle_cells.reshape(-1)
+        self._rounds = np.zeros(num_envs, dtype=np.int64)
+        self._step_count = None
+        self._total_episode_reward = np.zeros((num_envs, self.n_agents))
+        self._envs = np.arange(num_envs)
+
+        # (slot, game, agent, feature) observation buffers, the paddle columns never change, and the direction
+        # whose one-hot bits are set in each slot
+        self._obs_buffers = np.zeros((2, num_envs, self.n_agents, len(self._obs_low)), dtype=np.float32)
+        for agent_i, col in enumerate(self._agent_cols):
+            self._obs_buffers[:, :, agent_i, 1] = col / self._grid_shape[1]
+        self._obs_dirs = np.zeros((2, num_envs), dtype=np.int64)
+        self._obs_buffers[:, :, :, 4] = 1
+        self._obs_slot = 0
+
+        self.seed(seed)
+
+    def seed(self, n=None):
+        self.np_random, seed = seeding.np_random(n)
+        return [seed]
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.seed(seed)
+
+        self._step_count = np.zeros(self.num_envs, dtype=np.int64)
+        self.__reset_games(self._envs)
+        return self.get_agent_obs(), {}
+
+    def get_agent_obs(self, envs=None):
+        """(num_envs, n_agents, 10) observations, written into the next buffer unless envs are given, then only the
+        rows of those games are rewritten in the current buffer"""
+        if envs is None:
+            self._obs_slot = 1 - self._obs_slot
+            envs = slice(None)
+        obs = self._obs_buffers[self._obs_slot]
+        obs[envs, :, 0] = self._agent_rows[envs] / self._grid_shape[0]
+        obs[envs, :, 2] = (self._ball_row[envs] / self._grid_shape[0])[:, None]
+        obs[envs, :, 3] = (self._ball_col[envs] / self._grid_shape[1])[:, None]
+
+        # one hot ball dir encoding, only in the games whose direction changed since this slot was last written
+        obs_dirs = self._obs_dirs[self._obs_slot]
+        changed = np.flatnonzero(obs_dirs[envs] != self._ball_dir[envs])
+        if isinstance(envs, np.ndarray):
+            changed = envs[changed]
+        if len(changed):
+            flat_obs = obs.reshape(-1, obs.shape[-1])
+            pairs = (changed[:, None] * self.n_agents + np.arange(self.n_agents)).reshape(-1)
+            flat_obs[pairs, 4 + np.repeat(obs_dirs[changed], self.n_agents)] = 0
+            obs_dirs[changed] = self._ball_dir[changed]
+            flat_obs[pairs, 4 + np.repeat(obs_dirs[changed], self.n_agents)] = 1
+        return obs
+
+    def __draw_paddles(self, pairs):
+        # Paddle cells of the given flat (game, agent) pairs at their current rows
+        cells = (pairs * self._grid_shape[0] + self._flat_agent_rows[pairs])[:, None] + PADDLE_OFFSETS
+        self._flat_paddle_cells[cells] = GRID_PADDLE_CODES[pairs % self.n_agents]
+
+    def __init_round(self, envs):
+        self._agent_rows[envs] = self.np_random.integers(PADDLE_SIZE, self._grid_shape[0] - PADDLE_SIZE - 1,
+                                                         size=(len(envs), self.n_agents))
+        self._ball_row[envs] = self.np_random.integers(5, self._grid_shape[0] - 5, size=len(envs))
+        self._ball_col[envs] = self.np_random.integers(10, self._grid_shape[1] - 10, size=len(envs))
+        self._ball_dir[envs] = BALL_START_DIRECTION_ARRAY[self.np_random.integers(len(BALL_START_DIRECTIONS),
+                                                                                  size=len(envs))]
+
+    def __reset_games(self, envs):
+        self._rounds[envs] = 0
+        self._step_count[envs] = 0
+        self._total_episode_reward[envs] = 0
+        self.__init_round(envs)
+        self._paddle_cells[envs] = GRID_EMPTY
+        self.__draw_paddles((envs[:, None] * self.n_agents + np.arange(self.n_agents)).reshape(-1))
+
+    def __update_agent_pos(self, actions, active):
+        steps = PADDLE_MOVES[actions].reshape(-1)
+        rows = self._flat_agent_rows + steps
+        moved = ((steps != 0) & (rows >= PADDLE_SIZE) & (rows <= self._grid_shape[0] - PADDLE_SIZE - 1)
+                 & np.repeat(active, self.n_agents))
+        pairs = np.flatnonzero(moved)
+        if len(pairs) == 0:
+            return
+        rows = rows[pairs]
+        self._flat_agent_rows[pairs] = rows
+        # Same cells as clearing the old paddle and drawing the new one: only the trailing cell is left empty
+        self.__draw_paddles(pairs)
+        trailing = rows - steps[pairs] * (PADDLE_SIZE + 1)
+        self._flat_paddle_cells[pairs * self._grid_shape[0] + trailing] = GRID_EMPTY
+
+    def __update_ball_pos(self, moving):
+        row, col, ball_dir = self._ball_row, self._ball_col, self._ball_dir
+        top = row <= 1
+        bottom = row >= (self._grid_shape[0] - 2)
+        new_dir = np.where(top, TOP_WALL_BOUNCE_ARRAY[ball_dir],
+                           np.where(bottom, BOTTOM_WALL_BOUNCE_ARRAY[ball_dir], ball_dir))
+
+        # The only paddle cells next to a ball still in play are agent 1's east of column cols - 3 and agent 0's
+        # west of column 2
+        east = col == self._agent_cols[1] - 1
+        west = col == self._agent_cols[0] + 1
+        agents = east.astype(np.int64)
+        codes = self._flat_paddle_cells[(self._envs * self.n_agents + agents) * self._grid_shape[0] + row]
+        hits = np.flatnonzero(moving & ~top & ~bottom & (east | west) & (codes > 0))
+        if len(hits):
+            # Same distribution as PongDuel's per-ball draw, one uniform sample per bounce
+            uniform = self.np_random.random(len(hits))
+            bounces = (GRID_BOUNCE_CDFS[codes[hits]] <= uniform[:, None]).sum(axis=1)
+            new_dir[hits] = PADDLE_BOUNCE_ARRAY[agents[hits], bounces]
+
+        new_dir = np.where(moving, new_dir, ball_dir)
+        self._ball_dir = new_dir
+        self._ball_row = row + BALL_MOVE_ARRAY[new_dir, 0] * moving
+        self._ball_col = col + BALL_MOVE_ARRAY[new_dir, 1] * moving
+
+    def step(self, actions):
+        """Advance every game by one step, finished games start over.
+
+        Args:
+            actions (array-like): (num_envs, n_agents) actions, see ACTION_MEANING
+
+        Returns:
+            observations, (num_envs, n_agents) rewards, (num_envs, n_agents) dones, False and an info dict with the
+            'rounds' of every game. If games finished, the observations are the first of their new games and the
+            info also holds their 'final_observation' and 'episode_rewards', in the order of their indices.
+        """
+        assert (self._step_count is not None), \
+            "Call reset before using step method."
+
+        actions = np.asarray(actions, dtype=np.int64)
+        assert actions.shape == (self.num_envs, self.n_agents)
+        self._step_count += 1
+        rewards = np.full((self.num_envs, self.n_agents), self._step_cost, dtype=np.float32)
+
+        # if ball is beyond paddle, initiate a new round
+        out_west = self._ball_col < 1
+        out_east = self._ball_col >= (self._grid_shape[1] - 1)
+        rewards[out_west] = (0, self.reward)
+        rewards[out_east] = (self.reward, 0)
+        ball_out = out_west | out_east
+        self._rounds += ball_out
+
+        done = self._rounds == self._max_rounds
+        active = ~done
+        self.__update_agent_pos(actions, active)
+        self.__update_ball_pos(active & ~ball_out)
+        new_round = np.flatnonzero(active & ball_out)
+        if len(new_round):
+            # The paddle cells stay where they were, only the next move draws them at the new rows
+            self.__init_round(new_round)
+
+        self._total_episode_reward += rewards
+        info = {'rounds': self._rounds.copy()}
+        obs = self.get_agent_obs()
+        finished = np.flatnonzero(done)
+        if len(finished):
+            info['final_observation'] = obs[finished]
+            info['episode_rewards'] = self._total_episode_reward[finished]
+            self.__reset_games(finished)
+            obs = self.get_agent_obs(finished)
+
+        dones = np.repeat(done[:, None], self.n_agents, axis=1)
+        return obs, rewards, dones, False, info
+
 
 
 CELL_SIZE = 5
@@ -462,6 +777,12 @@ WALL_COLOR = 'black'
 BALL_HEAD_COLOR = 'orange'
 BALL_TAIL_COLOR = 'yellow'
 
+# GridRasterizer palette of render(), index 0 is the background
+RENDER_PALETTE = ['white', AGENT_COLORS[0], AGENT_COLORS[1], BALL_HEAD_COLOR, BALL_TAIL_COLOR]
+RENDER_AGENT_INDICES = (1, 2)
+RENDER_BALL_HEAD_INDEX = 3
+RENDER_BALL_TAIL_INDEX = 4
+
 # each pre-id should be unique and single char
 PRE_IDS = {
     'agent': 'A',
@@ -471,4 +792,55 @@ PRE_IDS = {
 }
 
 BALL_DIRECTIONS = ['NW', 'W', 'SW', 'SE', 'E', 'NE']
-PADDLE_SIZE = 2
\ No newline at end of file
+PADDLE_SIZE = 2
+
+def bounce_probabilities(edge):
+    """Probabilities of leaving a paddle up, straight or down after hitting it at offset edge from its center"""
+    if edge <= 0:
+        _p = [0.25 + ((1 - 0.25) / PADDLE_SIZE * (abs(edge))),
+              0.5 - (0.5 / PADDLE_SIZE * (abs(edge))),
+              0.25 - (0.25 / PADDLE_SIZE * (abs(edge))), ]
+    else:
+        _p = [0.25 - (0.25 / PADDLE_SIZE * (abs(edge))),
+              0.5 - (0.5 / PADDLE_SIZE * (abs(edge))),
+              0.25 + ((1 - 0.25) / PADDLE_SIZE * (abs(edge)))]
+    _p[1] += 1 - sum(_p)
+    return _p
+
+
+# (d_row, d_col) of one ball step per BALL_DIRECTIONS entry
+BALL_MOVES = [(-1, -1), (0, -1), (1, -1), (1, 1), (0, 1), (-1, 1)]
+_NW, _W, _SW, _SE, _E, _NE = range(len(BALL_DIRECTIONS))
+BALL_START_DIRECTIONS = [_NW, _SW, _SE, _NE]
+TOP_WALL_BOUNCE = [_SE if ball_dir == _NE else _SW for ball_dir in range(len(BALL_DIRECTIONS))]
+BOTTOM_WALL_BOUNCE = [_NE if ball_dir == _SE else _NW for ball_dir in range(len(BALL_DIRECTIONS))]
+PADDLE_BOUNCE_EAST = [_NW, _W, _SW]  # Directions after hitting the paddle east of the ball
+PADDLE_BOUNCE_WEST = [_NE, _E, _SE]
+
+# The same tables as arrays, for VecPongDuel
+BALL_MOVE_ARRAY = np.array(BALL_MOVES)
+BALL_START_DIRECTION_ARRAY = np.array(BALL_START_DIRECTIONS)
+TOP_WALL_BOUNCE_ARRAY = np.array(TOP_WALL_BOUNCE)
+BOTTOM_WALL_BOUNCE_ARRAY = np.array(BOTTOM_WALL_BOUNCE)
+PADDLE_BOUNCE_ARRAY = np.array([PADDLE_BOUNCE_WEST, PADDLE_BOUNCE_EAST])  # Indexed by the agent whose paddle is hit
+PADDLE_MOVES = np.array([0, -1, 1])  # Row step per ACTION_MEANING entry
+PADDLE_OFFSETS = np.arange(-PADDLE_SIZE, PADDLE_SIZE + 1)
+
+# int8 grid codes: empty cells, the cell the ball started in and every agent's paddle cells from the top edge
+# (offset -PADDLE_SIZE) to the bottom edge (offset PADDLE_SIZE)
+GRID_EMPTY = 0
+GRID_BALL = -1
+GRID_PADDLE_CODES = np.arange(1, 2 * (2 * PADDLE_SIZE + 1) + 1, dtype=np.int8).reshape(2, 2 * PADDLE_SIZE + 1)
+
+# Cumulative bounce probabilities per grid code, normalized like Generator.choice does
+GRID_BOUNCE_CDFS = np.zeros((GRID_PADDLE_CODES.size + 1, 3))
+for _code in GRID_PADDLE_CODES.flat:
+    _cdf = np.cumsum(bounce_probabilities((_code - 1) % (2 * PADDLE_SIZE + 1) - PADDLE_SIZE))
+    GRID_BOUNCE_CDFS[_code] = _cdf / _cdf[-1]
+
+# The same tables as Python lists, for PongDuel's scalar step
+PADDLE_CODE_LISTS = GRID_PADDLE_CODES.tolist()
+GRID_BOUNCE_CDF_LISTS = GRID_BOUNCE_CDFS.tolist()
+
+# Number of observation features per agent
+OBS_SIZE = 4 + len(BALL_DIRECTIONS)
@@ -0,0 +1,271 @@
+"""
+Compact recordings of episodes and their offline replay as GIF or MP4.
+
+EpisodeRecorder wraps an environment and, instead of frames, stores the small state the environment needs to draw a
+frame after every step: a snapshot of a few numbers (paddle rows and ball of PongDuel, position and facing direction
+in MazeGameEnv and PlainFieldEnv, actions and scores in GameEnv) together with the actions, rewards and done flags.
+Data that stays fixed during an episode, e.g. the maze walls, is stored once per episode. Rows are collected in
+memory and written as compressed .npz chunks of chunk_steps steps, so recording costs the snapshot and one list append
+per step and the files a few bytes per step. Recording again into a directory continues its episode ids.
+
+Wrapped environments implement:
+    init_kwargs(): constructor arguments except render_mode, stored with the recording to recreate the environment
+    snapshot(): 1-D array of the state drawn by render(), recorded after reset and every step
+    episode_snapshot(): dict of arrays fixed during the episode, recorded after reset
+    load_snapshot(episode, snapshot): set the state drawn by render() from both, to replay a recording
+
+PongDuel, MazeGameEnv, PlainFieldEnv and GameEnv do. A replay creates the environment with render_mode='rgb_array',
+loads every snapshot and renders it:
+
+    python recorder.py recordings/idqn/PongDuel-v0 --output replay.gif --episodes 0 50
+"""
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+
+import gymnasium
+import numpy as np
+
+# Bits of the recorded done flags
+TERMINATED = 1
+TRUNCATED = 2
+
+
+class EpisodeRecorder(gymnasium.Wrapper):
+    """Records snapshots of the episodes of env into chunked, compressed files in directory
+
+    A directory holds the recording of one environment. Recording into a directory with chunks of the same
+    environment continues the episode ids after the last recorded episode, a directory of another environment is
+    refused. Every run is listed in meta.json with its first episode and chunk.
+
+    Args:
+        env (gymnasium.Env): Environment implementing snapshot, episode_snapshot and load_snapshot
+        directory (str): Directory of the recording, created if missing
+        episode_trigger (callable): Called with the index of every episode, records it if it returns True. None
+            records all episodes
+        chunk_steps (int): Number of steps per chunk file
+        env_kwargs (dict): JSON serializable constructor arguments of the environment for replays, defaults to
+            env.init_kwargs()
+    """
+    def __init__(self, env, directory, episode_trigger=None, chunk_steps=4096, env_kwargs=None):
+        super().__init__(env)
+        self.directory = directory
+        self.episode_trigger = episode_trigger
+        self.chunk_steps = chunk_steps
+        self.recording = False
+        os.makedirs(directory, exist_ok=True)
+
+        env_class = type(env.unwrapped)
+        if env_kwargs is None:
+            if hasattr(env.unwrapped, "init_kwargs"):
+                env_kwargs = env.unwrapped.init_kwargs()
+            elif env.spec is not None:
+                env_kwargs = dict(env.spec.kwargs)
+            else:
+                raise ValueError(f"Cannot tell the constructor arguments of {env_class.__name__} to replay it, "
+                                 "pass env_kwargs")
+        env_kwargs = dict(env_kwargs)
+        env_kwargs.pop("render_mode", None)
+        meta = {"env": f"{env_class.__module__}:{env_class.__name__}",
+                "env_dir": os.path.dirname(os.path.abspath(sys.modules[env_class.__module__].__file__)),
+                "env_kwargs": json.loads(json.dumps(env_kwargs)), "render_fps": env.metadata.get("render_fps", 30),
+                "runs": []}
+
+        # Continue a recording of the same environment, episode ids stay unique across runs
+        self._chunk_id = len(glob.glob(os.path.join(directory, "chunk_*.npz")))
+        self.episode_id = -1
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                existing = json.load(f)
+            if (existing["env"], existing["env_kwargs"]) != (meta["env"], meta["env_kwargs"]):
+                raise ValueError(f"{directory} holds a recording of {existing['env']} with {existing['env_kwargs']}, "
+                                 f"not {meta['env']} with {meta['env_kwargs']}, record into another directory")
+            meta["runs"] = existing.get("runs", [])
+            self.episode_id = _last_episode(directory)
+        elif self._chunk_id:
+            raise ValueError(f"{directory} holds chunks without a meta.json, record into another directory")
+        meta["runs"].append({"first_episode": self.episode_id + 1, "first_chunk": self._chunk_id})
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+        # One (episode, step, snapshot, actions, reward, terminated, truncated) row per recorded step of the current
+        # chunk, converted to arrays at flush. The step and snapshot methods are bound once to skip the wrapper's
+        # attribute forwarding
+        self._env_step = env.step
+        self._snapshot = env.unwrapped.snapshot
+        self._episode_arrays = {}
+        self._rows = []
+        self._step = 0
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        self.episode_id += 1
+        self.recording = self.episode_trigger is None or self.episode_trigger(self.episode_id)
+        if self.recording:
+            self._step = 0
+            unwrapped = self.env.unwrapped
+            for key, value in unwrapped.episode_snapshot().items():
+                self._episode_arrays[f"episode{self.episode_id}/{key}"] = np.asarray(value)
+            self._episode_arrays[f"episode{self.episode_id}/initial_snapshot"] = np.asarray(unwrapped.snapshot())
+        return observation, info
+
+    def step(self, *actions):
+        # GameEnv takes one action per agent, the other environments one action
+        result = self._env_step(*actions)
+        if self.recording:
+            self._step += 1
+            rows = self._rows
+            rows.append((self.episode_id, self._step, self._snapshot(), actions, result[1], result[2], result[3]))
+            if len(rows) == self.chunk_steps:
+                self.flush()
+        return result
+
+    def flush(self):
+        """Write the steps recorded since the last chunk"""
+        num_steps = len(self._rows)
+        if not num_steps and not self._episode_arrays:
+            return
+        if num_steps:
+            episodes, steps, snapshots, actions, rewards, terminated, truncated = zip(*self._rows)
+            arrays = {"episode": np.array(episodes, dtype=np.int32), "step": np.array(steps, dtype=np.int32),
+                      "snapshot": np.stack(snapshots),
+                      "action": np.array(actions, dtype=np.float32).reshape(num_steps, -1),
+                      "reward": np.array(rewards, dtype=np.float32).reshape(num_steps, -1)}
+            # Multi-agent environments return one flag per agent, the episode is done when all are
+            terminated = np.array(terminated, dtype=bool).reshape(num_steps, -1).all(axis=1)
+            truncated = np.array(truncated, dtype=bool).reshape(num_steps, -1).all(axis=1)
+            arrays["done"] = (TERMINATED * terminated + TRUNCATED * truncated).astype(np.int8)
+        else:
+            arrays = {"episode": np.zeros(0, dtype=np.int32), "step": np.zeros(0, dtype=np.int32),
+                      "snapshot": np.zeros((0, 0), dtype=np.int16), "action": np.zeros((0, 0), dtype=np.float32),
+                      "reward": np.zeros((0, 0), dtype=np.float32), "done": np.zeros(0, dtype=np.int8)}
+        arrays.update(self._episode_arrays)
+
+        path = os.path.join(self.directory, f"chunk_{self._chunk_id:06d}.npz")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+        self._chunk_id += 1
+        self._episode_arrays = {}
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+def _last_episode(directory):
+    # Largest episode id in the chunks of directory, -1 if there are none
+    last = -1
+    for path in glob.glob(os.path.join(directory, "chunk_*.npz")):
+        with np.load(path) as chunk:
+            episodes = [int(key[len("episode"):key.index("/")]) for key in chunk.files if "/" in key]
+            if len(chunk["episode"]):
+                episodes.append(int(chunk["episode"].max()))
+            last = max([last] + episodes)
+    return last
+
+
+def read_recording(directory):
+    """Yield the recorded episodes of directory in order.
+
+    Every episode is a dict of its 'episode' index, the 'episode_snapshot' dict, its 'initial_snapshot' and the
+    (steps, ...) arrays 'snapshots', 'actions', 'rewards' and 'dones' of its steps.
+    """
+    episodes = {}
+    for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+        with np.load(path) as chunk:
+            for key in chunk.files:
+                if key.startswith("episode") and "/" in key:
+                    episode_key, name = key.split("/", 1)
+                    episode = episodes.setdefault(int(episode_key[len("episode"):]), {"episode_snapshot": {},
+                                                                                       "steps": []})
+                    if name == "initial_snapshot":
+                        episode["initial_snapshot"] = chunk[key]
+                    else:
+                        episode["episode_snapshot"][name] = chunk[key]
+
+            # Episodes started before this chunk are complete once a later episode appears
+            episode_ids = chunk["episode"]
+            for episode_id in sorted(episodes):
+                steps = np.flatnonzero(episode_ids == episode_id)
+                if len(steps):
+                    episodes[episode_id]["steps"].append({key: chunk[key][steps]
+                                                          for key in ("snapshot", "action", "reward", "done")})
+            latest = max(episodes) if episodes else None
+            for episode_id in sorted(episodes):
+                if episode_id != latest:
+                    yield _episode(episode_id, episodes.pop(episode_id))
+    for episode_id in sorted(episodes):
+        yield _episode(episode_id, episodes.pop(episode_id))
+
+
+def _episode(episode_id, episode):
+    steps = episode.pop("steps")
+    for key, name in (("snapshot", "snapshots"), ("action", "actions"), ("reward", "rewards"), ("done", "dones")):
+        episode[name] = np.concatenate([step[key] for step in steps]) if steps else np.zeros((0,))
+    episode["episode"] = episode_id
+    return episode
+
+
+def make_replay_env(directory):
+    """Environment of the recording in directory, created with render_mode='rgb_array'"""
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["env_dir"] not in sys.path:
+        sys.path.insert(0, meta["env_dir"])
+    module_name, class_name = meta["env"].split(":")
+    env_class = getattr(importlib.import_module(module_name), class_name)
+    return env_class(render_mode="rgb_array", **meta["env_kwargs"]), meta
+
+
+def replay_frames(env, episode):
+    """rgb_array frames of a recorded episode, from the state after reset to the state after the last step"""
+    for snapshot in [episode["initial_snapshot"], *episode["snapshots"]]:
+        env.load_snapshot(episode["episode_snapshot"], snapshot)
+        frame = env.render()
+        if frame is not None:
+            yield frame
+
+
+def write_video(frames, path, fps):
+    """Write frames to a .gif with PIL or, with imageio installed, to an .mp4 or any other video format"""
+    if path.endswith(".gif"):
+        from PIL import Image
+        images = [Image.fromarray(frame) for frame in frames]
+        images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0)
+    else:
+        import imageio  # pip install imageio[ffmpeg]
+        imageio.mimwrite(path, list(frames), fps=fps)
+
+
+def replay(directory, output, episodes=None, fps=None):
+    """Render the recorded episodes of directory, or only those in episodes, into the video file output"""
+    env, meta = make_replay_env(directory)
+    frames = []
+    for episode in read_recording(directory):
+        if episodes is None or episode["episode"] in episodes:
+            frames.extend(replay_frames(env, episode))
+    env.close()
+    if not frames:
+        raise ValueError(f"No recorded frames of episodes {episodes} in {directory}")
+    write_video(frames, output, fps or meta["render_fps"])
+    return len(frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recording of EpisodeRecorder as a GIF or MP4.")
+    parser.add_argument("directory", help="Directory of the recording.")
+    parser.add_argument("--output", default="replay.gif", help="Video file, .gif or a format imageio can write.")
+    parser.add_argument("--episodes", type=int, nargs="*", default=None, help="Episodes to replay, default all.")
+    parser.add_argument("--fps", type=float, default=None, help="Frames per second, default the env's render_fps.")
+    args = parser.parse_args()
+
+    num_frames = replay(args.directory, args.output, set(args.episodes) if args.episodes else None, args.fps)
+    print(f"Wrote {num_frames} frames to {args.output}")
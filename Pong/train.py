@@ -1,5 +1,5 @@
-import collections
-import random
+import queue
+import threading
 import time
 
 import gymnasium as gym
@@ -9,39 +9,117 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-from ma_gym.wrappers import Monitor
+from recorder import EpisodeRecorder
 
 from tqdm import trange
 
 USE_WANDB = False  # if enabled, logs data on wandb server
 
 class ReplayBuffer:
-    def __init__(self, buffer_limit):
-        self.buffer = collections.deque(maxlen=buffer_limit)
+    """Ring buffer of multi-agent transitions in preallocated NumPy arrays (structure of arrays).
+
+    States and next states are float32 (buffer_limit, n_agents, obs_dim) arrays, actions and dones int8 and rewards
+    float32 (buffer_limit, n_agents) arrays. put copies a transition into the next slot, sample gathers a minibatch
+    with one fancy index per array and wraps the results with torch.from_numpy. With prefetch > 0 a background thread
+    keeps that many minibatches sampled ahead, so gathering overlaps with the learner's forward and backward passes.
+
+    Args:
+        buffer_limit (int): Maximum number of transitions, the oldest ones are overwritten first
+        n_agents (int): Number of agents per transition
+        obs_dim (int): Number of features per agent observation
+        prefetch (int): Number of minibatches sampled ahead by a background thread, 0 to sample on demand
+    """
+    def __init__(self, buffer_limit, n_agents, obs_dim, prefetch=0):
+        self.buffer_limit = buffer_limit
+        self.prefetch = prefetch
+        self.position = 0
+        self._size = 0
+
+        self.states = np.zeros((buffer_limit, n_agents, obs_dim), dtype=np.float32)
+        self.next_states = np.zeros((buffer_limit, n_agents, obs_dim), dtype=np.float32)
+        self.actions = np.zeros((buffer_limit, n_agents), dtype=np.int8)
+        self.rewards = np.zeros((buffer_limit, n_agents), dtype=np.float32)
+        self.dones = np.zeros((buffer_limit, n_agents), dtype=np.int8)
+
+        # Guards the arrays against a prefetching thread gathering a transition while it is overwritten
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+        self._batches = None
+        self._batch_size = None
+        self._stop = threading.Event()
+        self._prefetcher = None
 
     def put(self, transition):
-        self.buffer.append(transition)
+        s, a, r, s_prime, done = transition
+        with self._lock:
+            i = self.position
+            self.states[i] = s
+            self.actions[i] = a
+            self.rewards[i] = r
+            self.next_states[i] = s_prime
+            self.dones[i] = done
+            self.position = (i + 1) % self.buffer_limit
+            self._size = min(self._size + 1, self.buffer_limit)
+
+    def put_batch(self, s, a, r, s_prime, done):
+        """Store n transitions at once, e.g. one step of VecPongDuel, arguments have a leading dimension of size n"""
+        n = len(a)
+        idx = (self.position + np.arange(n)) % self.buffer_limit
+        with self._lock:
+            self.states[idx] = s
+            self.actions[idx] = a
+            self.rewards[idx] = r
+            self.next_states[idx] = s_prime
+            self.dones[idx] = done
+            self.position = (self.position + n) % self.buffer_limit
+            self._size = min(self._size + n, self.buffer_limit)
 
     def sample(self, n):
-        mini_batch = random.sample(self.buffer, n)
-        s_lst, a_lst, r_lst, s_prime_lst, done_mask_lst = [], [], [], [], []
-
-        for transition in mini_batch:
-            s, a, r, s_prime, done = transition
-            s_lst.append(s)
-            a_lst.append(a)
-            r_lst.append(r)
-            s_prime_lst.append(s_prime)
-            done_mask_lst.append((np.ones(len(done)) - done).tolist())
-
-        return torch.tensor(s_lst, dtype=torch.float), \
-               torch.tensor(a_lst, dtype=torch.float), \
-               torch.tensor(r_lst, dtype=torch.float), \
-               torch.tensor(s_prime_lst, dtype=torch.float), \
-               torch.tensor(done_mask_lst, dtype=torch.float)
+        """Sample n distinct transitions uniformly.
+
+        Returns:
+            states (n, n_agents, obs_dim), actions (n, n_agents), rewards (n, n_agents), next states
+            (n, n_agents, obs_dim) and done masks (n, n_agents), the masks being 0. for terminal transitions
+        """
+        if self.prefetch <= 0:
+            return self._sample(n)
+        if self._batches is None:
+            self._batch_size = n
+            self._batches = queue.Queue(maxsize=self.prefetch)
+            self._prefetcher = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._prefetcher.start()
+        assert n == self._batch_size, "A prefetching buffer samples minibatches of one size"
+        return self._batches.get()
+
+    def _sample(self, n):
+        with self._lock:
+            idx = self._rng.choice(self._size, n, replace=False)
+            s, a, r, s_prime, done = (self.states[idx], self.actions[idx], self.rewards[idx],
+                                      self.next_states[idx], self.dones[idx])
+        done_mask = np.subtract(1, done, dtype=np.float32)
+        return (torch.from_numpy(s), torch.from_numpy(a), torch.from_numpy(r), torch.from_numpy(s_prime),
+                torch.from_numpy(done_mask))
+
+    def _prefetch_loop(self):
+        # A full queue is waited on with a timeout, so close stops the thread within one
+        while not self._stop.is_set():
+            batch = self._sample(self._batch_size)
+            while not self._stop.is_set():
+                try:
+                    self._batches.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def close(self):
+        """Stop the prefetching thread, if one was started"""
+        self._stop.set()
+        if self._prefetcher is not None:
+            self._prefetcher.join()
+            self._prefetcher = None
 
     def size(self):
-        return len(self.buffer)
+        return self._size
 
 class QNet(nn.Module):
     def __init__(self, observation_space, action_space):
@@ -86,11 +164,11 @@ def train(q, q_target, memory, optimizer, gamma, batch_size, update_iter=10):
 
 
 def test(env, num_episodes, q):
-    score = np.zeros(env.n_agents)
+    score = np.zeros(env.unwrapped.n_agents)
     for episode_i in range(num_episodes):
         state, _ = env.reset()
         # the episode ends when all agents are done
-        done = [False for _ in range(env.n_agents)]
+        done = [False for _ in range(env.unwrapped.n_agents)]
         while not all(done):
             env.render()
 
@@ -107,28 +185,31 @@ def test(env, num_episodes, q):
 
 
 def main(env_name, lr, gamma, batch_size, buffer_limit, log_interval, max_episodes,
-         max_epsilon, min_epsilon, test_episodes, warm_up_steps, update_iter, monitor=False, epsilon_decay_episodes_fraction=0.8):
+         max_epsilon, min_epsilon, test_episodes, warm_up_steps, update_iter, monitor=False,
+         epsilon_decay_episodes_fraction=0.8, prefetch_batches=0):
     env = gym.make(env_name)
     test_env = gym.make(env_name)
     if monitor:
-        test_env = Monitor(test_env, directory='recordings/idqn/{}'.format(env_name),
-                           video_callable=lambda episode_id: episode_id % 50 == 0)
-    memory = ReplayBuffer(buffer_limit)
+        # Snapshots of every 50th test episode, replay them with python recorder.py recordings/idqn/<env_name>
+        test_env = EpisodeRecorder(test_env, directory='recordings/idqn/{}'.format(env_name),
+                                   episode_trigger=lambda episode_id: episode_id % 50 == 0)
+    obs_dim = env.observation_space._agents_observation_space[0].shape[0]
+    memory = ReplayBuffer(buffer_limit, env.unwrapped.n_agents, obs_dim, prefetch=prefetch_batches)
 
     q = QNet(env.observation_space, env.action_space)
     q_target = QNet(env.observation_space, env.action_space)
     q_target.load_state_dict(q.state_dict())
     optimizer = optim.Adam(q.parameters(), lr=lr)
 
-    score = np.zeros(env.n_agents)
+    score = np.zeros(env.unwrapped.n_agents)
     for episode_i in trange(max_episodes):
         epsilon = max(min_epsilon, max_epsilon - (max_epsilon - min_epsilon) * (episode_i / (epsilon_decay_episodes_fraction * max_episodes)))
         state, _ = env.reset()
-        done = [False for _ in range(env.n_agents)]
+        done = [False for _ in range(env.unwrapped.n_agents)]
         while not all(done):
             action = q.sample_action(torch.Tensor(state).unsqueeze(0), epsilon)[0].data.cpu().numpy().tolist()
             next_state, reward, done, _, info = env.step(action)
-            memory.put((state, action, (np.array(reward)).tolist(), next_state, np.array(done, dtype=int).tolist()))
+            memory.put((state, action, reward, next_state, done))
             score += np.array(reward)
             state = next_state
 
@@ -146,8 +227,9 @@ def main(env_name, lr, gamma, batch_size, buffer_limit, log_interval, max_episod
             if USE_WANDB:
                 wandb.log({'episode': episode_i, 'test-score': test_score,
                            'buffer-size': memory.size(), 'epsilon': epsilon, 'train-score': sum(score / log_interval)})
-            score = np.zeros(env.n_agents)
+            score = np.zeros(env.unwrapped.n_agents)
 
+    memory.close()
     env.close()
     test_env.close()
 
@@ -171,7 +253,8 @@ if __name__ == '__main__':
               'test_episodes': 1,
               'warm_up_steps': 2000,
               'update_iter': 10,
-              'monitor': False}
+              'monitor': False,
+              'prefetch_batches': 0}
     if USE_WANDB:
         import wandb
 